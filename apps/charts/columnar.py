@@ -0,0 +1,81 @@
+"""
+Formato columnar de las respuestas del tablero.
+
+En el formato por omisión cada serie es una lista de objetos que repite sus
+llaves (``dentist__first_name``, ``was_paid``...) en cada fila, y los montos
+Decimal viajan como cadenas. En el formato columnar cada serie es un objeto
+con un arreglo por campo: los montos son números, y los campos de texto se
+codifican con diccionario (``valores`` distintos una vez y ``codigos`` por
+fila). Se pide con ``?formato=columnar`` o con ``Accept: MEDIA_COLUMNAR``.
+
+La compresión (gzip según ``Accept-Encoding``) la hace ``gzip_page`` en la
+vista.
+"""
+import json
+from datetime import date
+from decimal import Decimal
+
+MEDIA_COLUMNAR = 'application/vnd.dental.columnar+json'
+
+
+def formato_columnar(request):
+    """
+    True si el cliente pidió el formato columnar (parámetro o encabezado Accept).
+    """
+    if request.GET.get('formato') == 'columnar':
+        return True
+    return any(
+        not tipo.is_all_types and tipo.match(MEDIA_COLUMNAR)
+        for tipo in request.accepted_types)
+
+
+def _columna(valores):
+    if valores and all(isinstance(valor, str) for valor in valores):
+        diccionario = {}
+        codigos = [diccionario.setdefault(valor, len(diccionario)) for valor in valores]
+        return {'valores': list(diccionario), 'codigos': codigos}
+    if any(isinstance(valor, Decimal) for valor in valores):
+        return [None if valor is None else float(valor) for valor in valores]
+    if any(isinstance(valor, date) for valor in valores):
+        return [None if valor is None else valor.isoformat() for valor in valores]
+    return list(valores)
+
+
+def a_columnas(filas):
+    """
+    Convierte una lista de dicts (mismas llaves) en un dict de columnas.
+    """
+    campos = list(filas[0]) if filas else []
+    return {
+        'filas': len(filas),
+        'columnas': {
+            campo: _columna([fila[campo] for fila in filas]) for campo in campos
+        },
+    }
+
+
+def datos_columnares(datos):
+    """
+    Pasa a columnas cada serie (lista de dicts) de una respuesta del tablero;
+    el resto de las llaves ('rango', 'resolucion'...) queda igual.
+    """
+    return {
+        clave: a_columnas(valor)
+        if isinstance(valor, list) and all(isinstance(fila, dict) for fila in valor)
+        else valor
+        for clave, valor in datos.items()
+    }
+
+
+def json_compacto(datos):
+    """
+    JSON sin espacios, con montos Decimal como números.
+    """
+    def convertir(valor):
+        if isinstance(valor, Decimal):
+            return float(valor)
+        if isinstance(valor, date):
+            return valor.isoformat()
+        raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+    return json.dumps(datos, separators=(',', ':'), default=convertir)
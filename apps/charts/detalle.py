@@ -0,0 +1,96 @@
+"""
+Detalle de ingresos del tablero, bajo demanda y por páginas.
+
+La página del tablero solo carga las series agregadas; las filas de Income
+se piden por páginas filtradas por rango, dentista, procedimiento y tipo de
+pago. La paginación es por llave (fecha, id), de la más reciente a la más
+antigua, así que pedir la página N no recorre las anteriores. Cada página se
+serializa conforme se leen las filas de un iterador de ``.values()``, sin
+construir el JSON completo en memoria.
+"""
+import json
+from datetime import date
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+from apps.charts.series import FILTROS_SERIES, rango_series
+from apps.pages.models import Income
+from apps.reports.especificacion import FILTROS, filtrar
+
+# Filtros del detalle -> búsqueda sobre Income
+FILTROS_DETALLE = {clave: FILTROS[clave][1] for clave in FILTROS_SERIES}
+
+CAMPOS_DETALLE = (
+    'id', 'date', 'dentist_id', 'dentist__first_name', 'dentist__last_name',
+    'procedure__name', 'amount', 'was_paid',
+)
+
+LIMITE_POR_OMISION = 100
+MAX_LIMITE = 1000
+
+# Filas que se leen de la base por viaje al iterar
+TAMANO_BLOQUE = 500
+
+
+def leer_cursor(cursor):
+    """
+    Convierte el cursor ``AAAA-MM-DD:id`` de la página anterior en (fecha, id).
+
+    Raises:
+        ValueError: Si el cursor no es válido.
+    """
+    fecha, separador, pk = cursor.partition(':')
+    if not separador or not pk.isdigit():
+        raise ValueError(f"Cursor no válido: {cursor!r}.")
+    return date.fromisoformat(fecha), int(pk)
+
+
+def escribir_cursor(fila):
+    return f"{fila['date'].isoformat()}:{fila['id']}"
+
+
+def filas_ingresos(inicio=None, fin=None, filtros=None, despues=None, limite=LIMITE_POR_OMISION,
+                   hoy=None):
+    """
+    QuerySet (sin evaluar) de una página del detalle, con una fila de más
+    para saber si hay página siguiente.
+
+    Args:
+        despues (tuple): (fecha, id) de la última fila de la página anterior.
+        limite (int): Filas por página (hasta MAX_LIMITE).
+
+    Raises:
+        ValueError: Si algún filtro, fecha o límite no es válido.
+    """
+    if not 1 <= limite <= MAX_LIMITE:
+        raise ValueError(f"'limite' debe estar entre 1 y {MAX_LIMITE}.")
+    inicio, fin = rango_series(inicio, fin, hoy)
+
+    queryset = filtrar(
+        Income.objects.filter(date__range=[inicio, fin]), FILTROS_DETALLE, filtros)
+    if despues is not None:
+        fecha, pk = despues
+        queryset = queryset.filter(Q(date__lt=fecha) | Q(date=fecha, pk__lt=pk))
+    return queryset.order_by('-date', '-pk').values(*CAMPOS_DETALLE)[:limite + 1]
+
+
+def iterar_pagina_json(queryset, limite):
+    """
+    Genera el JSON de una página por partes: ``{"filas": [...], "siguiente": cursor}``.
+
+    ``siguiente`` es None en la última página.
+    """
+    encoder = DjangoJSONEncoder()
+    yield '{"filas": ['
+    ultima = None
+    for numero, fila in enumerate(queryset.iterator(chunk_size=TAMANO_BLOQUE)):
+        if numero == limite:
+            # La fila de más solo indica que hay otra página
+            siguiente = escribir_cursor(ultima)
+            break
+        yield (',' if numero else '') + encoder.encode(fila)
+        ultima = fila
+    else:
+        siguiente = None
+    yield '], "siguiente": ' + json.dumps(siguiente) + '}'
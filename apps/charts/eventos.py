@@ -0,0 +1,158 @@
+"""
+Actualizaciones en vivo del tablero por Server-Sent Events.
+
+Cada conexión al stream (una vista async servida por config.asgi) es una
+corrutina suscrita al publicador del proceso con su propia cola acotada; una
+conexión inactiva no ocupa un hilo, solo su cola y un keepalive periódico,
+así que un worker ASGI sostiene cientos de tableros abiertos.
+
+Al confirmarse la escritura de un Income (ver apps.charts.signals) se
+publica un delta con el monto, el dentista, el procedimiento y el tipo de
+pago, y el tablero lo suma a sus gráficas sin volver a consultar. Las
+escrituras masivas, ediciones y borrados publican ``recargar`` con las
+fechas afectadas para que el tablero vuelva a pedir las series (servidas
+desde la caché). Si la cola de una conexión se llena, sus eventos pendientes
+se descartan y se le envía ``recargar``.
+
+El publicador es en memoria: llega a las conexiones del mismo proceso, así
+que la función se activa con ``settings.CHARTS_LIVE_UPDATES`` solo en
+despliegues de un único proceso ASGI. Con varios workers cada uno recibiría
+solo las escrituras que atiende; repartir entre procesos requeriría publicar
+a través de un broker (p. ej. Redis pub/sub) con la misma interfaz
+``publicar``.
+
+Django no avisa a una respuesta en streaming cuando el cliente se
+desconecta, así que cada stream dura a lo más DURACION_MAXIMA segundos: al
+cerrarse, el navegador reconecta tras ``retry`` y una conexión abandonada
+libera su suscripción.
+"""
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+# Eventos pendientes por conexión antes de pedirle que recargue
+TAMANO_COLA = 100
+
+# Segundos entre comentarios de keepalive en una conexión inactiva
+KEEPALIVE = 15
+
+# Milisegundos que el navegador espera antes de reconectar
+REINTENTO = 5000
+
+# Segundos que dura un stream antes de cerrarse para que el navegador reconecte
+DURACION_MAXIMA = 300
+
+EVENTO_INGRESO = 'ingreso'
+EVENTO_RECARGAR = 'recargar'
+
+
+def activas():
+    """
+    Indica si las actualizaciones en vivo están activadas (ver settings).
+    """
+    return getattr(settings, 'CHARTS_LIVE_UPDATES', False)
+
+
+def formatear_evento(evento, datos):
+    """
+    Mensaje SSE (``event:`` y ``data:`` en JSON) listo para enviar.
+    """
+    return f"event: {evento}\ndata: {json.dumps(datos, cls=DjangoJSONEncoder)}\n\n"
+
+
+class Suscripcion:
+    """
+    Cola de mensajes de una conexión, ligada a su event loop.
+    """
+    __slots__ = ('loop', 'cola')
+
+    def __init__(self, loop, tamano=TAMANO_COLA):
+        self.loop = loop
+        self.cola = asyncio.Queue(tamano)
+
+    def entregar(self, mensaje):
+        # Se ejecuta en el loop de la conexión
+        try:
+            self.cola.put_nowait(mensaje)
+        except asyncio.QueueFull:
+            while not self.cola.empty():
+                self.cola.get_nowait()
+            self.cola.put_nowait(formatear_evento(EVENTO_RECARGAR, {'fechas': None}))
+
+    async def siguiente(self, timeout=None):
+        """
+        Siguiente mensaje, o None si no llega ninguno en ``timeout`` segundos.
+        """
+        try:
+            return await asyncio.wait_for(self.cola.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class Publicador:
+    """
+    Reparte eventos a las conexiones suscritas en este proceso.
+
+    ``publicar`` puede llamarse desde cualquier hilo (p. ej. el de una
+    vista síncrona); cada mensaje se formatea una sola vez y se encola en el
+    loop de cada conexión.
+    """
+
+    def __init__(self):
+        self._suscripciones = set()
+        self._candado = threading.Lock()
+
+    def __len__(self):
+        return len(self._suscripciones)
+
+    def suscribir(self):
+        """
+        Suscribe la corrutina actual (debe llamarse dentro de un event loop).
+        """
+        suscripcion = Suscripcion(asyncio.get_running_loop())
+        with self._candado:
+            self._suscripciones.add(suscripcion)
+        return suscripcion
+
+    def cancelar(self, suscripcion):
+        with self._candado:
+            self._suscripciones.discard(suscripcion)
+
+    def publicar(self, evento, datos):
+        mensaje = formatear_evento(evento, datos)
+        with self._candado:
+            suscripciones = list(self._suscripciones)
+        for suscripcion in suscripciones:
+            try:
+                suscripcion.loop.call_soon_threadsafe(suscripcion.entregar, mensaje)
+            except RuntimeError:
+                # El loop ya se cerró: la conexión terminó sin cancelar
+                self.cancelar(suscripcion)
+
+
+publicador = Publicador()
+
+
+async def stream_eventos(publicador=publicador, keepalive=KEEPALIVE, duracion=DURACION_MAXIMA):
+    """
+    Genera el cuerpo de una respuesta SSE durante ``duracion`` segundos.
+
+    Los eventos publicados mientras el navegador reconecta se pierden; al
+    reconectar el tablero vuelve a pedir las series.
+    """
+    suscripcion = publicador.suscribir()
+    loop = asyncio.get_running_loop()
+    limite = loop.time() + duracion
+    try:
+        yield f"retry: {REINTENTO}\n\n"
+        while (restante := limite - loop.time()) > 0:
+            mensaje = await suscripcion.siguiente(min(keepalive, restante))
+            if mensaje is not None:
+                yield mensaje
+            elif loop.time() < limite:
+                yield ": keepalive\n\n"
+    finally:
+        publicador.cancelar(suscripcion)
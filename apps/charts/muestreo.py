@@ -0,0 +1,50 @@
+"""
+Reducción de series de tiempo para graficar.
+
+Largest-Triangle-Three-Buckets (Steinarsson, 2013): conserva el primer y el
+último punto y, de cada cubeta intermedia, el punto que forma el triángulo
+de mayor área con el punto elegido en la cubeta anterior y el promedio de
+la siguiente. A diferencia de promediar, mantiene picos y valles, que es lo
+que se ve en la gráfica.
+"""
+import numpy as np
+
+
+def lttb(x, y, umbral):
+    """
+    Índices de los puntos que se conservan al reducir una serie con LTTB.
+
+    Args:
+        x (sequence[float]): Abscisas en orden creciente.
+        y (sequence[float]): Ordenadas.
+        umbral (int): Número de puntos a conservar (al menos 3).
+
+    Returns:
+        numpy.ndarray: Índices crecientes de ``umbral`` puntos (o de todos si
+        la serie ya es más corta).
+    """
+    n = len(x)
+    if umbral >= n or umbral < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # Cubetas intermedias: todos los puntos salvo el primero y el último
+    bordes = np.linspace(1, n - 1, umbral - 1).astype(np.int64)
+
+    indices = np.empty(umbral, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    anterior = 0
+    for cubeta in range(umbral - 2):
+        inicio, fin = bordes[cubeta], bordes[cubeta + 1]
+        # Promedio de la cubeta siguiente (el último punto para la última)
+        siguiente_inicio, siguiente_fin = fin, bordes[cubeta + 2] if cubeta + 2 < len(bordes) else n
+        promedio_x = x[siguiente_inicio:siguiente_fin].mean()
+        promedio_y = y[siguiente_inicio:siguiente_fin].mean()
+
+        areas = np.abs(
+            (x[anterior] - promedio_x) * (y[inicio:fin] - y[anterior])
+            - (x[anterior] - x[inicio:fin]) * (promedio_y - y[anterior]))
+        anterior = inicio + int(np.argmax(areas))
+        indices[cubeta + 1] = anterior
+    return indices
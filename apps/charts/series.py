@@ -0,0 +1,305 @@
+"""
+Series del tablero de gráficas de ingresos.
+
+Todas las series salen del rollup diario (apps.reports.rollup), filtrado una
+sola vez por rango de fechas, dentista, procedimiento y tipo de pago; cada
+serie es un GROUP BY pequeño sobre ese rollup, no un recorrido de Income.
+Solo se calculan las series pedidas.
+
+La serie de tiempo (``daily_totals``) tiene una pirámide de resoluciones: día
+(el rollup), semana, mes y año (las llaves ya calculadas e indexadas de la
+dimensión de calendario). Según el rango y el ancho en pixeles de la gráfica
+se elige el nivel más fino que no exceda unas cuantas veces los puntos
+dibujables, y si aún sobran se reduce con LTTB (ver apps.charts.muestreo),
+así que la respuesta queda en unos cientos de puntos sin importar cuánta
+historia haya.
+
+Las series se sirven desde la caché con stale-while-revalidate
+(series_cacheadas): la llave cubre rango, filtros, series y resolución, e
+incluye las generaciones de los meses del rango, así que cualquier
+escritura de Income en ellos la invalida (ver apps.reports.cache).
+
+En backends con una conexión por hilo
+(PostgreSQL, MySQL) las consultas se lanzan en paralelo, así que la latencia
+es la de la serie más lenta; en SQLite, dentro de una transacción o con una
+traza activa se ejecutan una tras otra en la conexión actual.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Sum
+from django.utils.timezone import now
+
+from apps.charts.muestreo import lttb
+from apps.reports import cache
+from apps.reports.calendario import NIVELES
+from apps.reports.especificacion import FILTROS, filtrar
+from apps.reports.models import IncomeDailyRollup
+from apps.reports.reporter import calcular_rango_fecha, normalizar_filtros, validar_rango
+from apps.reports.traza import fase, traza_activa
+
+# Filtros del tablero -> búsqueda sobre el rollup
+FILTROS_SERIES = {
+    clave: FILTROS[clave][0] for clave in ('dentista', 'procedimiento', 'tipo_pago')
+}
+
+# Meses que muestra el tablero si no se indica un rango
+MESES_POR_OMISION = 12
+
+# Niveles de la serie de tiempo, del más fino al más grueso
+NIVELES_SERIE = ('diario', 'semanal', 'mensual', 'anual')
+
+# Ancho por omisión de la gráfica y pixeles por punto dibujado
+ANCHO_POR_OMISION = 800
+PIXELES_POR_PUNTO = 2
+MIN_PUNTOS = 50
+MAX_PUNTOS = 500
+
+# Un nivel se acepta con hasta este múltiplo de los puntos dibujables; LTTB
+# reduce el resto conservando picos y valles
+SOBREMUESTREO = 4
+
+
+def puntos_por_nivel(nivel, inicio, fin):
+    """
+    Puntos que tendría la serie de tiempo en un nivel para un rango.
+    """
+    if nivel == 'diario':
+        return (fin - inicio).days + 1
+    if nivel == 'semanal':
+        return (fin - (inicio - timedelta(days=inicio.weekday()))).days // 7 + 1
+    meses = (fin.year - inicio.year) * 12 + fin.month - inicio.month + 1
+    return meses if nivel == 'mensual' else fin.year - inicio.year + 1
+
+
+def max_puntos(ancho=None):
+    """
+    Puntos que caben en una gráfica de ``ancho`` pixeles.
+    """
+    ancho = ANCHO_POR_OMISION if ancho is None else ancho
+    return max(MIN_PUNTOS, min(MAX_PUNTOS, ancho // PIXELES_POR_PUNTO))
+
+
+def elegir_nivel(inicio, fin, ancho=None):
+    """
+    Nivel más fino cuya serie no excede SOBREMUESTREO veces los puntos dibujables.
+    """
+    limite = max_puntos(ancho) * SOBREMUESTREO
+    for nivel in NIVELES_SERIE:
+        if puntos_por_nivel(nivel, inicio, fin) <= limite:
+            return nivel
+    return NIVELES_SERIE[-1]
+
+
+def _totales_diarios(rollup, inicio, fin, nivel='diario'):
+    # El nivel diario es el rollup mismo; los demás, su llave en el calendario
+    campo = 'date' if nivel == 'diario' else f"calendario__{NIVELES[nivel]}"
+    return (
+        rollup.values(periodo=F(campo)).annotate(total=Sum('total_amount'))
+        .order_by('periodo').values_list('periodo', 'total'))
+
+
+def reducir_serie(filas, limite):
+    """
+    Convierte las filas (periodo, total) de la serie de tiempo a dicts con
+    'date' y 'total', reducidas con LTTB si exceden ``limite`` puntos.
+    """
+    if len(filas) > limite:
+        indices = lttb(
+            [periodo.toordinal() for periodo, _ in filas],
+            [float(total) for _, total in filas], limite)
+        filas = [filas[indice] for indice in indices]
+    return [{'date': periodo, 'total': total} for periodo, total in filas]
+
+
+def _procedimientos(rollup, inicio, fin):
+    return (
+        rollup.values('procedure__name').annotate(count=Sum('income_count'))
+        .order_by('procedure__name'))
+
+
+def _totales_mensuales(rollup, inicio, fin):
+    # Agrupado vía la dimensión de calendario (sin strftime por fila)
+    return (
+        rollup.values(month=F(f"calendario__{NIVELES['mensual']}"))
+        .annotate(total=Sum('total_amount'))
+        .order_by('month'))
+
+
+def _por_tipo_de_pago(rollup, inicio, fin):
+    return (
+        rollup.values('was_paid').annotate(total=Sum('total_amount'))
+        .order_by('was_paid'))
+
+
+def _dentista_por_tipo_de_pago(rollup, inicio, fin):
+    return (
+        rollup.values('dentist__first_name', 'was_paid').annotate(total=Sum('total_amount'))
+        .order_by('dentist__first_name', 'was_paid'))
+
+
+# Serie de tiempo con pirámide de resoluciones
+SERIE_TIEMPO = 'daily_totals'
+
+# Nombre de la serie en la respuesta -> consulta (rollup filtrado, inicio, fin)
+SERIES = {
+    'daily_totals': _totales_diarios,
+    'procedure_counts': _procedimientos,
+    'monthly_totals': _totales_mensuales,
+    'monthly_by_type': _por_tipo_de_pago,
+    'dentist_by_type': _dentista_por_tipo_de_pago,
+}
+
+
+def _consulta_concurrente():
+    """
+    True si cada hilo puede consultar con su propia conexión y ver los
+    mismos datos que la conexión actual.
+    """
+    return (
+        connection.vendor != 'sqlite'
+        and not connection.in_atomic_block
+        and traza_activa() is None
+    )
+
+
+def _materializar_en_hilo(consulta):
+    try:
+        return list(consulta)
+    finally:
+        # Cada hilo abrió su propia conexión; se cierra al terminar
+        connection.close()
+
+
+def ejecutar_consultas(consultas):
+    """
+    Evalúa varios QuerySets, en paralelo si el backend lo permite.
+
+    Args:
+        consultas (dict): Nombre -> QuerySet sin evaluar.
+
+    Returns:
+        dict: Nombre -> lista de filas.
+    """
+    with fase('consulta'):
+        if len(consultas) < 2 or not _consulta_concurrente():
+            return {nombre: list(consulta) for nombre, consulta in consultas.items()}
+
+        with ThreadPoolExecutor(max_workers=len(consultas)) as pool:
+            futuros = {
+                nombre: pool.submit(_materializar_en_hilo, consulta)
+                for nombre, consulta in consultas.items()
+            }
+            return {nombre: futuro.result() for nombre, futuro in futuros.items()}
+
+
+def rango_series(inicio=None, fin=None, hoy=None):
+    """
+    Rango del tablero: el indicado, o los últimos MESES_POR_OMISION meses.
+
+    Raises:
+        ValueError: Si el rango está incompleto, invertido o es demasiado
+            largo (ver reporter.validar_rango).
+    """
+    if inicio is None and fin is None:
+        return calcular_rango_fecha('mensual', hoy or now().date(), MESES_POR_OMISION)
+    if inicio is None or fin is None:
+        raise ValueError("Indica tanto 'inicio' como 'fin'.")
+    if inicio > fin:
+        raise ValueError("'inicio' debe ser anterior o igual a 'fin'.")
+    validar_rango(inicio, fin)
+    return inicio, fin
+
+
+def series_ingresos(inicio=None, fin=None, filtros=None, series=None, hoy=None,
+                    ancho=None, nivel=None):
+    """
+    Calcula las series del tablero de ingresos.
+
+    Args:
+        inicio (date): Primer día del rango (con ``fin``).
+        fin (date): Último día del rango.
+        filtros (dict): Valor o lista de valores por clave de FILTROS_SERIES.
+        series (iterable[str]): Series a calcular (todas las de SERIES por omisión).
+        hoy (date): Fecha de referencia para el rango por omisión.
+        ancho (int): Ancho en pixeles de la gráfica de la serie de tiempo.
+        nivel (str): Nivel de NIVELES_SERIE para la serie de tiempo (se
+            elige según el rango y el ancho por omisión).
+
+    Returns:
+        dict: Nombre de serie -> lista de dicts, más 'rango' con 'inicio' y
+        'fin' y, si se pidió la serie de tiempo, 'resolucion' con su
+        'nivel', sus 'puntos' y si se 'redujo' con LTTB.
+
+    Raises:
+        ValueError: Si algún filtro, serie, nivel o fecha no es válido.
+    """
+    series = list(SERIES) if series is None else list(dict.fromkeys(series))
+    desconocidas = [nombre for nombre in series if nombre not in SERIES]
+    if desconocidas:
+        raise ValueError(
+            f"Series no válidas: {', '.join(desconocidas)}. Usa: {', '.join(SERIES)}.")
+    if nivel is not None and nivel not in NIVELES_SERIE:
+        raise ValueError(f"Nivel no válido. Usa: {', '.join(NIVELES_SERIE)}.")
+    inicio, fin = rango_series(inicio, fin, hoy)
+    nivel = nivel or elegir_nivel(inicio, fin, ancho)
+
+    rollup = filtrar(
+        IncomeDailyRollup.objects.filter(date__range=[inicio, fin]),
+        FILTROS_SERIES, filtros)
+
+    consultas = {
+        nombre: SERIES[nombre](rollup, inicio, fin)
+        for nombre in series if nombre != SERIE_TIEMPO
+    }
+    if SERIE_TIEMPO in series:
+        consultas[SERIE_TIEMPO] = _totales_diarios(rollup, inicio, fin, nivel)
+    datos = ejecutar_consultas(consultas)
+
+    if SERIE_TIEMPO in series:
+        filas = datos[SERIE_TIEMPO]
+        with fase('calculo'):
+            datos[SERIE_TIEMPO] = reducir_serie(filas, max_puntos(ancho))
+        datos['resolucion'] = {
+            'nivel': nivel,
+            'puntos': len(datos[SERIE_TIEMPO]),
+            'reducida': len(datos[SERIE_TIEMPO]) < len(filas),
+        }
+    datos['rango'] = {'inicio': inicio, 'fin': fin}
+    return datos
+
+
+def series_cacheadas(inicio=None, fin=None, filtros=None, series=None, hoy=None,
+                     ancho=None, nivel=None, usar_cache=True):
+    """
+    series_ingresos servido desde la caché con stale-while-revalidate.
+
+    Pasados CHARTS_CACHE_SOFT_TIMEOUT segundos (60 por omisión) la entrada
+    se recalcula en segundo plano mientras se sigue sirviendo; expira por
+    completo tras CHARTS_CACHE_TIMEOUT. Con traza activa o
+    ``usar_cache=False`` se calcula siempre.
+
+    Raises:
+        ValueError: Si algún filtro, serie, nivel o fecha no es válido.
+    """
+    if not usar_cache or traza_activa():
+        return series_ingresos(inicio, fin, filtros, series, hoy, ancho=ancho, nivel=nivel)
+
+    # El rango se fija aquí para que la revalidación calcule el mismo
+    inicio, fin = rango_series(inicio, fin, hoy)
+    calcular = partial(series_ingresos, inicio, fin, filtros, series, ancho=ancho, nivel=nivel)
+    # Anchos distintos con el mismo nivel y límite de puntos comparten entrada
+    argumentos = (
+        tuple(dict.fromkeys(series)) if series is not None else None,
+        normalizar_filtros(filtros),
+        nivel or elegir_nivel(inicio, fin, ancho),
+        max_puntos(ancho),
+    )
+    llave = cache.llave_reporte('graficas', argumentos, [(inicio, fin)])
+    return cache.obtener_con_revalidacion(
+        llave, calcular,
+        getattr(settings, 'CHARTS_CACHE_SOFT_TIMEOUT', 60),
+        getattr(settings, 'CHARTS_CACHE_TIMEOUT', 60 * 60 * 24))
@@ -0,0 +1,56 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.charts.eventos import EVENTO_INGRESO, EVENTO_RECARGAR, activas, publicador
+from apps.pages.models import Income
+from apps.pages.signals import incomes_bulk_changed
+
+
+def delta_de_ingreso(income):
+    """
+    Datos de un Income nuevo que el tablero suma a sus series.
+    """
+    return {
+        'id': income.pk,
+        'date': income.date,
+        'amount': income.amount,
+        'dentist_id': income.dentist_id,
+        'dentist__first_name': income.dentist.first_name,
+        'procedure_id': income.procedure_id,
+        'procedure__name': income.procedure.name,
+        'was_paid': income.was_paid,
+    }
+
+
+def _publicar_al_confirmar(evento, datos):
+    # Solo se anuncia lo que quedó confirmado en la base
+    transaction.on_commit(partial(publicador.publicar, evento, datos))
+
+
+@receiver(post_save, sender=Income)
+def ingreso_guardado(sender, instance, created, raw=False, **kwargs):
+    # Con las actualizaciones en vivo apagadas no hay a quién avisar
+    if raw or not activas():
+        return
+    if created:
+        _publicar_al_confirmar(EVENTO_INGRESO, delta_de_ingreso(instance))
+    else:
+        # Una edición no es un delta sumable: el tablero vuelve a pedir las series
+        _publicar_al_confirmar(EVENTO_RECARGAR, {'fechas': [instance.date]})
+
+
+@receiver(post_delete, sender=Income)
+def ingreso_eliminado(sender, instance, **kwargs):
+    if not activas():
+        return
+    _publicar_al_confirmar(EVENTO_RECARGAR, {'fechas': [instance.date]})
+
+
+@receiver(incomes_bulk_changed, sender=Income)
+def ingresos_masivos(sender, fechas, **kwargs):
+    if not activas():
+        return
+    _publicar_al_confirmar(EVENTO_RECARGAR, {'fechas': sorted(fechas)})
@@ -1,3 +1,430 @@
-from django.test import TestCase
+import asyncio
+import threading
+from datetime import date
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.db import connection
+from django.test import override_settings
+from django.utils.timezone import now
+
+from apps.pages.models import Income, Procedure
+from apps.reports.tests import ReportTestCase
+
+
+class IncomeSeriesTest(ReportTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other_procedure = Procedure.objects.create(
+            name="Resina", description="Resina dental", price=Decimal("800.00"))
+
+    def setUp(self):
+        super().setUp()
+        self.hoy = now().date()
+        self.crear_ingreso("100.00")
+        self.crear_ingreso("50.00", dentist=self.other_dentist, was_paid='debit')
+        self.crear_ingreso("30.00", procedure=self.other_procedure)
+        antiguo = self.crear_ingreso("999.00")
+        Income.objects.filter(pk=antiguo.pk).update(date=date(2001, 1, 15))
+
+    def test_series_del_rollup_en_el_rango(self):
+        from apps.charts.series import series_ingresos
+
+        with self.assertNumQueries(5):
+            datos = series_ingresos()
+
+        # El ingreso de 2001 queda fuera de los últimos 12 meses
+        self.assertEqual(datos['daily_totals'], [{'date': self.hoy, 'total': Decimal("180.00")}])
+        self.assertEqual(
+            datos['procedure_counts'],
+            [{'procedure__name': "Limpieza", 'count': 2}, {'procedure__name': "Resina", 'count': 1}])
+        self.assertEqual(
+            datos['monthly_totals'], [{'month': self.hoy.replace(day=1), 'total': Decimal("180.00")}])
+        self.assertEqual(
+            datos['monthly_by_type'],
+            [{'was_paid': 'cash', 'total': Decimal("130.00")},
+             {'was_paid': 'debit', 'total': Decimal("50.00")}])
+        self.assertEqual(len(datos['dentist_by_type']), 2)
+
+    def test_filtros_y_series_pedidas(self):
+        from apps.charts.series import series_ingresos
+
+        with self.assertNumQueries(1):
+            datos = series_ingresos(
+                date(2001, 1, 1), self.hoy, {'dentista': [self.dentist.pk]},
+                series=['monthly_by_type'])
+        self.assertEqual(set(datos), {'monthly_by_type', 'rango'})
+        self.assertEqual(
+            datos['monthly_by_type'], [{'was_paid': 'cash', 'total': Decimal("1129.00")}])
+
+        datos = series_ingresos(filtros={'procedimiento': self.other_procedure.pk, 'tipo_pago': 'cash'})
+        self.assertEqual(datos['daily_totals'], [{'date': self.hoy, 'total': Decimal("30.00")}])
+
+        with self.assertRaises(ValueError):
+            series_ingresos(series=['scatter'])
+        with self.assertRaises(ValueError):
+            series_ingresos(inicio=self.hoy)
+
+    def test_consultas_en_paralelo(self):
+        from apps.charts import series
+
+        hilos = {}
+
+        def consulta(nombre):
+            hilos[nombre] = threading.current_thread()
+            yield nombre
+
+        with mock.patch.object(series, '_consulta_concurrente', return_value=True):
+            datos = series.ejecutar_consultas({nombre: consulta(nombre) for nombre in 'abc'})
+        self.assertEqual(datos, {'a': ['a'], 'b': ['b'], 'c': ['c']})
+        self.assertNotIn(threading.current_thread(), hilos.values())
+
+        # En SQLite y dentro de una transacción se usa la conexión actual
+        self.assertFalse(series._consulta_concurrente())
+
+    def test_endpoint(self):
+        respuesta = self.client.get(
+            '/charts/income-data/',
+            {'dentista': f"{self.dentist.pk}", 'series': 'daily_totals,monthly_totals'})
+        datos = respuesta.json()
+        self.assertEqual(set(datos), {'daily_totals', 'monthly_totals', 'rango', 'resolucion'})
+        self.assertEqual(
+            [(fila['date'], Decimal(fila['total'])) for fila in datos['daily_totals']],
+            [(self.hoy.isoformat(), Decimal("130.00"))])
+
+        for parametros in ({'dentista': 'ana'}, {'series': 'otra'}, {'inicio': '2025-13-01'}):
+            respuesta = self.client.get('/charts/income-data/', parametros)
+            self.assertEqual(respuesta.status_code, 400)
+            self.assertFalse(respuesta.json()['success'])
+
+        # Un rango enorme se rechaza antes de armar la llave de caché
+        with mock.patch('apps.reports.cache._generaciones') as generaciones:
+            respuesta = self.client.get(
+                '/charts/income-data/', {'inicio': '0001-01-01', 'fin': '9999-12-31'})
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn("50 años", respuesta.json()['message'])
+        generaciones.assert_not_called()
+
+    def test_piramide_y_lttb(self):
+        from datetime import timedelta
+
+        from apps.charts.series import elegir_nivel, series_ingresos
+        from apps.reports.models import IncomeDailyRollup
+
+        inicio, fin = date(2020, 1, 1), date(2022, 12, 31)
+        self.assertEqual(elegir_nivel(inicio, fin), 'diario')
+        self.assertEqual(elegir_nivel(inicio, fin, ancho=200), 'semanal')
+        self.assertEqual(elegir_nivel(date(2010, 1, 1), date(2019, 12, 31), ancho=100), 'mensual')
+        self.assertEqual(elegir_nivel(date(2000, 1, 1), date(2049, 12, 31), ancho=100), 'anual')
+
+        # Un pico aislado debe sobrevivir a la reducción
+        dias = [inicio + timedelta(days=n) for n in range((fin - inicio).days + 1)]
+        IncomeDailyRollup.objects.bulk_create([
+            IncomeDailyRollup(
+                date=dia, dentist=self.dentist, procedure=self.procedure, was_paid='cash',
+                total_amount=Decimal(9000 if dia == date(2021, 6, 15) else 100 + n % 7),
+                income_count=1)
+            for n, dia in enumerate(dias)
+        ])
+
+        datos = series_ingresos(inicio, fin, series=['daily_totals'], ancho=600)
+        self.assertEqual(datos['resolucion'], {'nivel': 'diario', 'puntos': 300, 'reducida': True})
+        serie = datos['daily_totals']
+        self.assertEqual((serie[0]['date'], serie[-1]['date']), (inicio, fin))
+        self.assertIn({'date': date(2021, 6, 15), 'total': Decimal(9000)}, serie)
+
+        datos = series_ingresos(inicio, fin, series=['daily_totals'], nivel='mensual')
+        self.assertEqual(datos['resolucion'], {'nivel': 'mensual', 'puntos': 36, 'reducida': False})
+        self.assertEqual(datos['daily_totals'][0]['date'], inicio)
+        self.assertEqual(
+            sum(fila['total'] for fila in datos['daily_totals']),
+            sum(IncomeDailyRollup.objects.filter(
+                date__range=[inicio, fin]).values_list('total_amount', flat=True)))
+
+        with self.assertRaises(ValueError):
+            series_ingresos(inicio, fin, nivel='fiscal')
+        self.assertEqual(
+            self.client.get('/charts/income-data/', {'ancho': '0'}).status_code, 400)
+
+    def test_index_sin_filas_embebidas(self):
+        respuesta = self.client.get('/charts/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotIn('products', respuesta.context)
+        self.assertNotContains(respuesta, '999.00')
+
+    def test_detalle_paginado_por_llave(self):
+        import json
+
+        from django.contrib.auth.models import User
+
+        self.assertEqual(self.client.get('/charts/income-rows/').status_code, 302)
+        self.client.force_login(User.objects.create_user("recepcion", password="x"))
+
+        def pagina(**parametros):
+            respuesta = self.client.get('/charts/income-rows/', parametros)
+            self.assertEqual(respuesta['Content-Type'], 'application/json')
+            return json.loads(b''.join(respuesta.streaming_content))
+
+        primera = pagina(limite=2)
+        self.assertEqual([fila['amount'] for fila in primera['filas']], ["30.00", "50.00"])
+        self.assertIsNotNone(primera['siguiente'])
+        segunda = pagina(limite=2, cursor=primera['siguiente'])
+        # El ingreso de 2001 queda fuera del rango por omisión
+        self.assertEqual([fila['amount'] for fila in segunda['filas']], ["100.00"])
+        self.assertIsNone(segunda['siguiente'])
+
+        filtrada = pagina(inicio='2001-01-01', fin=self.hoy.isoformat(), dentista=self.dentist.pk)
+        self.assertEqual(
+            [fila['amount'] for fila in filtrada['filas']], ["30.00", "100.00", "999.00"])
+        self.assertEqual(
+            set(filtrada['filas'][0]),
+            {'id', 'date', 'dentist_id', 'dentist__first_name', 'dentist__last_name',
+             'procedure__name', 'amount', 'was_paid'})
+
+        for parametros in ({'limite': '5000'}, {'cursor': 'x'}, {'tipo_pago': 'cash', 'fin': '2025-01-01'}):
+            self.assertEqual(
+                self.client.get('/charts/income-rows/', parametros).status_code, 400)
+
+    @skipUnless(connection.vendor == 'sqlite', "El plan se lee en el formato de SQLite")
+    def test_filtros_usan_indices(self):
+        from apps.charts.detalle import filas_ingresos
+        from apps.charts.series import FILTROS_SERIES, SERIES
+        from apps.reports.especificacion import filtrar
+        from apps.reports.models import IncomeDailyRollup
+
+        inicio = date(2001, 1, 1)
+        indices = {
+            'dentista': ({'dentista': [self.dentist.pk]}, 'pages_income_dentist_date'),
+            'procedimiento': ({'procedimiento': [self.procedure.pk]}, 'pages_income_procedure_date'),
+            'tipo_pago': ({'tipo_pago': ['cash']}, 'pages_income_was_paid_date'),
+        }
+        for nombre, (filtros, indice) in indices.items():
+            with self.subTest(nombre):
+                plan = filas_ingresos(inicio, self.hoy, filtros).explain()
+                self.assertIn(f"USING INDEX {indice}", plan)
+                self.assertNotIn("SCAN pages_income", plan)
+
+                rollup = filtrar(
+                    IncomeDailyRollup.objects.filter(date__range=[inicio, self.hoy]),
+                    FILTROS_SERIES, filtros)
+                for serie, consulta in SERIES.items():
+                    plan = consulta(rollup, inicio, self.hoy).explain()
+                    self.assertIn("USING INDEX", plan, serie)
+                    self.assertNotIn("SCAN reports_incomedailyrollup", plan, serie)
+
+    def test_index_con_filtros(self):
+        from django.contrib.auth.models import User
+
+        self.client.force_login(User.objects.create_user("recepcion", password="x"))
+        respuesta = self.client.get('/charts/', {'dentista': self.other_dentist.pk, 'tipo_pago': 'debit'})
+        self.assertEqual(respuesta.context['seleccion']['dentista'], [str(self.other_dentist.pk)])
+        self.assertContains(respuesta, f'<option value="{self.other_dentist.pk}" selected>')
+        self.assertContains(respuesta, '<option value="debit" selected>')
+
+    def test_cache_stale_while_revalidate(self):
+        from apps.charts.series import series_cacheadas
+        from apps.reports import cache as cache_reportes
+        from apps.reports.models import IncomeDailyRollup
+
+        def total(datos):
+            return sum(fila['total'] for fila in datos['monthly_by_type'])
+
+        series = ['monthly_by_type']
+        self.assertEqual(total(series_cacheadas(series=series)), Decimal("180.00"))
+        # Solo se leen las generaciones
+        with self.assertNumQueries(1):
+            series_cacheadas(series=series)
+        # La llave cubre los filtros
+        self.assertEqual(
+            total(series_cacheadas(series=series, filtros={'tipo_pago': 'debit'})), Decimal("50.00"))
+
+        # Una escritura de Income en el rango invalida la entrada
+        with self.captureOnCommitCallbacks(execute=True):
+            self.crear_ingreso("20.00")
+        self.assertEqual(total(series_cacheadas(series=series)), Decimal("200.00"))
+
+        # Entrada vencida: se sirve la anterior y solo una solicitud revalida
+        IncomeDailyRollup.objects.update(total_amount=Decimal("1.00"))
+        tareas = []
+        with override_settings(CHARTS_CACHE_SOFT_TIMEOUT=-1), \
+                mock.patch.object(cache_reportes, 'revalidar_en_segundo_plano', tareas.append):
+            self.assertEqual(total(series_cacheadas(series=series)), Decimal("200.00"))
+            self.assertEqual(total(series_cacheadas(series=series)), Decimal("200.00"))
+            self.assertEqual(len(tareas), 1)
+
+            tareas[0]()
+            self.assertEqual(total(series_cacheadas(series=series)), Decimal("3.00"))
+            self.assertEqual(len(tareas), 2)
+
+    def test_formato_columnar_y_compresion(self):
+        import gzip
+        import json
+        from datetime import timedelta
+
+        from apps.reports.models import IncomeDailyRollup
+
+        inicio = date(2022, 1, 1)
+        IncomeDailyRollup.objects.bulk_create([
+            IncomeDailyRollup(
+                date=inicio + timedelta(days=dia), dentist=dentista, procedure=procedimiento,
+                was_paid=tipo, total_amount=Decimal(100 + dia % 50), income_count=1)
+            for dia in range(365)
+            for dentista in (self.dentist, self.other_dentist)
+            for procedimiento in (self.procedure, self.other_procedure)
+            for tipo in ('cash', 'debit')
+        ])
+        parametros = {'inicio': '2022-01-01', 'fin': '2022-12-31'}
+
+        filas = self.client.get('/charts/income-data/', parametros)
+        self.assertEqual(filas['Content-Type'], 'application/json')
+        self.assertNotIn('Content-Encoding', filas)
+
+        columnar = self.client.get(
+            '/charts/income-data/', parametros,
+            HTTP_ACCEPT='application/vnd.dental.columnar+json', HTTP_ACCEPT_ENCODING='gzip, br;q=0')
+        self.assertEqual(columnar['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', columnar['Vary'])
+        datos = json.loads(gzip.decompress(columnar.content))
+        # Solo gzip: un cliente que pide br recibe la respuesta sin comprimir
+        self.assertNotIn('Content-Encoding', self.client.get(
+            '/charts/income-data/', parametros, HTTP_ACCEPT_ENCODING='br'))
+
+        # Mismos datos: arreglos paralelos, montos numéricos y categorías con diccionario
+        original = filas.json()
+        serie = datos['dentist_by_type']
+        self.assertEqual(serie['filas'], len(original['dentist_by_type']))
+        nombres = serie['columnas']['dentist__first_name']
+        self.assertEqual(nombres['valores'], ["Ana", "Luis"])
+        self.assertEqual(
+            [(nombres['valores'][codigo], total) for codigo, total
+             in zip(nombres['codigos'], serie['columnas']['total'])],
+            [(fila['dentist__first_name'], float(fila['total'])) for fila in original['dentist_by_type']])
+        self.assertEqual(
+            datos['daily_totals']['columnas']['date'][:2], ['2022-01-01', '2022-01-02'])
+        self.assertEqual(datos['rango'], original['rango'])
+
+        self.assertGreaterEqual(len(filas.content) / len(columnar.content), 5)
+        self.assertEqual(
+            self.client.get('/charts/income-data/', {**parametros, 'formato': 'columnar'})['Content-Type'],
+            'application/vnd.dental.columnar+json')
+
+
+@override_settings(CHARTS_LIVE_UPDATES=True)
+class LiveUpdatesTest(ReportTestCase):
+
+    def test_delta_publicado_al_confirmar(self):
+        from apps.charts.eventos import publicador
+
+        with mock.patch.object(publicador, 'publicar') as publicar:
+            with self.captureOnCommitCallbacks(execute=True):
+                income = Income.objects.create(
+                    dentist=self.dentist, patient=self.patient, procedure=self.procedure,
+                    amount=Decimal("120.00"), was_paid='card')
+                publicar.assert_not_called()
+            publicar.assert_called_once_with('ingreso', {
+                'id': income.pk, 'date': income.date, 'amount': Decimal("120.00"),
+                'dentist_id': self.dentist.pk, 'dentist__first_name': "Ana",
+                'procedure_id': self.procedure.pk, 'procedure__name': "Limpieza",
+                'was_paid': 'card',
+            })
+
+            with self.captureOnCommitCallbacks(execute=True):
+                Income.objects.filter(pk=income.pk).update(was_paid='cash')
+            publicar.assert_called_with('recargar', {'fechas': [income.date]})
+
+    async def test_publicador_en_proceso_con_muchas_conexiones(self):
+        from apps.charts.eventos import Publicador, stream_eventos
+
+        publicador = Publicador()
+        conexiones = [stream_eventos(publicador, keepalive=60) for _ in range(300)]
+        for conexion in conexiones:
+            self.assertEqual(await anext(conexion), "retry: 5000\n\n")
+        self.assertEqual(len(publicador), 300)
+
+        siguientes = [asyncio.ensure_future(anext(conexion)) for conexion in conexiones]
+        await asyncio.sleep(0)
+        publicador.publicar('ingreso', {'amount': Decimal("10.50"), 'was_paid': 'cash'})
+        mensajes = await asyncio.gather(*siguientes)
+        self.assertEqual(
+            set(mensajes), {'event: ingreso\ndata: {"amount": "10.50", "was_paid": "cash"}\n\n'})
+
+        # Sin eventos la conexión envía keepalive; al cerrarla se cancela la suscripción
+        inactiva = stream_eventos(publicador, keepalive=0.01)
+        await anext(inactiva)
+        self.assertEqual(await anext(inactiva), ": keepalive\n\n")
+        for conexion in conexiones + [inactiva]:
+            await conexion.aclose()
+        self.assertEqual(len(publicador), 0)
+
+    async def test_cola_llena_pide_recargar(self):
+        from apps.charts.eventos import Publicador, stream_eventos
+
+        publicador = Publicador()
+        conexion = stream_eventos(publicador)
+        await anext(conexion)
+        for numero in range(150):
+            publicador.publicar('ingreso', {'id': numero})
+        await asyncio.sleep(0)
+        self.assertIn('event: recargar', await anext(conexion))
+        await conexion.aclose()
+
+    async def test_endpoint_asgi(self):
+        from asgiref.sync import sync_to_async
+        from django.contrib.auth.models import User
+
+        from apps.charts.eventos import publicador
+
+        respuesta = await self.async_client.get('/charts/income-stream/')
+        self.assertEqual(respuesta.status_code, 403)
+
+        usuario = await sync_to_async(User.objects.create_user)("recepcion", password="x")
+        await sync_to_async(self.async_client.force_login)(usuario)
+        respuesta = await self.async_client.get('/charts/income-stream/')
+        self.assertEqual(respuesta['Content-Type'], 'text/event-stream')
+        contenido = aiter(respuesta.streaming_content)
+        self.assertEqual(await anext(contenido), b"retry: 5000\n\n")
+        publicador.publicar('recargar', {'fechas': None})
+        self.assertEqual(await anext(contenido), b'event: recargar\ndata: {"fechas": null}\n\n')
+        await contenido.aclose()
+
+        # Bajo WSGI no se abre el stream
+        self.assertEqual(
+            (await sync_to_async(self.client.get)('/charts/income-stream/')).status_code, 204)
+
+        # Apagado (el valor por omisión), tampoco bajo ASGI
+        with override_settings(CHARTS_LIVE_UPDATES=False):
+            respuesta = await self.async_client.get('/charts/income-stream/')
+        self.assertEqual(respuesta.status_code, 204)
+
+    async def test_stream_con_duracion_acotada(self):
+        from apps.charts.eventos import Publicador, stream_eventos
+
+        # El stream se cierra solo y el navegador reconecta tras ``retry``,
+        # aunque Django no avise que el cliente se fue
+        publicador = Publicador()
+        conexion = stream_eventos(publicador, keepalive=0.01, duracion=0.05)
+        mensajes = [mensaje async for mensaje in conexion]
+        self.assertEqual(mensajes[0], "retry: 5000\n\n")
+        self.assertTrue(set(mensajes[1:]) <= {": keepalive\n\n"})
+        self.assertEqual(len(publicador), 0)
+
+    def test_apagado_no_publica_ni_suscribe(self):
+        from django.contrib.auth.models import User
+
+        from apps.charts.eventos import publicador
+
+        with override_settings(CHARTS_LIVE_UPDATES=False), \
+                mock.patch.object(publicador, 'publicar') as publicar:
+            with self.captureOnCommitCallbacks(execute=True):
+                Income.objects.create(
+                    dentist=self.dentist, patient=self.patient, procedure=self.procedure,
+                    amount=Decimal("120.00"))
+            publicar.assert_not_called()
+
+            # El tablero no abre el EventSource
+            self.client.force_login(User.objects.create_user("recepcion", password="x"))
+            respuesta = self.client.get('/charts/')
+        self.assertFalse(respuesta.context['en_vivo'])
+        self.assertContains(respuesta, "if (true || !window.EventSource)")
@@ -5,4 +5,6 @@ from apps.charts import views
 urlpatterns = [
     path("", views.index, name="charts"),
     path("income-data/", views.get_income_data, name='income-data'),
+    path("income-rows/", views.income_rows, name='income-rows'),
+    path("income-stream/", views.income_stream, name='income-stream'),
 ]
@@ -1,38 +1,165 @@
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.core.handlers.asgi import ASGIRequest
+from django.http import (
+    HttpResponse, HttpResponseForbidden, HttpResponseNotAllowed, JsonResponse,
+    StreamingHttpResponse)
 from django.shortcuts import render
-from django.core import serializers
-from apps.pages.models import Income
-from django.http import JsonResponse
-from django.db.models import Sum, Count
-from django.db.models.functions import TruncMonth
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_GET
+from apps.charts.columnar import MEDIA_COLUMNAR, datos_columnares, formato_columnar, json_compacto
+from apps.charts.detalle import LIMITE_POR_OMISION, filas_ingresos, iterar_pagina_json, leer_cursor
+from apps.charts.eventos import activas, stream_eventos
+from apps.charts.series import FILTROS_SERIES, series_cacheadas, series_ingresos
+from apps.pages.models import Dentist, Income, Procedure
+from apps.reports.traza import ejecutar_con_traza, traza_solicitada
 # Create your views here.
 
 
 def index(request):
-    Incomes = serializers.serialize('json', Income.objects.all())
+    # Las series y el detalle se piden por API; la página solo lleva las
+    # opciones de los filtros, que se envían a la API en la query string
     context = {
         'segment': 'charts',
-        'products': Incomes
+        'dentistas': Dentist.objects.order_by('last_name', 'first_name').values_list(
+            'pk', 'first_name', 'last_name'),
+        'procedimientos': Procedure.objects.order_by('name').values_list('pk', 'name'),
+        'tipos_pago': Income._meta.get_field('was_paid').choices,
+        'seleccion': {nombre: _valores(request, nombre) for nombre in FILTROS_SERIES},
+        'inicio': request.GET.get('inicio', ''),
+        'fin': request.GET.get('fin', ''),
+        'en_vivo': activas(),
     }
     return render(request, 'charts/index.html', context)
 
 
-def get_income_data(request):
-    daily_totals = Income.objects.values('date').annotate(total=Sum('amount'))
-    procedure_counts = Income.objects.values(
-        'procedure__name').annotate(count=Count('id'))
-    monthly_totals = Income.objects.annotate(month=TruncMonth(
-        'date')).values('month').annotate(total=Sum('amount'))
-    monthly_by_type = Income.objects.values(
-        'was_paid').annotate(total=Sum('amount'))
-    dentist_by_type = Income.objects.values(
-        'dentist__first_name', 'was_paid').annotate(total=Sum('amount'))
-
-    data = {
-        "daily_totals": list(daily_totals),
-        "procedure_counts": list(procedure_counts),
-        "monthly_totals": list(monthly_totals),
-        "monthly_by_type": list(monthly_by_type),
-        "dentist_by_type": list(dentist_by_type),
+def _valores(request, nombre):
+    # Admite ?dentista=1&dentista=2 y ?dentista=1,2
+    return [
+        valor for parametro in request.GET.getlist(nombre)
+        for valor in parametro.split(',') if valor
+    ]
+
+
+def _fecha(request, nombre):
+    valor = request.GET.get(nombre)
+    return date.fromisoformat(valor) if valor else None
+
+
+def _entero(request, nombre):
+    valor = request.GET.get(nombre)
+    if valor is None:
+        return None
+    if not valor.isdigit() or int(valor) < 1:
+        raise ValueError(f"'{nombre}' debe ser un entero positivo.")
+    return int(valor)
+
+
+def argumentos_filtros(request):
+    """
+    Lee rango y filtros de la query string:
+    ``?inicio=2025-01-01&fin=2025-06-30&dentista=1,2&procedimiento=3&tipo_pago=cash``.
+
+    Raises:
+        ValueError: Si algún parámetro no es válido.
+    """
+    filtros = {}
+    for nombre in FILTROS_SERIES:
+        valores = _valores(request, nombre)
+        if nombre in ('dentista', 'procedimiento'):
+            for valor in valores:
+                if not valor.isdigit():
+                    raise ValueError(f"Id de {nombre} no válido: {valor!r}.")
+            valores = [int(valor) for valor in valores]
+        if valores:
+            filtros[nombre] = valores
+
+    return {
+        'inicio': _fecha(request, 'inicio'),
+        'fin': _fecha(request, 'fin'),
+        'filtros': filtros,
     }
 
-    return JsonResponse(data)
+
+def argumentos_series(request):
+    """
+    Lee rango y filtros (ver argumentos_filtros), las series pedidas
+    (``series=daily_totals,monthly_totals``) y, para la serie de tiempo,
+    ``ancho`` (pixeles de la gráfica) y ``nivel``.
+
+    Raises:
+        ValueError: Si algún parámetro no es válido.
+    """
+    return {
+        **argumentos_filtros(request),
+        'ancho': _entero(request, 'ancho'),
+        'nivel': request.GET.get('nivel') or None,
+        'series': _valores(request, 'series') or None,
+    }
+
+
+@gzip_page
+def get_income_data(request):
+    try:
+        argumentos = argumentos_series(request)
+        # ?trace=1 (solo staff) agrega la traza de SQL y tiempos a la respuesta
+        if traza_solicitada(request):
+            data, traza = ejecutar_con_traza(series_ingresos, **argumentos)
+            data['_traza'] = traza.como_dict()
+        else:
+            data = series_cacheadas(**argumentos)
+    except ValueError as e:
+        return JsonResponse({
+            'message': 'Input Error = ' + str(e),
+            'success': False
+        }, status=400)
+
+    # Columnar con ?formato=columnar o Accept: MEDIA_COLUMNAR; gzip_page comprime
+    # según Accept-Encoding
+    if formato_columnar(request):
+        respuesta = HttpResponse(json_compacto(datos_columnares(data)), content_type=MEDIA_COLUMNAR)
+    else:
+        respuesta = JsonResponse(data)
+    patch_vary_headers(respuesta, ['Accept'])
+    return respuesta
+
+
+@login_required(login_url='/accounts/login/')
+@require_GET
+def income_rows(request):
+    # ?limite=100&cursor=<siguiente de la página anterior>, más rango y filtros
+    try:
+        limite = _entero(request, 'limite') or LIMITE_POR_OMISION
+        cursor = request.GET.get('cursor')
+        filas = filas_ingresos(
+            **argumentos_filtros(request), limite=limite,
+            despues=leer_cursor(cursor) if cursor else None)
+    except ValueError as e:
+        return JsonResponse({
+            'message': 'Input Error = ' + str(e),
+            'success': False
+        }, status=400)
+
+    return StreamingHttpResponse(
+        iterar_pagina_json(filas, limite), content_type='application/json')
+
+
+async def income_stream(request):
+    # Stream SSE de deltas de Income; solo tiene sentido servido por config.asgi
+    # en un único proceso (settings.CHARTS_LIVE_UPDATES)
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    if not activas() or not isinstance(request, ASGIRequest):
+        # Bajo WSGI cada conexión ocuparía un hilo: 204 le indica al
+        # navegador que no reconecte y el tablero queda sin actualización en vivo
+        return HttpResponse(status=204)
+    if not await sync_to_async(lambda: request.user.is_authenticated)():
+        return HttpResponseForbidden()
+
+    respuesta = StreamingHttpResponse(stream_eventos(), content_type='text/event-stream')
+    respuesta['Cache-Control'] = 'no-cache'
+    respuesta['X-Accel-Buffering'] = 'no'
+    return respuesta
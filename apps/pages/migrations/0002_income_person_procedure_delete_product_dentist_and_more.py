@@ -0,0 +1,79 @@
+# Generated by Django 4.2.9 on 2025-03-30 11:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Income',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('date', models.DateField(auto_now=True)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('was_paid', models.CharField(choices=[('debit', 'Tarjeta de Débito'), ('credit', 'Tarjeta de Crédito'), ('cash', 'Efectivo'), ('transfer', 'Transferencia'), ('check', 'Cheque')], default='cash', max_length=10)),
+                ('is_facturable', models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Person',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('first_name', models.CharField(max_length=100)),
+                ('last_name', models.CharField(max_length=100)),
+                ('email', models.EmailField(max_length=100)),
+                ('phone_default', models.CharField(max_length=15)),
+                ('phone_alternate', models.CharField(blank=True, max_length=15, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Procedure',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100)),
+                ('description', models.TextField()),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+            ],
+        ),
+        migrations.DeleteModel(
+            name='Product',
+        ),
+        migrations.CreateModel(
+            name='Dentist',
+            fields=[
+                ('person_ptr', models.OneToOneField(auto_created=True, on_delete=django.db.models.deletion.CASCADE, parent_link=True, primary_key=True, serialize=False, to='pages.person')),
+                ('percentage', models.DecimalField(decimal_places=2, default=0.3, max_digits=3)),
+                ('level', models.CharField(default='common', max_length=100)),
+            ],
+            bases=('pages.person',),
+        ),
+        migrations.CreateModel(
+            name='Patient',
+            fields=[
+                ('person_ptr', models.OneToOneField(auto_created=True, on_delete=django.db.models.deletion.CASCADE, parent_link=True, primary_key=True, serialize=False, to='pages.person')),
+                ('level', models.CharField(default='common', max_length=100)),
+            ],
+            bases=('pages.person',),
+        ),
+        migrations.AddField(
+            model_name='income',
+            name='procedure',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='pages.procedure'),
+        ),
+        migrations.AddField(
+            model_name='income',
+            name='dentist',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='pages.dentist'),
+        ),
+        migrations.AddField(
+            model_name='income',
+            name='patient',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='pages.patient'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.9 on 2026-10-18 13:38
+
+from django.db import migrations, models
+
+
+def congelar_comisiones(apps, schema_editor):
+    # Los ingresos existentes congelan el porcentaje actual de su dentista,
+    # el mismo que usaba el rollup antes de esta migración
+    Income = apps.get_model('pages', 'Income')
+    Dentist = apps.get_model('pages', 'Dentist')
+    porcentaje = models.Subquery(
+        Dentist.objects.filter(pk=models.OuterRef('dentist_id')).values('percentage')[:1])
+    Income.objects.filter(commission_rate__isnull=True).update(
+        commission_rate=porcentaje,
+        commission_amount=models.ExpressionWrapper(
+            models.F('amount') * porcentaje,
+            output_field=models.DecimalField(max_digits=12, decimal_places=4)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0002_income_person_procedure_delete_product_dentist_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='income',
+            name='commission_amount',
+            field=models.DecimalField(blank=True, decimal_places=4, editable=False, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='income',
+            name='commission_rate',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=3, null=True),
+        ),
+        migrations.RunPython(congelar_comisiones, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.9 on 2026-10-18 14:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0003_income_commission_amount_income_commission_rate'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='income',
+            index=models.Index(fields=['dentist', 'date'], name='pages_income_dentist_date'),
+        ),
+        migrations.AddIndex(
+            model_name='income',
+            index=models.Index(fields=['procedure', 'date'], name='pages_income_procedure_date'),
+        ),
+        migrations.AddIndex(
+            model_name='income',
+            index=models.Index(fields=['was_paid', 'date'], name='pages_income_was_paid_date'),
+        ),
+    ]
@@ -1,5 +1,9 @@
+from decimal import Decimal
+
 from django.db import models
 
+from apps.pages.signals import incomes_bulk_changed, incomes_bulk_changing
+
 
 class Person(models.Model):
     """
@@ -51,6 +55,98 @@ class Procedure(models.Model):
         return f"{self.name} - ${self.price}"
 
 
+COMMISSION_FIELDS = ('commission_rate', 'commission_amount')
+
+COMMISSION_AMOUNT_FIELD = models.DecimalField(max_digits=12, decimal_places=4)
+
+
+def commission_amount(amount, rate):
+    """
+    Commission for an amount at a rate, exact to the 4 decimals it is stored with.
+    """
+    return (Decimal(str(amount)) * Decimal(str(rate))).quantize(Decimal('0.0001'))
+
+
+class IncomeQuerySet(models.QuerySet):
+    """
+    QuerySet for incomes that announces bulk writes through incomes_bulk_changing
+    (before, so they can be rejected) and incomes_bulk_changed (after), and
+    keeps the commission snapshot in sync on bulk paths.
+    """
+
+    def _snapshot_commissions(self, objs, refresh=False):
+        """
+        Fill commission_rate (from the dentist, when missing or when
+        ``refresh`` and the dentist changed) and commission_amount.
+        """
+        pending = [
+            obj for obj in objs
+            if obj.commission_rate is None or (refresh and obj._dentist_changed())
+        ]
+        rates = dict(Dentist.objects.filter(
+            pk__in={obj.dentist_id for obj in pending}).values_list('pk', 'percentage'))
+        for obj in pending:
+            obj.commission_rate = rates[obj.dentist_id]
+        for obj in objs:
+            obj.commission_amount = commission_amount(obj.amount, obj.commission_rate)
+
+    def _check(self, fechas):
+        fechas = {fecha for fecha in fechas if fecha is not None}
+        if fechas:
+            incomes_bulk_changing.send(sender=self.model, fechas=fechas)
+
+    def _notify(self, fechas):
+        fechas = {fecha for fecha in fechas if fecha is not None}
+        if fechas:
+            incomes_bulk_changed.send(sender=self.model, fechas=fechas)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        # No check: date is auto_now, so new rows are always dated today
+        objs = list(objs)
+        self._snapshot_commissions(objs)
+        objs = super().bulk_create(objs, *args, **kwargs)
+        self._notify(obj.date for obj in objs)
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        fechas = set(self.model._base_manager.filter(
+            pk__in=[obj.pk for obj in objs]).values_list('date', flat=True))
+        self._check(fechas | ({obj.date for obj in objs} if 'date' in fields else set()))
+        if {'amount', 'dentist', 'dentist_id'} & set(fields):
+            self._snapshot_commissions(objs, refresh=True)
+            fields = list(dict.fromkeys([*fields, *COMMISSION_FIELDS]))
+        rows = super().bulk_update(objs, fields, *args, **kwargs)
+        self._notify(fechas | {obj.date for obj in objs})
+        return rows
+
+    def update(self, **kwargs):
+        dentist = kwargs.get('dentist', kwargs.get('dentist_id'))
+        if dentist is not None or 'amount' in kwargs:
+            amount = kwargs.get('amount', models.F('amount'))
+            if not hasattr(amount, 'resolve_expression'):
+                amount = models.Value(amount)
+            if dentist is not None:
+                rate = Dentist.objects.values_list('percentage', flat=True).get(
+                    pk=getattr(dentist, 'pk', dentist))
+                kwargs['commission_rate'] = rate
+                rate = models.Value(rate)
+            else:
+                rate = models.F('commission_rate')
+            kwargs['commission_amount'] = models.ExpressionWrapper(
+                amount * rate, output_field=COMMISSION_AMOUNT_FIELD)
+        affected = dict(self.values_list('pk', 'date'))
+        fechas = set(affected.values())
+        new_date = kwargs.get('date')
+        self._check(fechas if hasattr(new_date, 'resolve_expression') else fechas | {new_date})
+        rows = super().update(**kwargs)
+        if 'date' in kwargs:
+            fechas |= set(self.model._base_manager.filter(
+                pk__in=affected).values_list('date', flat=True))
+        self._notify(fechas)
+        return rows
+
+
 class Income(models.Model):
     """
     Model to store incomes of the clinic.
@@ -74,6 +170,49 @@ class Income(models.Model):
         default='cash'
     )
     is_facturable = models.BooleanField(default=False)
+    # Commission snapshot: the dentist's rate when the income was written and
+    # the resulting amount, so later rate changes don't rewrite history.
+    commission_rate = models.DecimalField(
+        max_digits=3, decimal_places=2, null=True, blank=True, editable=False)
+    commission_amount = models.DecimalField(
+        max_digits=12, decimal_places=4, null=True, blank=True, editable=False)
+
+    objects = IncomeQuerySet.as_manager()
+
+    class Meta:
+        # Chart and detail queries filter a date range plus one of these
+        # columns; the equality column goes first so the range stays contiguous.
+        indexes = [
+            models.Index(fields=['dentist', 'date'], name='pages_income_dentist_date'),
+            models.Index(fields=['procedure', 'date'], name='pages_income_procedure_date'),
+            models.Index(fields=['was_paid', 'date'], name='pages_income_was_paid_date'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_dentist_id = instance.__dict__.get('dentist_id')
+        return instance
+
+    def _dentist_changed(self):
+        return self.dentist_id != getattr(self, '_loaded_dentist_id', self.dentist_id)
+
+    def snapshot_commission(self):
+        """
+        Take the dentist's rate if there is none yet (or the dentist changed)
+        and recompute the commission amount.
+        """
+        if self.commission_rate is None or self._dentist_changed():
+            self.commission_rate = self.dentist.percentage
+        self.commission_amount = commission_amount(self.amount, self.commission_rate)
+
+    def save(self, *args, **kwargs):
+        self.snapshot_commission()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, *COMMISSION_FIELDS}
+        super().save(*args, **kwargs)
+        self._loaded_dentist_id = self.dentist_id
 
     def __str__(self):
         return f"Income {self.id} - {self.date} - ${self.amount}"
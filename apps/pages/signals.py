@@ -0,0 +1,11 @@
+from django.dispatch import Signal
+
+# Sent after bulk writes on Income that bypass post_save/post_delete
+# (bulk_create, bulk_update and QuerySet.update).
+# Arguments: sender (the Income model), fechas (set of affected dates).
+incomes_bulk_changed = Signal()
+
+# Sent before those same bulk writes, with the dates they will touch (the
+# stored ones and any new ones). A receiver may raise to reject the write.
+# Arguments: sender (the Income model), fechas (set of dates).
+incomes_bulk_changing = Signal()
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ChartsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.reports'
+
+    def ready(self):
+        from apps.reports import signals  # noqa: F401
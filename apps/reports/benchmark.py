@@ -0,0 +1,224 @@
+"""
+Benchmark de las funciones de apps.reports.
+
+Siembra datos sintéticos (Dentist, Patient, Procedure, Income) en la base de
+datos actual y mide, para cada función y período, el tiempo de pared, el
+número de consultas y la memoria pico. Las funciones de este módulo asumen
+que la base de datos es desechable; el comando ``benchmark_reportes`` crea
+una base temporal para ejecutarlas. La caché se sustituye durante cada
+medición por una LocMemCache propia, así que no se toca la caché configurada.
+"""
+import os
+import platform
+import random
+import statistics
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+import django
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils.timezone import now
+
+from apps.pages.models import Dentist, Income, Patient, Procedure
+from apps.reports import reporter
+
+PERIODOS = ['semanal', 'mensual', 'trimestral', 'semestral', 'anual']
+TIPOS_PAGO = [clave for clave, _ in Income._meta.get_field('was_paid').choices]
+TAMANO_LOTE = 5000
+ANIOS_DE_HISTORIA = 3
+
+# Caché aislada para las mediciones (se vacía antes de cada repetición)
+CACHE_BENCHMARK = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark-reportes',
+    },
+}
+
+
+@contextmanager
+def _sin_auto_now():
+    # Income.date es auto_now; para sembrar historia hay que respetar la fecha dada
+    campo = Income._meta.get_field('date')
+    campo.auto_now = False
+    try:
+        yield
+    finally:
+        campo.auto_now = True
+
+
+def _sembrar_catalogos(aleatorio, dentistas=20, pacientes=500, procedimientos=30):
+    if not Dentist.objects.exists():
+        for n in range(dentistas):
+            Dentist.objects.create(
+                first_name=f"Dentista{n}", last_name="Benchmark",
+                email=f"dentista{n}@example.com", phone_default="5550000000",
+                percentage=Decimal(aleatorio.choice(["0.20", "0.30", "0.40", "0.50"])))
+    if not Patient.objects.exists():
+        for n in range(pacientes):
+            Patient.objects.create(
+                first_name=f"Paciente{n}", last_name="Benchmark",
+                email=f"paciente{n}@example.com", phone_default="5550000000")
+    if not Procedure.objects.exists():
+        Procedure.objects.bulk_create([
+            Procedure(name=f"Procedimiento {n}", description="Sintético",
+                      price=Decimal(aleatorio.randrange(200, 20000)))
+            for n in range(procedimientos)
+        ])
+
+    return (
+        list(Dentist.objects.values_list('pk', flat=True)),
+        list(Patient.objects.values_list('pk', flat=True)),
+        list(Procedure.objects.values_list('pk', 'price')),
+    )
+
+
+def sembrar_ingresos(total, semilla=0):
+    """
+    Agrega Income sintéticos hasta que la tabla tenga ``total`` filas.
+
+    Las fechas se reparten en los últimos ANIOS_DE_HISTORIA años y se
+    insertan en orden, así cada lote toca pocos días del rollup.
+    """
+    aleatorio = random.Random(semilla)
+    dentistas, pacientes, procedimientos = _sembrar_catalogos(aleatorio)
+    faltantes = total - Income.objects.count()
+    if faltantes <= 0:
+        return
+
+    hoy = now().date()
+    dias = ANIOS_DE_HISTORIA * 365
+    fechas = sorted(hoy - timedelta(days=aleatorio.randrange(dias)) for _ in range(faltantes))
+
+    with _sin_auto_now():
+        for inicio in range(0, faltantes, TAMANO_LOTE):
+            lote = []
+            for fecha in fechas[inicio:inicio + TAMANO_LOTE]:
+                procedimiento, precio = aleatorio.choice(procedimientos)
+                lote.append(Income(
+                    dentist_id=aleatorio.choice(dentistas),
+                    patient_id=aleatorio.choice(pacientes),
+                    procedure_id=procedimiento,
+                    date=fecha,
+                    amount=precio,
+                    was_paid=aleatorio.choice(TIPOS_PAGO),
+                    is_facturable=aleatorio.random() < 0.3))
+            Income.objects.bulk_create(lote)
+
+
+def medir(funcion, repeticiones=3):
+    """
+    Ejecuta ``funcion`` varias veces y devuelve tiempos, consultas y memoria pico.
+
+    La memoria pico se mide en una repetición adicional, sin cronometrar:
+    tracemalloc hace más lenta cada asignación y sesgaría los tiempos.
+    """
+    tiempos = []
+    consultas = 0
+    with override_settings(CACHES=CACHE_BENCHMARK):
+        for _ in range(repeticiones):
+            cache.clear()
+            with CaptureQueriesContext(connection) as capturadas:
+                inicio = time.perf_counter()
+                funcion()
+                tiempos.append(time.perf_counter() - inicio)
+            consultas = len(capturadas)
+
+        cache.clear()
+        tracemalloc.start()
+        try:
+            funcion()
+            memoria = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return {
+        'segundos_mediana': statistics.median(tiempos),
+        'segundos_min': min(tiempos),
+        'consultas': consultas,
+        'memoria_pico_kb': round(memoria / 1024, 1),
+    }
+
+
+def casos(periodo):
+    """
+    Funciones a medir para un período, como pares (nombre, callable).
+    """
+    def exportar_csv():
+        reporte = reporter.obtener_reporte_ingresos_por_dentista(periodo, usar_cache=False)
+        reporter.exportar_a_csv(reporte, os.devnull)
+
+    def generar_pdf():
+        reporte = reporter.obtener_reporte_ingresos_por_dentista(periodo, usar_cache=False)
+        reporter.generar_factura_pdf(None, "Benchmark", "RFC", "Dirección", "Teléfono", reporte)
+
+    return [
+        ('obtener_reporte_ingresos',
+         lambda: reporter.obtener_reporte_ingresos(periodo, usar_cache=False)),
+        ('obtener_reporte_ingresos_por_dentista',
+         lambda: reporter.obtener_reporte_ingresos_por_dentista(periodo, usar_cache=False)),
+        ('exportar_a_csv', exportar_csv),
+        ('generar_factura_pdf', generar_pdf),
+    ]
+
+
+def ejecutar_benchmark(tamanos, repeticiones=3, semilla=0, progreso=None):
+    """
+    Siembra datos para cada tamaño (de menor a mayor) y mide todos los casos.
+
+    Returns:
+        dict: Metadatos del entorno y lista de 'resultados'.
+    """
+    resultados = []
+    for filas in sorted(tamanos):
+        sembrar_ingresos(filas, semilla)
+        for periodo in PERIODOS:
+            for nombre, funcion in casos(periodo):
+                resultado = {'filas': filas, 'funcion': nombre, 'periodo': periodo}
+                resultado.update(medir(funcion, repeticiones))
+                resultados.append(resultado)
+                if progreso:
+                    progreso(resultado)
+
+    return {
+        'fecha': now().isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'base_de_datos': connection.vendor,
+        'repeticiones': repeticiones,
+        'resultados': resultados,
+    }
+
+
+def comparar(base, actual):
+    """
+    Compara dos salidas de ejecutar_benchmark.
+
+    Returns:
+        list[dict]: Por cada caso presente en ambas, la razón de tiempos
+        (actual / base) y de consultas.
+    """
+    def indexar(salida):
+        return {
+            (r['filas'], r['funcion'], r['periodo']): r
+            for r in salida['resultados']
+        }
+
+    anteriores = indexar(base)
+    comparacion = []
+    for clave, nuevo in indexar(actual).items():
+        viejo = anteriores.get(clave)
+        if viejo is None:
+            continue
+        comparacion.append({
+            'filas': clave[0], 'funcion': clave[1], 'periodo': clave[2],
+            'razon_tiempo': nuevo['segundos_mediana'] / viejo['segundos_mediana']
+            if viejo['segundos_mediana'] else None,
+            'consultas': (viejo['consultas'], nuevo['consultas']),
+        })
+    return comparacion
@@ -0,0 +1,212 @@
+"""
+Caché de resultados de reportes con invalidación por escritura.
+
+Cada mes tiene un contador de generación que se incrementa cuando se confirma
+la escritura de un Income con fecha en ese mes. La llave de un reporte
+incluye el tipo, los argumentos, el rango de fechas y las generaciones de
+todos los meses que abarca, así que cualquier escritura en el rango lo
+invalida sin tener que borrar entradas. Los períodos ya cerrados se guardan
+sin expiración; el período en curso expira además tras REPORTS_CACHE_TIMEOUT
+como resguardo ante escrituras que no pasan por el ORM.
+
+Los contadores viven en la base (ReportGeneration), no en la caché: la caché
+por omisión es local a cada proceso, y una escritura hecha desde un comando
+o un shell debe invalidar los reportes guardados en los workers web. Leer
+las generaciones de una llave es una sola consulta.
+
+Para lecturas muy frecuentes (las series del tablero) hay además un modo
+stale-while-revalidate: pasado un TTL suave se sigue sirviendo el valor
+guardado y un solo hilo lo recalcula en segundo plano.
+"""
+import hashlib
+import inspect
+import threading
+import time
+from functools import partial, wraps
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F
+from django.utils.timezone import now
+
+from apps.reports.traza import traza_activa
+
+PREFIJO = 'reports:'
+GENERACION_GLOBAL = 'global'
+
+
+def _llave_generacion(mes):
+    return f"{mes:%Y-%m}"
+
+
+def _meses(inicio, fin):
+    mes = inicio.replace(day=1)
+    while mes <= fin:
+        yield mes
+        mes += relativedelta(months=1)
+
+
+def _generaciones(llaves):
+    """
+    Lee los contadores en una consulta; uno que no existe (nunca se ha
+    escrito en ese mes) vale 0.
+    """
+    from apps.reports.models import ReportGeneration
+
+    valores = dict(ReportGeneration.objects.filter(key__in=llaves).values_list('key', 'value'))
+    return [valores.get(llave, 0) for llave in llaves]
+
+
+def _incrementar(llave):
+    from apps.reports.models import ReportGeneration
+
+    if ReportGeneration.objects.filter(key=llave).update(value=F('value') + 1):
+        return
+    try:
+        # Valor inicial basado en el reloj: distinto de 0 y de cualquier
+        # generación vista antes de que se borrara el contador
+        with transaction.atomic():
+            ReportGeneration.objects.create(key=llave, value=time.time_ns())
+    except IntegrityError:
+        # Otro proceso lo creó entre el UPDATE y el INSERT
+        ReportGeneration.objects.filter(key=llave).update(value=F('value') + 1)
+
+
+def _al_confirmar(tarea):
+    # Los lectores solo deben ver la generación nueva cuando ya pueden leer
+    # los datos nuevos; fuera de una transacción se ejecuta de inmediato
+    transaction.on_commit(tarea)
+
+
+def invalidar_fechas(fechas):
+    """
+    Invalida, al confirmarse la transacción en curso, los reportes que
+    incluyen alguna de las fechas indicadas.
+    """
+    meses = {fecha.replace(day=1) for fecha in fechas if fecha is not None}
+
+    def invalidar():
+        for mes in sorted(meses):
+            _incrementar(_llave_generacion(mes))
+
+    _al_confirmar(invalidar)
+
+
+def invalidar_todo():
+    """
+    Invalida todos los reportes al confirmarse la transacción en curso (p.
+    ej. al cambiar datos de un dentista).
+    """
+    _al_confirmar(partial(_incrementar, GENERACION_GLOBAL))
+
+
+def llave_reporte(tipo, argumentos, rangos):
+    meses = sorted({mes for inicio, fin in rangos for mes in _meses(inicio, fin)})
+    llaves = [GENERACION_GLOBAL] + [_llave_generacion(mes) for mes in meses]
+    firma = repr((tipo, argumentos, rangos, _generaciones(llaves)))
+    return f"{PREFIJO}reporte:{tipo}:{hashlib.sha256(firma.encode()).hexdigest()}"
+
+
+def reporte_cacheado(tipo, rangos=None):
+    """
+    Decorador que pone la caché frente a una función de reporte.
+
+    La función decorada acepta además ``usar_cache=False`` para forzar el
+    cálculo. Sus argumentos deben incluir ``periodo`` y ``hoy``, y
+    opcionalmente ``periodos`` o ``inicio`` y ``fin``, que determinan el
+    rango como en calcular_rango_fecha y calcular_rango_reporte. Si el
+    reporte lee otros rangos, ``rangos`` recibe ``(periodo, hoy)`` y
+    devuelve la lista de pares (inicio, fin).
+    """
+    def decorador(funcion):
+        firma = inspect.signature(funcion)
+
+        @wraps(funcion)
+        def envoltura(*args, usar_cache=True, **kwargs):
+            if not usar_cache or traza_activa():
+                return funcion(*args, **kwargs)
+
+            from apps.reports.reporter import calcular_rango_fecha
+
+            argumentos = firma.bind(*args, **kwargs)
+            argumentos.apply_defaults()
+            valores = argumentos.arguments
+            hoy = now().date()
+            if rangos is not None:
+                rangos_reporte = list(rangos(valores['periodo'], valores['hoy'] or hoy))
+            elif valores.get('inicio') and valores.get('fin'):
+                rangos_reporte = [(valores['inicio'], valores['fin'])]
+            else:
+                rangos_reporte = [calcular_rango_fecha(
+                    valores['periodo'], valores['hoy'] or hoy, valores.get('periodos', 1))]
+            fin = max(fin for _, fin in rangos_reporte)
+
+            llave = llave_reporte(
+                tipo, tuple(sorted(valores.items())), rangos_reporte)
+            resultado = cache.get(llave)
+            if resultado is None:
+                resultado = funcion(*args, **kwargs)
+                # Período cerrado: no expira; período en curso: expira como resguardo
+                timeout = None if fin < hoy else getattr(
+                    settings, 'REPORTS_CACHE_TIMEOUT', 60 * 60 * 24)
+                cache.set(llave, resultado, timeout)
+            return resultado
+
+        return envoltura
+
+    return decorador
+
+
+# Segundos que una revalidación en curso bloquea a las demás
+REVALIDACION_TIMEOUT = 60
+
+
+def revalidar_en_segundo_plano(tarea):
+    """
+    Ejecuta ``tarea`` en un hilo aparte que cierra sus conexiones al terminar.
+    """
+    def ejecutar():
+        try:
+            tarea()
+        finally:
+            connections.close_all()
+
+    threading.Thread(target=ejecutar, daemon=True).start()
+
+
+def _revalidar(llave, calcular, timeout):
+    try:
+        cache.set(llave, (time.time(), calcular()), timeout)
+    finally:
+        cache.delete(f"{llave}:revalidando")
+
+
+def obtener_con_revalidacion(llave, calcular, ttl_suave, timeout=None):
+    """
+    Lee ``llave`` de la caché con stale-while-revalidate.
+
+    Sin entrada, se calcula y se guarda. Con una entrada más antigua que
+    ``ttl_suave`` segundos se devuelve igualmente, y la primera solicitud
+    que lo nota (un ``cache.add`` atómico como candado) la recalcula en
+    segundo plano; las demás siguen sirviendo el valor guardado.
+
+    Args:
+        llave (str): Llave de caché (p. ej. de llave_reporte, para que las
+            escrituras de Income la invaliden).
+        calcular (callable): Calcula el valor, sin argumentos.
+        ttl_suave (int): Segundos tras los que el valor se revalida.
+        timeout (int): Segundos que la entrada permanece en caché.
+    """
+    entrada = cache.get(llave)
+    if entrada is None:
+        valor = calcular()
+        cache.set(llave, (time.time(), valor), timeout)
+        return valor
+
+    calculado, valor = entrada
+    if time.time() - calculado > ttl_suave and cache.add(
+            f"{llave}:revalidando", True, REVALIDACION_TIMEOUT):
+        revalidar_en_segundo_plano(partial(_revalidar, llave, calcular, timeout))
+    return valor
@@ -0,0 +1,116 @@
+"""
+Dimensión de calendario (CalendarDay) para agrupar ingresos por período.
+
+Cada nivel de agrupación corresponde a una columna indexada de CalendarDay,
+así que una serie de cualquier granularidad es un solo JOIN + GROUP BY sobre
+el rollup diario en lugar de funciones de fecha evaluadas fila por fila.
+
+La migración puebla CALENDARIO_INICIO..CALENDARIO_FIN; el rollup extiende el
+calendario con los años completos de cualquier día fuera de ese rango antes
+de guardar sus cubos (asegurar_calendario), para que ninguno quede fuera de
+las agrupaciones.
+"""
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db.models import F, Sum
+
+# Nivel de agrupación -> columna de CalendarDay
+NIVELES = {
+    'diario': 'date',
+    'semanal': 'week_start',
+    'mensual': 'month_start',
+    'trimestral': 'quarter_start',
+    'semestral': 'semester_start',
+    'anual': 'year_start',
+    'fiscal': 'fiscal_year',
+}
+
+CALENDARIO_INICIO = date(2000, 1, 1)
+CALENDARIO_FIN = date(2050, 12, 31)
+
+
+def mes_inicio_fiscal():
+    return getattr(settings, 'REPORTS_FISCAL_YEAR_START_MONTH', 1)
+
+
+def atributos_de_dia(fecha, inicio_fiscal=1):
+    """
+    Calcula las claves de período de un día para CalendarDay.
+    """
+    iso_year, iso_week, iso_weekday = fecha.isocalendar()
+    quarter = (fecha.month - 1) // 3 + 1
+    semester = 1 if fecha.month <= 6 else 2
+    meses_fiscales = (fecha.month - inicio_fiscal) % 12
+    return {
+        'date': fecha,
+        'year': fecha.year,
+        'month': fecha.month,
+        'quarter': quarter,
+        'semester': semester,
+        'iso_year': iso_year,
+        'iso_week': iso_week,
+        'week_start': fecha - timedelta(days=iso_weekday - 1),
+        'month_start': fecha.replace(day=1),
+        'quarter_start': fecha.replace(month=(quarter - 1) * 3 + 1, day=1),
+        'semester_start': fecha.replace(month=(semester - 1) * 6 + 1, day=1),
+        'year_start': fecha.replace(month=1, day=1),
+        'fiscal_year': fecha.year if fecha.month >= inicio_fiscal else fecha.year - 1,
+        'fiscal_quarter': meses_fiscales // 3 + 1,
+    }
+
+
+def poblar_calendario(inicio=CALENDARIO_INICIO, fin=CALENDARIO_FIN, modelo=None):
+    """
+    Inserta en CalendarDay los días faltantes entre inicio y fin (inclusive).
+    """
+    if modelo is None:
+        from apps.reports.models import CalendarDay as modelo
+
+    inicio_fiscal = mes_inicio_fiscal()
+    dias = (
+        modelo(**atributos_de_dia(inicio + timedelta(days=n), inicio_fiscal))
+        for n in range((fin - inicio).days + 1)
+    )
+    modelo.objects.bulk_create(dias, batch_size=1000, ignore_conflicts=True)
+
+
+def asegurar_calendario(fechas):
+    """
+    Inserta en CalendarDay los años completos de las fechas que caen fuera
+    de CALENDARIO_INICIO..CALENDARIO_FIN; no consulta nada si no hay ninguna.
+    """
+    anios = {fecha.year for fecha in fechas
+             if not CALENDARIO_INICIO <= fecha <= CALENDARIO_FIN}
+    for anio in sorted(anios):
+        poblar_calendario(date(anio, 1, 1), date(anio, 12, 31))
+
+
+def serie_por_periodo(nivel, inicio, fin, queryset=None):
+    """
+    Agrupa el rollup diario por un nivel del calendario en una sola consulta.
+
+    Args:
+        nivel (str): Clave de NIVELES ('semanal', 'mensual', ...).
+        inicio (date): Primer día del rango.
+        fin (date): Último día del rango.
+        queryset (QuerySet): Rollup ya filtrado (por dentista, procedimiento...).
+
+    Returns:
+        QuerySet: Diccionarios con 'periodo', 'total' y 'cantidad', ordenados.
+    """
+    from apps.reports.models import IncomeDailyRollup
+
+    if nivel not in NIVELES:
+        raise ValueError(
+            f"Nivel no válido. Usa: {', '.join(repr(n) for n in NIVELES)}.")
+
+    if queryset is None:
+        queryset = IncomeDailyRollup.objects.all()
+
+    return (
+        queryset.filter(date__range=[inicio, fin])
+        .values(periodo=F(f'calendario__{NIVELES[nivel]}'))
+        .annotate(total=Sum('total_amount'), cantidad=Sum('income_count'))
+        .order_by('periodo')
+    )
@@ -0,0 +1,219 @@
+"""
+Cierre de mes: congela los totales de un mes terminado en resúmenes
+inmutables y arma el paquete del contador.
+
+Al cerrar un mes se guarda un ClosedPeriod con un checksum (SHA-256) de
+todos sus ingresos y un MonthlySummary por (dentista, procedimiento, tipo
+de pago). Desde entonces los reportes cuyo rango son meses completos y
+cerrados leen esos resúmenes (unas cuantas filas por mes, sin importar
+cuántos ingresos tuvo) en lugar del rollup diario. Los ingresos de un mes
+cerrado ya no pueden modificarse desde la aplicación (ver
+``validar_meses_abiertos``); ``verificar_cierre`` recalcula el checksum para
+detectar cambios hechos por fuera.
+"""
+import hashlib
+import json
+import zipfile
+
+from dateutil.relativedelta import relativedelta
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils.timezone import now, timedelta
+
+from apps.pages.models import Income
+from apps.reports.lotes import SalidaZip
+from apps.reports.models import ClosedPeriod, IncomeDailyRollup, MonthlySummary
+from apps.reports.pdf import encabezado_fiscal, renderizar_reporte_pdf
+from apps.reports.reporter import (
+    iterar_csv, obtener_comparativo_ingresos, obtener_comparativo_por_dentista,
+    obtener_reporte_ingresos, obtener_reporte_ingresos_por_dentista)
+from apps.reports.rollup import TAMANO_LOTE
+
+# Reportes del paquete del contador: nombre -> (función, título)
+REPORTES_PAQUETE = {
+    'tipo-pago': (obtener_reporte_ingresos, "Ingresos por tipo de pago"),
+    'dentista': (obtener_reporte_ingresos_por_dentista, "Ingresos por dentista"),
+    'comparativo-tipo-pago': (obtener_comparativo_ingresos, "Comparativo por tipo de pago"),
+    'comparativo-dentista': (obtener_comparativo_por_dentista, "Comparativo por dentista"),
+}
+
+CAMPOS_CHECKSUM = (
+    'pk', 'date', 'dentist_id', 'patient_id', 'procedure_id', 'was_paid', 'amount',
+    'commission_amount', 'is_facturable')
+
+
+def rango_del_mes(mes):
+    inicio = mes.replace(day=1)
+    return inicio, inicio + relativedelta(months=1) - timedelta(days=1)
+
+
+def meses_cerrados(meses):
+    """
+    Cuáles de los meses (primeros días) están cerrados.
+
+    Lee ClosedPeriod en cada llamada, así que un cierre hecho en otro
+    proceso se ve de inmediato. Los meses en curso o futuros no pueden
+    estar cerrados y no se consultan.
+    """
+    meses = {mes for mes in meses if mes < now().date().replace(day=1)}
+    if not meses:
+        return set()
+    return set(ClosedPeriod.objects.filter(month__in=meses).values_list('month', flat=True))
+
+
+def _meses_del_rango(inicio, fin):
+    """
+    Primeros días de los meses del rango, o None si no son meses completos.
+    """
+    if inicio.day != 1 or (fin + timedelta(days=1)).day != 1:
+        return None
+    meses = set()
+    mes = inicio
+    while mes <= fin:
+        meses.add(mes)
+        mes += relativedelta(months=1)
+    return meses
+
+
+def fuente_para_rangos(rangos):
+    """
+    Tabla de totales para leer los rangos: los resúmenes mensuales si todos
+    son meses cerrados, si no el rollup diario. Consulta los cierres (una
+    sola vez) solo si todos los rangos son meses completos y terminados.
+    """
+    necesarios = set()
+    for inicio, fin in rangos:
+        meses = _meses_del_rango(inicio, fin)
+        if meses is None or fin >= now().date().replace(day=1):
+            return IncomeDailyRollup
+        necesarios |= meses
+    if necesarios and meses_cerrados(necesarios) == necesarios:
+        return MonthlySummary
+    return IncomeDailyRollup
+
+
+def validar_meses_abiertos(fechas):
+    """
+    Rechaza escribir ingresos con fechas de meses cerrados: cambiarían los
+    resúmenes congelados y el checksum del cierre.
+
+    Raises:
+        ValueError: Si alguna fecha cae en un mes cerrado.
+    """
+    cerrados = meses_cerrados({fecha.replace(day=1) for fecha in fechas if fecha is not None})
+    if cerrados:
+        raise ValueError(
+            f"Mes cerrado: {', '.join(f'{mes:%Y-%m}' for mes in sorted(cerrados))}. "
+            "Sus ingresos no pueden modificarse.")
+
+
+def checksum_ingresos(inicio, fin):
+    """
+    SHA-256 de los ingresos del rango, en orden de pk.
+    """
+    digest = hashlib.sha256()
+    filas = (
+        Income.objects.filter(date__range=[inicio, fin]).order_by('pk')
+        .values_list(*CAMPOS_CHECKSUM).iterator(chunk_size=TAMANO_LOTE))
+    for fila in filas:
+        digest.update(("|".join(map(str, fila)) + "\n").encode())
+    return digest.hexdigest()
+
+
+def _crear_cierre(inicio, fin):
+    ingresos = Income.objects.filter(date__range=[inicio, fin])
+    if ingresos.filter(commission_rate__isnull=True).exists():
+        raise ValueError(
+            "Hay ingresos sin comisión congelada en el mes; "
+            "ejecuta primero el comando congelar_comisiones.")
+
+    cubos = list(
+        ingresos.order_by()
+        .values('dentist_id', 'procedure_id', 'was_paid')
+        .annotate(
+            total_amount=Sum('amount'),
+            income_count=Count('id'),
+            total_honorarios=Coalesce(
+                Sum('commission_amount'), Value(0),
+                output_field=DecimalField(max_digits=16, decimal_places=4))))
+
+    periodo = ClosedPeriod.objects.create(
+        month=inicio,
+        checksum=checksum_ingresos(inicio, fin),
+        income_count=sum(cubo['income_count'] for cubo in cubos),
+        total_amount=sum(cubo['total_amount'] for cubo in cubos),
+        total_honorarios=sum(cubo['total_honorarios'] for cubo in cubos))
+    MonthlySummary.objects.bulk_create(
+        [MonthlySummary(period=periodo, date=inicio, **cubo) for cubo in cubos],
+        batch_size=TAMANO_LOTE)
+    return periodo
+
+
+def cerrar_mes(mes, hoy=None):
+    """
+    Cierra el mes que contiene ``mes`` (o devuelve su cierre existente).
+
+    Returns:
+        tuple[ClosedPeriod, bool]: El cierre y si se creó en esta llamada.
+
+    Raises:
+        ValueError: Si el mes no ha terminado o hay ingresos sin comisión congelada.
+    """
+    inicio, fin = rango_del_mes(mes)
+    if fin >= (hoy or now().date()):
+        raise ValueError("Solo pueden cerrarse meses terminados.")
+
+    periodo = ClosedPeriod.objects.filter(month=inicio).first()
+    if periodo is not None:
+        return periodo, False
+    try:
+        with transaction.atomic():
+            periodo = _crear_cierre(inicio, fin)
+    except IntegrityError:
+        # Otro proceso cerró el mismo mes
+        return ClosedPeriod.objects.get(month=inicio), False
+    return periodo, True
+
+
+def verificar_cierre(periodo):
+    """
+    Indica si los ingresos del mes siguen siendo los que se cerraron.
+    """
+    return checksum_ingresos(*rango_del_mes(periodo.month)) == periodo.checksum
+
+
+def paquete_contador(periodo, encabezado=None):
+    """
+    Emite por partes un ZIP con el CSV y el PDF de cada reporte del mes
+    cerrado, más un ``cierre.json`` con los totales y el checksum.
+
+    Yields:
+        bytes: Partes consecutivas del archivo ZIP.
+    """
+    encabezado = encabezado or encabezado_fiscal()
+    carpeta = f"{periodo.month:%Y-%m}"
+    salida = SalidaZip()
+
+    with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_DEFLATED) as archivo:
+        archivo.writestr(f"{carpeta}/cierre.json", json.dumps({
+            'mes': carpeta,
+            'cerrado': periodo.closed_at.isoformat(),
+            'checksum': periodo.checksum,
+            'ingresos': periodo.income_count,
+            'total_ingresos': str(periodo.total_amount),
+            'total_honorarios': str(periodo.total_honorarios),
+        }, indent=2))
+
+        for nombre, (funcion, titulo) in REPORTES_PAQUETE.items():
+            reporte = funcion("mensual", hoy=periodo.month)
+            with archivo.open(f"{carpeta}/{nombre}.csv", 'w') as csv:
+                for linea in iterar_csv(reporte):
+                    csv.write(linea.encode('utf-8'))
+            yield salida.vaciar()
+
+            archivo.writestr(f"{carpeta}/{nombre}.pdf", renderizar_reporte_pdf(
+                reporte, encabezado, titulo=f"{titulo} ({carpeta})"))
+            yield salida.vaciar()
+
+    yield salida.vaciar()
@@ -0,0 +1,411 @@
+"""
+Motor de reportes declarativos: dimensiones × medidas × período.
+
+Una EspecificacionReporte dice qué agrupar (dimensiones), qué calcular
+(medidas) y por qué campos se puede filtrar. ``compilar`` la valida y la
+traduce a un plan (fuente, columnas, agregados y orden) que se guarda en
+caché; ``ejecutar_especificacion`` aplica el plan a un rango de fechas en
+una sola consulta y arma un ReporteIngresos. El gran total sale de esa misma
+consulta: cada agregado va acompañado de su suma sobre todos los grupos
+(``SUM(SUM(...)) OVER ()``).
+
+El plan lee del rollup diario siempre que todas las dimensiones, medidas y
+filtros existan ahí; si no (p. ej. nivel de paciente) lee de Income. En
+ambos casos el ORM solo agrega los JOIN de los campos que se usan. Los
+nombres de dentista no se agrupan: la consulta agrupa por ``dentist_id`` y
+los nombres se leen después en una segunda consulta (``in_bulk``) sobre los
+dentistas del resultado.
+"""
+from collections import namedtuple
+from decimal import Decimal
+from functools import lru_cache
+
+from django.db.models import Count, DecimalField, F, Func, Sum, Window
+from django.db.models.functions import TruncDay, TruncMonth, TruncQuarter, TruncWeek, TruncYear
+
+from apps.pages.models import Dentist, Income
+from apps.reports.calendario import NIVELES
+from apps.reports.models import IncomeDailyRollup
+from apps.reports.resultado import ETIQUETA_GRAN_TOTAL, ReporteIngresos, a_centavos, tipo_fila
+from apps.reports.traza import fase
+
+ROLLUP, INCOME = 'rollup', 'income'
+
+FUENTES = {
+    ROLLUP: IncomeDailyRollup,
+    INCOME: Income,
+}
+
+# Columna de una dimensión: alias en la consulta y ruta en cada fuente
+# (None si la fuente no la tiene).
+Columna = namedtuple('Columna', ['alias', 'rollup', 'income'])
+
+# ``resolver`` (opcional) recibe las llaves de la dimensión presentes en el
+# resultado y devuelve, por llave, los valores de las columnas ``resueltas``,
+# que no forman parte de la consulta agrupada.
+Dimension = namedtuple(
+    'Dimension', ['campos', 'etiqueta', 'columnas', 'orden', 'convertir', 'resueltas', 'resolver'],
+    defaults=((), None))
+
+Medida = namedtuple('Medida', ['campo', 'etiqueta', 'agregados', 'derivar'])
+
+EspecificacionReporte = namedtuple(
+    'EspecificacionReporte', ['dimensiones', 'medidas', 'filtros', 'nivel'],
+    defaults=((), None))
+EspecificacionReporte.__doc__ = """
+Definición declarativa de un reporte.
+
+Attributes:
+    dimensiones (tuple[str]): Claves de DIMENSIONES, en orden de agrupación.
+    medidas (tuple[str]): Claves de MEDIDAS.
+    filtros (tuple[str]): Claves de FILTROS que se podrán usar al ejecutar.
+    nivel (str): Nivel del calendario para la dimensión 'periodo'.
+"""
+
+
+def _nombre_completo(dentista_id, nombre, apellido):
+    return dentista_id, f"{nombre} {apellido}"
+
+
+def _nombres_dentistas(ids):
+    dentistas = Dentist.objects.only('first_name', 'last_name').in_bulk(ids)
+    return {pk: (dentista.first_name, dentista.last_name) for pk, dentista in dentistas.items()}
+
+
+def _identidad(*valores):
+    return valores
+
+
+DIMENSIONES = {
+    'dentista': Dimension(
+        campos=('dentista_id', 'dentista'), etiqueta='Dentista',
+        columnas=(Columna('d_dentista_id', 'dentist_id', 'dentist_id'),),
+        orden=('d_dentista_apellido', 'd_dentista_nombre', 'd_dentista_id'),
+        convertir=_nombre_completo,
+        resueltas=('d_dentista_nombre', 'd_dentista_apellido'),
+        resolver=_nombres_dentistas),
+    'procedimiento': Dimension(
+        campos=('procedimiento_id', 'procedimiento'), etiqueta='Procedimiento',
+        columnas=(
+            Columna('d_procedimiento_id', 'procedure_id', 'procedure_id'),
+            Columna('d_procedimiento', 'procedure__name', 'procedure__name'),
+        ),
+        orden=('d_procedimiento',),
+        convertir=_identidad),
+    'tipo_pago': Dimension(
+        campos=('tipo_pago',), etiqueta='Tipo de Pago',
+        columnas=(Columna('d_tipo_pago', 'was_paid', 'was_paid'),),
+        orden=('d_tipo_pago',),
+        convertir=_identidad),
+    'nivel_paciente': Dimension(
+        campos=('nivel_paciente',), etiqueta='Nivel de Paciente',
+        columnas=(Columna('d_nivel_paciente', None, 'patient__level'),),
+        orden=('d_nivel_paciente',),
+        convertir=_identidad),
+    'periodo': Dimension(
+        campos=('periodo',), etiqueta='Período',
+        # La ruta depende del nivel; se resuelve en _expresion_periodo
+        columnas=(Columna('d_periodo', 'calendario', 'date'),),
+        orden=('d_periodo',),
+        convertir=_identidad),
+}
+
+_HONORARIOS_INCOME = Sum(
+    'commission_amount', output_field=DecimalField(max_digits=16, decimal_places=4))
+
+
+MEDIDAS = {
+    'total': Medida(
+        'total_ingresos', 'Total Ingresos',
+        agregados={'m_total': {ROLLUP: Sum('total_amount'), INCOME: Sum('amount')}},
+        derivar=lambda m: a_centavos(m['m_total'])),
+    'cantidad': Medida(
+        'cantidad', 'Cantidad',
+        agregados={'m_cantidad': {ROLLUP: Sum('income_count'), INCOME: Count('id')}},
+        derivar=lambda m: m['m_cantidad'] or 0),
+    'promedio': Medida(
+        'promedio', 'Promedio',
+        agregados={
+            'm_total': {ROLLUP: Sum('total_amount'), INCOME: Sum('amount')},
+            'm_cantidad': {ROLLUP: Sum('income_count'), INCOME: Count('id')},
+        },
+        derivar=lambda m: a_centavos(
+            Decimal(m['m_total']) / m['m_cantidad'] if m['m_cantidad'] else None)),
+    'honorarios': Medida(
+        'total_honorarios', 'Total Honorarios',
+        agregados={'m_honorarios': {
+            ROLLUP: Sum('total_honorarios'), INCOME: _HONORARIOS_INCOME}},
+        derivar=lambda m: a_centavos(m['m_honorarios'])),
+}
+
+# Filtro -> (búsqueda en rollup, búsqueda en Income); None si no existe
+FILTROS = {
+    'dentista': ('dentist_id__in', 'dentist_id__in'),
+    'procedimiento': ('procedure_id__in', 'procedure_id__in'),
+    'tipo_pago': ('was_paid__in', 'was_paid__in'),
+    'nivel_paciente': (None, 'patient__level__in'),
+}
+
+# Niveles de tiempo disponibles directamente sobre Income (sin calendario)
+TRUNCAR_INCOME = {
+    'diario': TruncDay,
+    'semanal': TruncWeek,
+    'mensual': TruncMonth,
+    'trimestral': TruncQuarter,
+    'anual': TruncYear,
+}
+
+Plan = namedtuple(
+    'Plan',
+    ['fuente', 'valores', 'agregados', 'totales', 'orden', 'filtros', 'tipo', 'columnas',
+     'dimensiones', 'medidas', 'mensual', 'resueltas'])
+
+# Prefijo de la columna con el gran total de cada agregado
+PREFIJO_TOTAL = 't_'
+
+
+class _SumaDeGrupos(Func):
+    # SUM sobre un agregado ya agrupado; solo tiene sentido dentro de OVER ()
+    function = 'SUM'
+    window_compatible = True
+
+
+# Niveles que agrupan meses completos: se pueden leer de los cierres de mes
+NIVELES_MENSUALES = ('mensual', 'trimestral', 'semestral', 'anual', 'fiscal')
+
+
+def _expresion_periodo(fuente, nivel):
+    if fuente == ROLLUP:
+        return F(f'calendario__{NIVELES[nivel]}')
+    return TRUNCAR_INCOME[nivel]('date')
+
+
+def _elegir_fuente(spec):
+    en_rollup = (
+        all(columna.rollup for d in spec.dimensiones for columna in DIMENSIONES[d].columnas)
+        and all(FILTROS[f][0] for f in spec.filtros)
+    )
+    return ROLLUP if en_rollup else INCOME
+
+
+def _validar(spec):
+    for tipo, claves, catalogo in (
+            ('Dimensión', spec.dimensiones, DIMENSIONES),
+            ('Medida', spec.medidas, MEDIDAS),
+            ('Filtro', spec.filtros, FILTROS)):
+        for clave in claves:
+            if clave not in catalogo:
+                raise ValueError(
+                    f"{tipo} no válida: {clave!r}. Usa: {', '.join(catalogo)}.")
+    if not spec.medidas:
+        raise ValueError("La especificación necesita al menos una medida.")
+    if 'periodo' in spec.dimensiones and spec.nivel not in NIVELES:
+        raise ValueError(
+            f"La dimensión 'periodo' necesita un nivel: {', '.join(NIVELES)}.")
+
+
+@lru_cache(maxsize=256)
+def compilar(spec):
+    """
+    Valida una especificación y la traduce a un plan de consulta.
+
+    Los planes se guardan en caché por especificación.
+
+    Raises:
+        ValueError: Si la especificación no es válida o no puede resolverse.
+    """
+    _validar(spec)
+    fuente = _elegir_fuente(spec)
+    if fuente == INCOME and 'periodo' in spec.dimensiones and spec.nivel not in TRUNCAR_INCOME:
+        raise ValueError(
+            f"El nivel {spec.nivel!r} no puede combinarse con dimensiones o filtros "
+            "que solo existen en Income.")
+
+    valores = {}
+    orden = []
+    campos = []
+    columnas = []
+    for clave in spec.dimensiones:
+        dimension = DIMENSIONES[clave]
+        for columna in dimension.columnas:
+            if clave == 'periodo':
+                valores[columna.alias] = _expresion_periodo(fuente, spec.nivel)
+            else:
+                valores[columna.alias] = F(getattr(columna, fuente))
+        orden.extend(dimension.orden)
+        campos.extend(dimension.campos)
+        columnas.append((dimension.campos[-1], dimension.etiqueta))
+
+    agregados = {}
+    for clave in spec.medidas:
+        medida = MEDIDAS[clave]
+        for alias, por_fuente in medida.agregados.items():
+            agregados[alias] = por_fuente[fuente]
+        campos.append(medida.campo)
+        columnas.append((medida.campo, medida.etiqueta))
+
+    filtros = {
+        clave: FILTROS[clave][0 if fuente == ROLLUP else 1]
+        for clave in spec.filtros
+    }
+
+    # Los agregados son sumas (o conteos): su gran total es la suma de los
+    # grupos, calculada en la misma consulta con una ventana sin partición
+    totales = {
+        PREFIJO_TOTAL + alias: Window(_SumaDeGrupos(agregado))
+        for alias, agregado in agregados.items()
+    } if valores else {}
+
+    return Plan(
+        fuente=fuente, valores=valores, agregados=agregados, totales=totales,
+        orden=tuple(orden),
+        filtros=filtros, tipo=tipo_fila(tuple(campos)), columnas=tuple(columnas),
+        dimensiones=tuple(DIMENSIONES[d] for d in spec.dimensiones),
+        medidas=tuple(MEDIDAS[m] for m in spec.medidas),
+        mensual='periodo' not in spec.dimensiones or spec.nivel in NIVELES_MENSUALES,
+        resueltas=tuple(DIMENSIONES[d] for d in spec.dimensiones if DIMENSIONES[d].resolver))
+
+
+def filtrar(queryset, busquedas, filtros):
+    """
+    Aplica a un QuerySet los filtros pedidos, traducidos con ``busquedas``
+    (filtro -> búsqueda del ORM).
+
+    Raises:
+        ValueError: Si se pide un filtro no declarado en la especificación.
+    """
+    filtros = filtros or {}
+    desconocidos = set(filtros) - set(busquedas)
+    if desconocidos:
+        raise ValueError(
+            f"Filtros no declarados en la especificación: {', '.join(sorted(desconocidos))}.")
+    for clave, valor in filtros.items():
+        valores = valor if isinstance(valor, (list, tuple, set, frozenset)) else [valor]
+        queryset = queryset.filter(**{busquedas[clave]: valores})
+    return queryset
+
+
+def consulta_especificacion(spec, inicio, fin, filtros=None):
+    """
+    QuerySet (sin evaluar) de una especificación para un rango y filtros.
+
+    Un plan sobre el rollup cuyo rango son meses cerrados lee los resúmenes
+    mensuales (ver cierre), que tienen las mismas columnas. Cada fila trae
+    también los grandes totales (columnas ``t_<agregado>``). Sin dimensiones
+    devuelve el QuerySet filtrado, listo para ``aggregate``. Si el orden
+    depende de columnas resueltas aparte, la consulta no ordena.
+    """
+    plan = compilar(spec)
+    modelo = FUENTES[plan.fuente]
+    if plan.fuente == ROLLUP and plan.mensual:
+        from apps.reports.cierre import fuente_para_rangos
+
+        modelo = fuente_para_rangos([(inicio, fin)])
+    queryset = filtrar(modelo.objects.filter(date__range=[inicio, fin]), plan.filtros, filtros)
+    if not plan.valores:
+        return queryset
+    return (
+        queryset.values(**plan.valores).annotate(**plan.agregados, **plan.totales)
+        .order_by(*(() if plan.resueltas else plan.orden)))
+
+
+def _resolver(plan, resultado):
+    """
+    Completa las columnas resueltas aparte (una consulta por dimensión) y
+    ordena el resultado.
+    """
+    if not plan.resueltas or not resultado:
+        return
+    for dimension in plan.resueltas:
+        llave = dimension.columnas[0].alias
+        valores = dimension.resolver({entrada[llave] for entrada in resultado})
+        for entrada in resultado:
+            entrada.update(zip(dimension.resueltas, valores[entrada[llave]]))
+    resultado.sort(key=lambda entrada: tuple(entrada[alias] for alias in plan.orden))
+
+
+def _fila(plan, entrada):
+    valores = []
+    for dimension in plan.dimensiones:
+        valores.extend(dimension.convertir(
+            *(entrada[columna.alias] for columna in dimension.columnas),
+            *(entrada[alias] for alias in dimension.resueltas)))
+    valores.extend(medida.derivar(entrada) for medida in plan.medidas)
+    return plan.tipo(*valores)
+
+
+def _fila_total(plan, totales):
+    valores = []
+    for dimension in plan.dimensiones:
+        valores.extend([None] * len(dimension.campos))
+    if valores:
+        valores[plan.tipo._fields.index(plan.columnas[0][0])] = ETIQUETA_GRAN_TOTAL
+    valores.extend(medida.derivar(totales) for medida in plan.medidas)
+    return plan.tipo(*valores)
+
+
+def _resultado_sql(spec, inicio, fin, filtros):
+    plan = compilar(spec)
+    consulta = consulta_especificacion(spec, inicio, fin, filtros)
+    with fase('consulta'):
+        if not plan.dimensiones:
+            totales = consulta.aggregate(**plan.agregados)
+            return [totales], totales
+        resultado = list(consulta)
+    # Sin filas no hay totales (cuentan como cero al derivar las medidas)
+    totales = {
+        alias: resultado[0][PREFIJO_TOTAL + alias] if resultado else None
+        for alias in plan.agregados
+    }
+    return resultado, totales
+
+
+def _resultado_numpy(spec, inicio, fin, filtros):
+    from apps.reports.vectorizado import resultado_vectorizado
+
+    return resultado_vectorizado(spec, inicio, fin, filtros)
+
+
+# Motores de ejecución: ambos devuelven una entrada (dict con los alias de
+# las columnas y de los agregados) por combinación de dimensiones, en orden
+# salvo que el plan tenga columnas resueltas aparte, y los grandes totales
+# (dict con los alias de los agregados).
+MOTORES = {
+    'sql': _resultado_sql,
+    'numpy': _resultado_numpy,
+}
+
+
+def ejecutar_especificacion(spec, inicio, fin, filtros=None, periodo=None, motor='sql'):
+    """
+    Ejecuta una especificación.
+
+    El motor 'sql' agrupa en la base de datos en una sola consulta; el motor
+    'numpy' lee las columnas de Income una vez y agrupa en memoria con
+    operaciones vectorizadas (conviene en rangos largos). Ambos producen el
+    mismo reporte.
+
+    Args:
+        spec (EspecificacionReporte): Especificación a ejecutar.
+        inicio (date): Primer día del rango.
+        fin (date): Último día del rango.
+        filtros (dict): Valor (o lista de valores) por filtro declarado.
+        periodo (str): Nombre del período, solo informativo.
+        motor (str): 'sql' o 'numpy'.
+
+    Returns:
+        ReporteIngresos: Filas por combinación de dimensiones y gran total.
+    """
+    if motor not in MOTORES:
+        raise ValueError(f"Motor no válido: {motor!r}. Usa: {', '.join(MOTORES)}.")
+    plan = compilar(spec)
+    resultado, totales = MOTORES[motor](spec, inicio, fin, filtros)
+    with fase('consulta'):
+        _resolver(plan, resultado)
+
+    with fase('formato'):
+        filas = [_fila(plan, entrada) for entrada in resultado] if plan.dimensiones else []
+        total = _fila_total(plan, totales)
+
+    return ReporteIngresos(
+        periodo, inicio, fin, columnas=plan.columnas, filas=filas, total=total)
@@ -0,0 +1,242 @@
+"""
+Facturación en lote de los ingresos facturables (Income.is_facturable).
+
+Los ingresos sin factura se recorren por llave (pk > último) en lotes. Por
+cada lote se crean, en una transacción, las facturas en estado pendiente
+con su folio y su XML ya fijos; los PDF (opcionales) se renderizan en un
+pool de procesos y todo se agrega a un ZIP que se emite por partes. Solo
+al terminar el ZIP las facturas pasan a emitidas.
+
+Si el proceso se interrumpe, la siguiente ejecución empieza por las
+facturas que quedaron pendientes en su rango (mismos folios y mismo XML) y
+luego sigue con los ingresos que aún no tienen factura, así que un ingreso
+nunca recibe dos folios.
+
+El XML es un comprobante simplificado con los datos del emisor
+(REPORTS_FISCAL_HEADER), el receptor y el concepto; no incluye timbrado.
+"""
+import multiprocessing
+import xml.etree.ElementTree as ET
+import zipfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.timezone import now
+
+from apps.pages.models import Income
+from apps.reports.lotes import DocumentoLote, SalidaZip, inicializar_worker, renderizar_documento
+from apps.reports.models import Invoice
+from apps.reports.pdf import encabezado_fiscal
+from apps.reports.resultado import ETIQUETA_GRAN_TOTAL, ReporteIngresos
+from apps.reports.rollup import TAMANO_LOTE
+
+FilaFactura = namedtuple('FilaFactura', ['concepto', 'total_ingresos'])
+
+
+def serie_facturas():
+    """
+    Serie de los folios, configurable con settings.REPORTS_INVOICE_SERIES.
+    """
+    return getattr(settings, 'REPORTS_INVOICE_SERIES', 'A')
+
+
+def folio(factura):
+    """
+    Folio de una factura (serie y pk a 8 dígitos): nombre de sus archivos,
+    título del PDF y atributo Folio del XML.
+    """
+    return f"{serie_facturas()}{factura.pk:08d}"
+
+
+def ingresos_por_facturar(inicio=None, fin=None):
+    """
+    Ingresos facturables que aún no tienen factura, opcionalmente en un rango.
+    """
+    queryset = Income.objects.filter(is_facturable=True, invoice__isnull=True)
+    if inicio:
+        queryset = queryset.filter(date__gte=inicio)
+    if fin:
+        queryset = queryset.filter(date__lte=fin)
+    return queryset
+
+
+def xml_factura(factura, encabezado):
+    """
+    Comprobante XML de una factura.
+    """
+    importe = str(factura.amount)
+    comprobante = ET.Element('Comprobante', {
+        'Version': '1.0',
+        'Serie': serie_facturas(),
+        'Folio': folio(factura),
+        'Fecha': factura.created_at.isoformat(timespec='seconds'),
+        'Moneda': 'MXN',
+        'SubTotal': importe,
+        'Total': importe,
+    })
+    ET.SubElement(comprobante, 'Emisor', {
+        'Rfc': encabezado.rfc,
+        'Nombre': encabezado.empresa,
+        'DomicilioFiscal': encabezado.direccion,
+    })
+    ET.SubElement(comprobante, 'Receptor', {'Nombre': factura.customer})
+    conceptos = ET.SubElement(comprobante, 'Conceptos')
+    ET.SubElement(conceptos, 'Concepto', {
+        'Cantidad': '1',
+        'Descripcion': factura.description,
+        'Fecha': factura.date.isoformat(),
+        'ValorUnitario': importe,
+        'Importe': importe,
+    })
+    return ET.tostring(comprobante, encoding='unicode', xml_declaration=True)
+
+
+def documento_factura(factura):
+    """
+    Documento PDF de una factura (una fila con el concepto y su importe).
+    """
+    nombre = folio(factura)
+    reporte = ReporteIngresos(
+        'factura', factura.date, factura.date,
+        columnas=[('concepto', 'Concepto'), ('total_ingresos', 'Importe')],
+        filas=[FilaFactura(factura.description, factura.amount)],
+        total=FilaFactura(ETIQUETA_GRAN_TOTAL, factura.amount))
+    return DocumentoLote(
+        nombre=f"{nombre}.pdf",
+        titulo=f"Factura {nombre} - {factura.customer}",
+        reporte=reporte)
+
+
+def _facturas_pendientes(inicio, fin, tamano_lote):
+    pendientes = Invoice.objects.filter(status=Invoice.PENDING)
+    if inicio:
+        pendientes = pendientes.filter(date__gte=inicio)
+    if fin:
+        pendientes = pendientes.filter(date__lte=fin)
+    ultimo = 0
+    while True:
+        lote = list(pendientes.filter(pk__gt=ultimo).order_by('pk')[:tamano_lote])
+        if not lote:
+            return
+        ultimo = lote[-1].pk
+        yield lote
+
+
+@transaction.atomic
+def _crear_facturas(ingresos, encabezado):
+    Invoice.objects.bulk_create([
+        Invoice(
+            income_id=pk, date=fecha, amount=monto,
+            customer=f"{nombre} {apellido}", description=procedimiento)
+        for pk, fecha, monto, nombre, apellido, procedimiento in ingresos
+    ], ignore_conflicts=True)
+    # Se releen para tener pk y fecha de creación en cualquier backend; si
+    # otro proceso facturó alguno de estos ingresos, ese no se incluye aquí
+    facturas = list(Invoice.objects.filter(
+        income_id__in=[ingreso[0] for ingreso in ingresos],
+        status=Invoice.PENDING, xml='').order_by('pk'))
+    for factura in facturas:
+        factura.xml = xml_factura(factura, encabezado)
+    Invoice.objects.bulk_update(facturas, ['xml'])
+    return facturas
+
+
+def _facturas_nuevas(inicio, fin, tamano_lote, encabezado):
+    pendientes = ingresos_por_facturar(inicio, fin).order_by('pk')
+    ultimo = 0
+    while True:
+        ingresos = list(pendientes.filter(pk__gt=ultimo).values_list(
+            'pk', 'date', 'amount', 'patient__first_name', 'patient__last_name',
+            'procedure__name')[:tamano_lote])
+        if not ingresos:
+            return
+        ultimo = ingresos[-1][0]
+        yield _crear_facturas(ingresos, encabezado)
+
+
+def lotes_de_facturas(inicio=None, fin=None, tamano_lote=TAMANO_LOTE, encabezado=None):
+    """
+    Lotes de facturas por emitir del rango: primero las pendientes de una
+    ejecución interrumpida y luego las de los ingresos sin factura.
+    """
+    encabezado = encabezado or encabezado_fiscal()
+    yield from _facturas_pendientes(inicio, fin, tamano_lote)
+    yield from _facturas_nuevas(inicio, fin, tamano_lote, encabezado)
+
+
+def _marcar_emitidas(pks, tamano_lote):
+    momento = now()
+    for inicio in range(0, len(pks), tamano_lote):
+        Invoice.objects.filter(
+            pk__in=pks[inicio:inicio + tamano_lote], status=Invoice.PENDING
+        ).update(status=Invoice.ISSUED, issued_at=momento)
+
+
+def generar_zip_facturas(inicio=None, fin=None, incluir_pdf=True, encabezado=None,
+                         max_workers=None, tamano_lote=TAMANO_LOTE, progreso=None):
+    """
+    Factura los ingresos pendientes y emite un ZIP por partes con un XML (y
+    opcionalmente un PDF) por factura.
+
+    Args:
+        inicio (date): Solo ingresos desde esta fecha.
+        fin (date): Solo ingresos hasta esta fecha.
+        incluir_pdf (bool): Renderizar también el PDF de cada factura.
+        encabezado (EncabezadoFiscal): Emisor (settings por omisión).
+        max_workers (int): Procesos del pool de PDFs.
+        tamano_lote (int): Ingresos por lote.
+        progreso (callable): Se llama como ``progreso(facturas, errores)`` al
+            terminar cada lote.
+
+    Yields:
+        bytes: Partes consecutivas del archivo ZIP.
+    """
+    encabezado = encabezado or encabezado_fiscal()
+    salida = SalidaZip()
+    emitidas, errores = [], []
+
+    # El pool se crea al entrar al with, así que siempre se cierra
+    crear_pool = partial(
+        ProcessPoolExecutor,
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context(),
+        initializer=inicializar_worker) if incluir_pdf else nullcontext
+
+    with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_DEFLATED) as archivo, \
+            crear_pool() as pool:
+        for facturas in lotes_de_facturas(inicio, fin, tamano_lote, encabezado):
+            fallidas = set()
+            for factura in facturas:
+                archivo.writestr(f"{folio(factura)}.xml", factura.xml)
+
+            if incluir_pdf:
+                futuros = {
+                    pool.submit(renderizar_documento, documento_factura(factura), encabezado): factura
+                    for factura in facturas
+                }
+                for futuro in as_completed(futuros):
+                    factura = futuros[futuro]
+                    try:
+                        archivo.writestr(f"{folio(factura)}.pdf", futuro.result())
+                    except Exception as e:
+                        # Queda pendiente y se reintenta en la siguiente ejecución
+                        fallidas.add(factura.pk)
+                        errores.append((folio(factura), f"{type(e).__name__}: {e}"))
+
+            emitidas.extend(factura.pk for factura in facturas if factura.pk not in fallidas)
+            if progreso:
+                progreso(len(emitidas), len(errores))
+            yield salida.vaciar()
+
+        if errores:
+            archivo.writestr('errores.txt', ''.join(
+                f"{nombre}: {error}\n" for nombre, error in errores))
+
+    yield salida.vaciar()
+
+    # El ZIP ya se entregó completo: solo ahora las facturas quedan emitidas
+    _marcar_emitidas(emitidas, tamano_lote)
@@ -0,0 +1,150 @@
+"""
+Gráficas de barras y de líneas para incrustar en los PDFs.
+
+Una Grafica solo describe los datos (tipo, título, etiquetas y valores); el
+dibujo de reportlab se construye a partir de ella y se guarda en memoria
+usando como llave esos mismos datos, de modo que un lote de PDFs con
+la misma gráfica en cada documento la dibuja una sola vez por proceso. Su
+huella (SHA-256 de los datos) entra en la llave de caché del PDF (ver
+apps.reports.pdf).
+
+Son las mismas gráficas de charts/index.html: la mezcla por tipo de pago
+(barras) y la tendencia mensual de ingresos (líneas).
+"""
+import hashlib
+from collections import namedtuple
+from functools import lru_cache
+
+from django.utils.timezone import now
+
+BARRAS = 'barras'
+LINEAS = 'lineas'
+
+ANCHO = 450
+ALTO = 220
+
+# Dibujos distintos que se conservan por proceso
+MAX_DIBUJOS = 64
+
+
+class Grafica(namedtuple('Grafica', ['tipo', 'titulo', 'etiquetas', 'valores'])):
+    """
+    Datos de una gráfica: etiquetas del eje de categorías y un valor por etiqueta.
+    """
+    __slots__ = ()
+
+    def huella(self):
+        """
+        Hash SHA-256 de los datos de la gráfica.
+        """
+        return hashlib.sha256(repr(tuple(self)).encode()).hexdigest()
+
+
+def _grafica(tipo, titulo, etiquetas, valores):
+    etiquetas = tuple(str(etiqueta) for etiqueta in etiquetas)
+    valores = tuple(float(valor or 0) for valor in valores)
+    if len(etiquetas) != len(valores):
+        raise ValueError("Cada etiqueta de la gráfica necesita un valor.")
+    return Grafica(tipo, titulo, etiquetas, valores)
+
+
+def grafica_barras(titulo, etiquetas, valores):
+    return _grafica(BARRAS, titulo, etiquetas, valores)
+
+
+def grafica_lineas(titulo, etiquetas, valores):
+    return _grafica(LINEAS, titulo, etiquetas, valores)
+
+
+def grafica_mezcla_pagos(reporte):
+    """
+    Barras con el total de cada tipo de pago de obtener_reporte_ingresos.
+    """
+    return grafica_barras(
+        "Ingresos por tipo de pago",
+        [fila.tipo_pago for fila in reporte],
+        [fila.total_ingresos for fila in reporte])
+
+
+def grafica_tendencia_mensual(serie):
+    """
+    Línea con el total por mes de una serie de obtener_serie_ingresos
+    (nivel mensual).
+    """
+    return grafica_lineas(
+        "Ingresos mensuales",
+        [fila['periodo'].strftime('%m/%Y') for fila in serie['serie']],
+        [fila['total'] for fila in serie['serie']])
+
+
+def graficas_ingresos(reporte=None, meses=12, hoy=None):
+    """
+    Gráficas del tablero de ingresos para acompañar a un reporte.
+
+    Args:
+        reporte (ReporteIngresos): Reporte por tipo de pago para la mezcla de
+            pagos; sin él solo se incluye la tendencia.
+        meses (int): Meses de la tendencia mensual (incluyendo el actual).
+        hoy (date): Fecha de referencia.
+
+    Returns:
+        tuple[Grafica]: Mezcla de pagos (si hay reporte) y tendencia mensual.
+    """
+    from apps.reports.reporter import obtener_serie_ingresos
+
+    graficas = [grafica_mezcla_pagos(reporte)] if reporte is not None else []
+    serie = obtener_serie_ingresos(
+        'mensual', nivel='mensual', periodos=meses, hoy=hoy or now().date())
+    graficas.append(grafica_tendencia_mensual(serie))
+    return tuple(graficas)
+
+
+def _eje_valores(eje, valores):
+    eje.valueMin = min(0, *valores) if valores else 0
+    eje.labels.fontSize = 7
+    eje.labelTextFormat = lambda valor: f"${valor:,.0f}"
+
+
+def _dibujar(grafica):
+    from reportlab.graphics.charts.barcharts import VerticalBarChart
+    from reportlab.graphics.charts.linecharts import HorizontalLineChart
+    from reportlab.graphics.shapes import Drawing, String
+    from reportlab.lib import colors
+
+    dibujo = Drawing(ANCHO, ALTO)
+    dibujo.add(String(
+        ANCHO / 2, ALTO - 14, grafica.titulo,
+        fontName='Helvetica-Bold', fontSize=10, textAnchor='middle'))
+
+    if grafica.tipo == BARRAS:
+        cuerpo = VerticalBarChart()
+        cuerpo.bars[0].fillColor = colors.steelblue
+        cuerpo.barSpacing = 2
+    else:
+        cuerpo = HorizontalLineChart()
+        cuerpo.lines[0].strokeColor = colors.steelblue
+        cuerpo.lines[0].strokeWidth = 2
+        cuerpo.joinedLines = 1
+
+    cuerpo.x, cuerpo.y = 60, 45
+    cuerpo.width, cuerpo.height = ANCHO - 80, ALTO - 75
+    # Una serie vacía no se puede escalar; se dibujan solo los ejes
+    cuerpo.data = [grafica.valores or (0,)]
+    cuerpo.categoryAxis.categoryNames = list(grafica.etiquetas) or ['']
+    cuerpo.categoryAxis.labels.fontSize = 7
+    cuerpo.categoryAxis.labels.boxAnchor = 'ne'
+    cuerpo.categoryAxis.labels.angle = 30
+    cuerpo.categoryAxis.labels.dy = -2
+    _eje_valores(cuerpo.valueAxis, grafica.valores)
+    dibujo.add(cuerpo)
+    return dibujo
+
+
+@lru_cache(maxsize=MAX_DIBUJOS)
+def dibujo(grafica):
+    """
+    Dibujo de reportlab (un Flowable) de la gráfica, reutilizado mientras
+    los datos no cambien: la Grafica es una tupla inmutable y la caché la
+    compara por contenido.
+    """
+    return _dibujar(grafica)
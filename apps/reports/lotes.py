@@ -0,0 +1,166 @@
+"""
+Generación en lote de PDFs (uno por dentista o por período).
+
+Los documentos se renderizan en un pool de procesos y se van agregando a un
+ZIP que se emite por partes conforme se construye, de modo que la respuesta
+(o el archivo) empieza a salir antes de terminar el lote. Los documentos se
+leen conforme hay lugar en el pool (a lo más EN_VUELO_POR_WORKER por
+proceso), así que en memoria solo están esos y sus PDF sin escribir. Un
+documento que falla no detiene al resto: el error se registra en
+``errores.txt``.
+"""
+import multiprocessing
+import os
+import zipfile
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+
+from django.utils.text import slugify
+
+from apps.reports.pdf import encabezado_fiscal, renderizar_reporte_pdf
+from apps.reports.resultado import ReporteIngresos
+
+DocumentoLote = namedtuple(
+    'DocumentoLote', ['nombre', 'titulo', 'reporte', 'graficas'], defaults=((),))
+
+# Documentos enviados al pool por proceso antes de esperar a que termine alguno
+EN_VUELO_POR_WORKER = 2
+
+
+class SalidaZip:
+    """
+    Destino de escritura no posicionable para ZipFile que acumula los bytes
+    escritos hasta que se vacían con ``vaciar``.
+    """
+
+    def __init__(self):
+        self._partes = []
+        self._posicion = 0
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self._partes)
+        self._partes = []
+        return datos
+
+
+def inicializar_worker():
+    # Con el método 'spawn' (macOS/Windows) el proceso hijo no hereda Django
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+
+
+def renderizar_documento(documento, encabezado):
+    return renderizar_reporte_pdf(
+        documento.reporte, encabezado, titulo=documento.titulo, graficas=documento.graficas)
+
+
+def documentos_por_dentista(reporte_por_dentista, graficas=()):
+    """
+    Arma un documento por dentista a partir de obtener_reporte_ingresos_por_dentista.
+
+    Las ``graficas`` se repiten en cada documento; cada proceso del pool las
+    dibuja una sola vez.
+    """
+    for fila in reporte_por_dentista:
+        reporte = ReporteIngresos(
+            reporte_por_dentista.periodo,
+            reporte_por_dentista.inicio,
+            reporte_por_dentista.fin,
+            columnas=reporte_por_dentista.columnas,
+            filas=[fila],
+            total=fila._replace(dentista='Total')
+        )
+        periodo = f"{reporte_por_dentista.inicio} al {reporte_por_dentista.fin}"
+        yield DocumentoLote(
+            nombre=f"{slugify(fila.dentista)}-{fila.dentista_id}.pdf",
+            titulo=f"Estado de cuenta de {fila.dentista} ({periodo})",
+            reporte=reporte,
+            graficas=graficas
+        )
+
+
+def documentos_por_periodo(reportes):
+    """
+    Arma un documento por cada reporte (p. ej. uno por período).
+    """
+    for reporte in reportes:
+        yield DocumentoLote(
+            nombre=f"{reporte.periodo}-{reporte.inicio}.pdf",
+            titulo=f"Reporte de Ingresos ({reporte.inicio} al {reporte.fin})",
+            reporte=reporte
+        )
+
+
+def generar_zip_pdfs(documentos, encabezado=None, max_workers=None, progreso=None):
+    """
+    Renderiza los documentos en paralelo y emite un ZIP por partes.
+
+    Args:
+        documentos (iterable[DocumentoLote]): Documentos a renderizar; se
+            consumen conforme avanza el lote.
+        encabezado (EncabezadoFiscal): Encabezado fiscal (settings por omisión).
+        max_workers (int): Procesos del pool (núcleos disponibles por omisión).
+        progreso (callable): Se llama como ``progreso(hechos, total, nombre, error)``
+            cada vez que termina un documento; ``total`` es None si
+            ``documentos`` no tiene longitud (p. ej. un generador).
+
+    Yields:
+        bytes: Partes consecutivas del archivo ZIP.
+    """
+    total = len(documentos) if hasattr(documentos, '__len__') else None
+    documentos = iter(documentos)
+    encabezado = encabezado or encabezado_fiscal()
+    max_workers = max_workers or os.cpu_count() or 1
+    salida = SalidaZip()
+    errores = []
+    hechos = 0
+
+    with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_DEFLATED) as archivo:
+        with ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context(),
+                initializer=inicializar_worker) as pool:
+            pendientes = {}
+            while True:
+                # Rellena la ventana de documentos en vuelo
+                for documento in islice(
+                        documentos, EN_VUELO_POR_WORKER * max_workers - len(pendientes)):
+                    pendientes[pool.submit(renderizar_documento, documento, encabezado)] = documento
+                if not pendientes:
+                    break
+
+                listos, _ = wait(pendientes, return_when=FIRST_COMPLETED)
+                for futuro in listos:
+                    documento = pendientes.pop(futuro)
+                    try:
+                        archivo.writestr(documento.nombre, futuro.result())
+                        error = None
+                    except Exception as e:
+                        error = f"{type(e).__name__}: {e}"
+                        errores.append((documento.nombre, error))
+
+                    hechos += 1
+                    if progreso:
+                        progreso(hechos, total, documento.nombre, error)
+                    yield salida.vaciar()
+
+        if errores:
+            archivo.writestr('errores.txt', ''.join(
+                f"{nombre}: {error}\n" for nombre, error in errores))
+
+    yield salida.vaciar()
@@ -0,0 +1,55 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from apps.reports.benchmark import comparar, ejecutar_benchmark
+
+
+class Command(BaseCommand):
+    help = ("Mide el escalamiento de los reportes con datos sintéticos en una "
+            "base de datos temporal y escribe los resultados en JSON.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, nargs='+',
+                            default=[10_000, 100_000, 1_000_000],
+                            help="Tamaños de la tabla Income a medir.")
+        parser.add_argument('--repeticiones', type=int, default=3)
+        parser.add_argument('--semilla', type=int, default=0)
+        parser.add_argument('--salida', help="Archivo JSON de resultados (stdout por omisión).")
+        parser.add_argument('--comparar', help="JSON de una corrida anterior para comparar.")
+        parser.add_argument('--umbral', type=float, default=1.2,
+                            help="Razón de tiempo a partir de la cual se marca una regresión.")
+
+    def handle(self, *args, **options):
+        def progreso(r):
+            self.stderr.write(
+                f"{r['filas']:>9} {r['funcion']:<40} {r['periodo']:<11} "
+                f"{r['segundos_mediana']:.4f}s {r['consultas']} consultas "
+                f"{r['memoria_pico_kb']} KB")
+
+        # Nunca sembrar datos sintéticos en la base de datos real
+        nombre_original = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            salida = ejecutar_benchmark(
+                options['filas'], options['repeticiones'], options['semilla'], progreso)
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+
+        texto = json.dumps(salida, indent=2, ensure_ascii=False)
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as f:
+                f.write(texto)
+        else:
+            self.stdout.write(texto)
+
+        if options['comparar']:
+            with open(options['comparar'], encoding='utf-8') as f:
+                base = json.load(f)
+            for caso in comparar(base, salida):
+                razon = caso['razon_tiempo']
+                if razon is not None and razon >= options['umbral']:
+                    self.stderr.write(self.style.WARNING(
+                        f"Regresión x{razon:.2f}: {caso['filas']} {caso['funcion']} "
+                        f"{caso['periodo']} (consultas {caso['consultas'][0]} -> {caso['consultas'][1]})"))
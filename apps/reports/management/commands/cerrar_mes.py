@@ -0,0 +1,43 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.reports.cierre import cerrar_mes, paquete_contador, verificar_cierre
+
+
+def _mes(valor):
+    return datetime.strptime(valor, '%Y-%m').date()
+
+
+class Command(BaseCommand):
+    help = (
+        "Cierra un mes terminado (resúmenes inmutables con checksum) y, "
+        "opcionalmente, escribe el paquete del contador.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('mes', type=_mes, help="Mes a cerrar, AAAA-MM.")
+        parser.add_argument('--paquete', help="Ruta del ZIP con CSV y PDF de cada reporte.")
+        parser.add_argument(
+            '--verificar', action='store_true',
+            help="Verifica el checksum de un mes ya cerrado.")
+
+    def handle(self, *args, **options):
+        try:
+            periodo, creado = cerrar_mes(options['mes'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        estado = "cerrado" if creado else "ya estaba cerrado"
+        self.stdout.write(
+            f"{periodo.month:%Y-%m} {estado}: {periodo.income_count} ingresos, "
+            f"${periodo.total_amount}, checksum {periodo.checksum}")
+
+        if options['verificar'] and not verificar_cierre(periodo):
+            raise CommandError(
+                "Los ingresos del mes cambiaron después del cierre (el checksum no coincide).")
+
+        if options['paquete']:
+            with open(options['paquete'], 'wb') as f:
+                for parte in paquete_contador(periodo):
+                    f.write(parte)
+            self.stdout.write(self.style.SUCCESS(f"Paquete escrito en {options['paquete']}"))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import ExpressionWrapper, F, OuterRef, Subquery
+
+from apps.pages.models import COMMISSION_AMOUNT_FIELD, Dentist, Income
+from apps.reports.rollup import TAMANO_LOTE
+
+
+class Command(BaseCommand):
+    help = (
+        "Congela la comisión (porcentaje y monto) en los Income que aún no la "
+        "tienen, con el porcentaje actual de su dentista, por lotes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote', type=int, default=TAMANO_LOTE,
+            help=f"Ingresos por lote (por defecto {TAMANO_LOTE}).")
+
+    def handle(self, *args, **options):
+        lote = options['lote']
+        if lote < 1:
+            raise CommandError("El lote debe ser al menos 1.")
+
+        porcentaje = Subquery(
+            Dentist.objects.filter(pk=OuterRef('dentist_id')).values('percentage')[:1])
+        pendientes = Income.objects.filter(commission_rate__isnull=True).order_by('pk')
+
+        # Lotes por llave (pk > último), así cada lote es un UPDATE acotado y
+        # el comando puede interrumpirse y retomarse
+        ultimo = 0
+        total = 0
+        while True:
+            pks = list(pendientes.filter(pk__gt=ultimo).values_list('pk', flat=True)[:lote])
+            if not pks:
+                break
+            # update() notifica los días tocados y el rollup los recalcula
+            total += Income.objects.filter(pk__in=pks).update(
+                commission_rate=porcentaje,
+                commission_amount=ExpressionWrapper(
+                    F('amount') * porcentaje, output_field=COMMISSION_AMOUNT_FIELD))
+            ultimo = pks[-1]
+            self.stdout.write(f"{total} ingresos actualizados (hasta id {ultimo}).")
+
+        self.stdout.write(self.style.SUCCESS(f"Comisiones congeladas: {total} ingresos."))
@@ -0,0 +1,41 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from apps.reports.facturacion import generar_zip_facturas
+
+
+class Command(BaseCommand):
+    help = (
+        "Factura los ingresos facturables pendientes y escribe un ZIP con el XML "
+        "(y el PDF) de cada factura. Si se interrumpe, volver a ejecutarlo retoma "
+        "las facturas pendientes con sus mismos folios.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('salida', help="Ruta del archivo ZIP a escribir.")
+        parser.add_argument('--inicio', type=date.fromisoformat, default=None)
+        parser.add_argument('--fin', type=date.fromisoformat, default=None)
+        parser.add_argument('--sin-pdf', action='store_true', help="Solo genera los XML.")
+        parser.add_argument('--workers', type=int, default=None)
+        parser.add_argument('--lote', type=int, default=None)
+
+    def handle(self, *args, **options):
+        resumen = {'facturas': 0, 'errores': 0}
+
+        def progreso(facturas, errores):
+            resumen.update(facturas=facturas, errores=errores)
+            self.stdout.write(f"{facturas} facturas, {errores} con error")
+
+        argumentos = {'tamano_lote': options['lote']} if options['lote'] else {}
+        with open(options['salida'], 'wb') as f:
+            for parte in generar_zip_facturas(
+                    options['inicio'], options['fin'],
+                    incluir_pdf=not options['sin_pdf'],
+                    max_workers=options['workers'],
+                    progreso=progreso, **argumentos):
+                f.write(parte)
+
+        estilo = self.style.WARNING if resumen['errores'] else self.style.SUCCESS
+        self.stdout.write(estilo(
+            f"{resumen['facturas']} facturas emitidas, {resumen['errores']} con error: "
+            f"{options['salida']}"))
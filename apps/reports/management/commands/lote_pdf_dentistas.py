@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from apps.reports.graficas import graficas_ingresos
+from apps.reports.lotes import documentos_por_dentista, generar_zip_pdfs
+from apps.reports.reporter import obtener_reporte_ingresos_por_dentista
+
+
+class Command(BaseCommand):
+    help = "Genera un ZIP con un PDF de estado de cuenta por dentista."
+
+    def add_arguments(self, parser):
+        parser.add_argument('salida', help="Ruta del archivo ZIP a escribir.")
+        parser.add_argument('--periodo', default='mensual')
+        parser.add_argument('--workers', type=int, default=None)
+        parser.add_argument(
+            '--graficas', action='store_true',
+            help="Incluye la tendencia mensual de ingresos en cada PDF.")
+
+    def handle(self, *args, **options):
+        reporte = obtener_reporte_ingresos_por_dentista(options['periodo'])
+        graficas = graficas_ingresos() if options['graficas'] else ()
+
+        errores = []
+
+        def progreso(hechos, total, nombre, error):
+            if error:
+                errores.append(nombre)
+            estado = f"ERROR {error}" if error else "ok"
+            self.stdout.write(f"[{hechos}/{len(reporte)}] {nombre}: {estado}")
+
+        with open(options['salida'], 'wb') as f:
+            for parte in generar_zip_pdfs(
+                    documentos_por_dentista(reporte, graficas),
+                    max_workers=options['workers'],
+                    progreso=progreso):
+                f.write(parte)
+
+        estilo = self.style.WARNING if errores else self.style.SUCCESS
+        self.stdout.write(estilo(
+            f"{len(reporte) - len(errores)} PDFs generados, {len(errores)} con error: "
+            f"{options['salida']}"))
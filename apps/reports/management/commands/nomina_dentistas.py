@@ -0,0 +1,38 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.reports.nomina import ejecutar_nomina, reporte_nomina
+from apps.reports.reporter import calcular_rango_reporte
+
+
+class Command(BaseCommand):
+    help = "Congela (o muestra, si ya existe) la nómina de honorarios de un período."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--periodo', default='mensual')
+        parser.add_argument(
+            '--hoy', type=date.fromisoformat, default=None,
+            help="Fecha dentro del período; por omisión, el período anterior al actual.")
+        parser.add_argument('--inicio', type=date.fromisoformat, default=None)
+        parser.add_argument('--fin', type=date.fromisoformat, default=None)
+
+    def handle(self, *args, **options):
+        try:
+            hoy = options['hoy']
+            if hoy is None and not (options['inicio'] and options['fin']):
+                # El período en curso no ha terminado: se congela el anterior
+                actual, _ = calcular_rango_reporte(options['periodo'])
+                hoy = actual - timedelta(days=1)
+            inicio, fin = calcular_rango_reporte(
+                options['periodo'], hoy, options['inicio'], options['fin'])
+            corrida, creada = ejecutar_nomina(inicio, fin)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for fila in reporte_nomina(corrida).tabla():
+            self.stdout.write("\t".join(str(valor) for valor in fila))
+        estado = "creada" if creada else "ya existía"
+        self.stdout.write(self.style.SUCCESS(
+            f"Nómina {corrida.pk} ({inicio} a {fin}) {estado}: "
+            f"{corrida.income_count} ingresos."))
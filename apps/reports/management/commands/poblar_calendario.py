@@ -0,0 +1,21 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from apps.reports.calendario import (
+    CALENDARIO_FIN, CALENDARIO_INICIO, poblar_calendario)
+
+
+class Command(BaseCommand):
+    help = "Inserta en la dimensión de calendario los días faltantes de un rango."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=date.fromisoformat,
+                            default=CALENDARIO_INICIO, help="AAAA-MM-DD")
+        parser.add_argument('--hasta', type=date.fromisoformat,
+                            default=CALENDARIO_FIN, help="AAAA-MM-DD")
+
+    def handle(self, *args, **options):
+        poblar_calendario(options['desde'], options['hasta'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Calendario poblado del {options['desde']} al {options['hasta']}."))
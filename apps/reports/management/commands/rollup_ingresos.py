@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.pages.models import Income
+from apps.reports.rollup import reconstruir_rollup, verificar_rollup
+
+
+class Command(BaseCommand):
+    help = "Verifica (o reconstruye) el rollup diario de ingresos contra Income."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reconstruir', action='store_true',
+            help="Reconstruye el rollup completo antes de verificarlo.")
+
+    def handle(self, *args, **options):
+        if options['reconstruir']:
+            # Sin la comisión congelada el rollup reconstruido sumaría 0 en
+            # honorarios para esos ingresos
+            sin_comision = Income.objects.filter(commission_amount__isnull=True).count()
+            if sin_comision:
+                raise CommandError(
+                    f"Hay {sin_comision} ingresos sin comisión congelada. "
+                    "Ejecuta congelar_comisiones antes de --reconstruir.")
+            cubos = reconstruir_rollup()
+            self.stdout.write(f"Rollup reconstruido: {cubos} cubos.")
+
+        diferencias = verificar_rollup()
+        for clave, esperado, actual in diferencias:
+            self.stdout.write(
+                f"{clave}: esperado={esperado} actual={actual}")
+        if diferencias:
+            raise CommandError(
+                f"El rollup no coincide con Income en {len(diferencias)} cubos. "
+                "Ejecuta con --reconstruir para repararlo.")
+
+        self.stdout.write(self.style.SUCCESS("El rollup coincide con Income."))
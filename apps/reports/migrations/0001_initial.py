@@ -0,0 +1,58 @@
+# Generated by Django 4.2.9 on 2026-10-18 13:16
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def poblar_rollup(apps, schema_editor):
+    Income = apps.get_model('pages', 'Income')
+    IncomeDailyRollup = apps.get_model('reports', 'IncomeDailyRollup')
+    cubos = (
+        Income.objects.order_by()
+        .values('date', 'dentist_id', 'procedure_id', 'was_paid')
+        .annotate(
+            total_amount=models.Sum('amount'),
+            income_count=models.Count('id'),
+            # Comisión ya congelada por pages.0003, igual que en rollup.agregar_ingresos
+            total_honorarios=Coalesce(
+                models.Sum('commission_amount'), models.Value(Decimal(0)),
+                output_field=models.DecimalField(max_digits=16, decimal_places=4)
+            )
+        )
+    )
+    IncomeDailyRollup.objects.bulk_create(
+        [IncomeDailyRollup(**cubo) for cubo in cubos], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        # El rollup se siembra con la comisión congelada de cada Income
+        ('pages', '0003_income_commission_amount_income_commission_rate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IncomeDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('was_paid', models.CharField(max_length=10)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('income_count', models.PositiveIntegerField(default=0)),
+                ('total_honorarios', models.DecimalField(decimal_places=4, default=0, max_digits=16)),
+                ('dentist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='pages.dentist')),
+                ('procedure', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='pages.procedure')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='incomedailyrollup',
+            constraint=models.UniqueConstraint(fields=('date', 'dentist', 'procedure', 'was_paid'), name='reports_rollup_unique_bucket'),
+        ),
+        migrations.RunPython(poblar_rollup, migrations.RunPython.noop),
+    ]
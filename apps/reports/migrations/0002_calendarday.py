@@ -0,0 +1,79 @@
+# Generated by Django 4.2.9 on 2026-10-18 13:20
+
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def poblar(apps, schema_editor):
+    """
+    Puebla CalendarDay de 2000-01-01 a 2050-12-31.
+
+    Copia fija de apps.reports.calendario.atributos_de_dia al crear la tabla,
+    para que la migración no cambie si cambia ese módulo.
+    """
+    CalendarDay = apps.get_model('reports', 'CalendarDay')
+    inicio_fiscal = getattr(settings, 'REPORTS_FISCAL_YEAR_START_MONTH', 1)
+
+    def dia(fecha):
+        iso_year, iso_week, iso_weekday = fecha.isocalendar()
+        quarter = (fecha.month - 1) // 3 + 1
+        semester = 1 if fecha.month <= 6 else 2
+        return CalendarDay(
+            date=fecha,
+            year=fecha.year,
+            month=fecha.month,
+            quarter=quarter,
+            semester=semester,
+            iso_year=iso_year,
+            iso_week=iso_week,
+            week_start=fecha - timedelta(days=iso_weekday - 1),
+            month_start=fecha.replace(day=1),
+            quarter_start=fecha.replace(month=(quarter - 1) * 3 + 1, day=1),
+            semester_start=fecha.replace(month=(semester - 1) * 6 + 1, day=1),
+            year_start=fecha.replace(month=1, day=1),
+            fiscal_year=fecha.year if fecha.month >= inicio_fiscal else fecha.year - 1,
+            fiscal_quarter=(fecha.month - inicio_fiscal) % 12 // 3 + 1,
+        )
+
+    inicio, fin = date(2000, 1, 1), date(2050, 12, 31)
+    CalendarDay.objects.bulk_create(
+        (dia(inicio + timedelta(days=n)) for n in range((fin - inicio).days + 1)),
+        batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalendarDay',
+            fields=[
+                ('date', models.DateField(primary_key=True, serialize=False)),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('quarter', models.PositiveSmallIntegerField()),
+                ('semester', models.PositiveSmallIntegerField()),
+                ('iso_year', models.PositiveSmallIntegerField()),
+                ('iso_week', models.PositiveSmallIntegerField()),
+                ('week_start', models.DateField(db_index=True)),
+                ('month_start', models.DateField(db_index=True)),
+                ('quarter_start', models.DateField(db_index=True)),
+                ('semester_start', models.DateField(db_index=True)),
+                ('year_start', models.DateField(db_index=True)),
+                ('fiscal_year', models.PositiveSmallIntegerField(db_index=True)),
+                ('fiscal_quarter', models.PositiveSmallIntegerField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='incomedailyrollup',
+            name='calendario',
+            field=models.ForeignObject(from_fields=('date',), null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='reports.calendarday', to_fields=('date',)),
+        ),
+        migrations.RunPython(poblar, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 4.2.9 on 2026-10-18 13:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0003_income_commission_amount_income_commission_rate'),
+        ('reports', '0002_calendarday'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayrollItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('commission_rate', models.DecimalField(decimal_places=2, max_digits=3)),
+                ('commission_amount', models.DecimalField(decimal_places=4, max_digits=12)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PayrollLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dentist_name', models.CharField(max_length=201)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_honorarios', models.DecimalField(decimal_places=4, default=0, max_digits=16)),
+                ('income_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PayrollRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateField()),
+                ('end', models.DateField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_honorarios', models.DecimalField(decimal_places=4, default=0, max_digits=16)),
+                ('income_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='payrollrun',
+            constraint=models.UniqueConstraint(fields=('start', 'end'), name='reports_payroll_unique_period'),
+        ),
+        migrations.AddField(
+            model_name='payrollline',
+            name='dentist',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='pages.dentist'),
+        ),
+        migrations.AddField(
+            model_name='payrollline',
+            name='run',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='reports.payrollrun'),
+        ),
+        migrations.AddField(
+            model_name='payrollitem',
+            name='income',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.PROTECT, related_name='payroll_item', to='pages.income'),
+        ),
+        migrations.AddField(
+            model_name='payrollitem',
+            name='line',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='reports.payrollline'),
+        ),
+        migrations.AddField(
+            model_name='payrollitem',
+            name='run',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='reports.payrollrun'),
+        ),
+        migrations.AddConstraint(
+            model_name='payrollline',
+            constraint=models.UniqueConstraint(fields=('run', 'dentist'), name='reports_payroll_unique_dentist'),
+        ),
+    ]
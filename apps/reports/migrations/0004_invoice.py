@@ -0,0 +1,30 @@
+# Generated by Django 4.2.9 on 2026-10-18 13:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0003_income_commission_amount_income_commission_rate'),
+        ('reports', '0003_payrollitem_payrollline_payrollrun_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Invoice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pendiente'), ('issued', 'Emitida')], db_index=True, default='pending', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('issued_at', models.DateTimeField(blank=True, null=True)),
+                ('date', models.DateField()),
+                ('customer', models.CharField(max_length=201)),
+                ('description', models.CharField(max_length=100)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('xml', models.TextField(blank=True)),
+                ('income', models.OneToOneField(on_delete=django.db.models.deletion.PROTECT, related_name='invoice', to='pages.income')),
+            ],
+        ),
+    ]
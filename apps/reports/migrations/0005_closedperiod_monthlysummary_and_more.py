@@ -0,0 +1,46 @@
+# Generated by Django 4.2.9 on 2026-10-18 13:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0003_income_commission_amount_income_commission_rate'),
+        ('reports', '0004_invoice'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClosedPeriod',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(unique=True)),
+                ('closed_at', models.DateTimeField(auto_now_add=True)),
+                ('checksum', models.CharField(max_length=64)),
+                ('income_count', models.PositiveIntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_honorarios', models.DecimalField(decimal_places=4, default=0, max_digits=16)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MonthlySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('was_paid', models.CharField(max_length=10)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('income_count', models.PositiveIntegerField(default=0)),
+                ('total_honorarios', models.DecimalField(decimal_places=4, default=0, max_digits=16)),
+                ('calendario', models.ForeignObject(from_fields=('date',), null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='reports.calendarday', to_fields=('date',))),
+                ('dentist', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='pages.dentist')),
+                ('period', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='summaries', to='reports.closedperiod')),
+                ('procedure', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='pages.procedure')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='monthlysummary',
+            constraint=models.UniqueConstraint(fields=('date', 'dentist', 'procedure', 'was_paid'), name='reports_summary_unique_bucket'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.9 on 2026-10-18 14:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0005_closedperiod_monthlysummary_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportGeneration',
+            fields=[
+                ('key', models.CharField(max_length=16, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField()),
+            ],
+        ),
+    ]
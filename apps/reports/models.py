@@ -1,3 +1,253 @@
 from django.db import models
 
-# Create your models here.
+from apps.pages.models import Dentist, Income, Procedure
+
+
+class CalendarDay(models.Model):
+    """
+    Model to store the calendar dimension used to group incomes by period.
+
+    One row per day with the keys of every period it belongs to, so any
+    grouping is a join on ``date`` plus a GROUP BY on an indexed column.
+    """
+    date = models.DateField(primary_key=True)
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    quarter = models.PositiveSmallIntegerField()
+    semester = models.PositiveSmallIntegerField()
+    iso_year = models.PositiveSmallIntegerField()
+    iso_week = models.PositiveSmallIntegerField()
+    week_start = models.DateField(db_index=True)
+    month_start = models.DateField(db_index=True)
+    quarter_start = models.DateField(db_index=True)
+    semester_start = models.DateField(db_index=True)
+    year_start = models.DateField(db_index=True)
+    fiscal_year = models.PositiveSmallIntegerField(db_index=True)
+    fiscal_quarter = models.PositiveSmallIntegerField()
+
+    def __str__(self):
+        return f"{self.date} ({self.iso_year}-W{self.iso_week:02d})"
+
+
+class IncomeDailyRollup(models.Model):
+    """
+    Model to store daily income totals per dentist, procedure and payment type.
+
+    Rows are kept in sync with Income by apps.reports.signals and can be
+    rebuilt or verified with the ``rollup_ingresos`` management command.
+    """
+    date = models.DateField()
+    dentist = models.ForeignKey(Dentist, on_delete=models.CASCADE)
+    procedure = models.ForeignKey(Procedure, on_delete=models.CASCADE)
+    was_paid = models.CharField(max_length=10)
+    # Relación virtual (sin columna) para agrupar por cualquier período
+    calendario = models.ForeignObject(
+        CalendarDay, on_delete=models.DO_NOTHING,
+        from_fields=['date'], to_fields=['date'], related_name='+', null=True)
+    total_amount = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0)
+    income_count = models.PositiveIntegerField(default=0)
+    total_honorarios = models.DecimalField(
+        max_digits=16, decimal_places=4, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'dentist', 'procedure', 'was_paid'],
+                name='reports_rollup_unique_bucket'),
+        ]
+
+    def __str__(self):
+        return f"Rollup {self.date} - {self.dentist_id}/{self.procedure_id}/{self.was_paid} - ${self.total_amount}"
+
+
+class PayrollRun(models.Model):
+    """
+    Model to store a frozen payroll run of dentist honorarios for a period.
+
+    Totals are copied from the included incomes when the run is created, so
+    a past run is read as stored and never recomputed. Runs are unique per
+    period; see apps.reports.nomina.
+    """
+    start = models.DateField()
+    end = models.DateField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    total_amount = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0)
+    total_honorarios = models.DecimalField(
+        max_digits=16, decimal_places=4, default=0)
+    income_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['start', 'end'], name='reports_payroll_unique_period'),
+        ]
+
+    def __str__(self):
+        return f"Payroll {self.start} - {self.end} - ${self.total_honorarios}"
+
+
+class PayrollLine(models.Model):
+    """
+    Model to store the frozen totals of one dentist in a payroll run.
+    """
+    run = models.ForeignKey(PayrollRun, on_delete=models.CASCADE, related_name='lines')
+    dentist = models.ForeignKey(Dentist, on_delete=models.PROTECT)
+    dentist_name = models.CharField(max_length=201)
+    total_amount = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0)
+    total_honorarios = models.DecimalField(
+        max_digits=16, decimal_places=4, default=0)
+    income_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['run', 'dentist'], name='reports_payroll_unique_dentist'),
+        ]
+
+    def __str__(self):
+        return f"Payroll {self.run_id} - {self.dentist_name} - ${self.total_honorarios}"
+
+
+class PayrollItem(models.Model):
+    """
+    Model to store each income paid in a payroll run.
+
+    The one-to-one link marks the income as paid: an income belongs to at
+    most one run, so overlapping runs never pay it twice.
+    """
+    run = models.ForeignKey(PayrollRun, on_delete=models.CASCADE, related_name='items')
+    line = models.ForeignKey(PayrollLine, on_delete=models.CASCADE, related_name='items')
+    income = models.OneToOneField(
+        Income, on_delete=models.PROTECT, related_name='payroll_item')
+    date = models.DateField()
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    commission_rate = models.DecimalField(max_digits=3, decimal_places=2)
+    commission_amount = models.DecimalField(max_digits=12, decimal_places=4)
+
+    def __str__(self):
+        return f"Payroll {self.run_id} - Income {self.income_id} - ${self.commission_amount}"
+
+
+class Invoice(models.Model):
+    """
+    Model to store the fiscal invoice issued for a facturable income.
+
+    Rows are created as ``pending`` with their folio and XML already fixed,
+    and become ``issued`` once the batch that rendered them finished, so an
+    interrupted batch is resumed with the same folios; see
+    apps.reports.facturacion.
+    """
+    PENDING = 'pending'
+    ISSUED = 'issued'
+
+    income = models.OneToOneField(
+        Income, on_delete=models.PROTECT, related_name='invoice')
+    status = models.CharField(
+        max_length=10,
+        choices=[(PENDING, 'Pendiente'), (ISSUED, 'Emitida')],
+        default=PENDING, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    issued_at = models.DateTimeField(null=True, blank=True)
+    date = models.DateField()
+    customer = models.CharField(max_length=201)
+    description = models.CharField(max_length=100)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    xml = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"Invoice {self.pk} - Income {self.income_id} - ${self.amount} ({self.status})"
+
+
+class ClosedPeriod(models.Model):
+    """
+    Model to store a closed month.
+
+    The checksum covers every income of the month as it was when the month
+    was closed; see apps.reports.cierre.
+    """
+    month = models.DateField(unique=True)
+    closed_at = models.DateTimeField(auto_now_add=True)
+    checksum = models.CharField(max_length=64)
+    income_count = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0)
+    total_honorarios = models.DecimalField(
+        max_digits=16, decimal_places=4, default=0)
+
+    def __str__(self):
+        return f"Closed {self.month:%Y-%m} - ${self.total_amount}"
+
+
+class ImmutableQuerySet(models.QuerySet):
+    """
+    QuerySet that refuses bulk updates and deletes.
+    """
+
+    def update(self, **kwargs):
+        raise ValueError(f"{self.model.__name__} rows are immutable.")
+
+    def delete(self):
+        raise ValueError(f"{self.model.__name__} rows are immutable.")
+
+
+class MonthlySummary(models.Model):
+    """
+    Model to store the immutable monthly totals of a closed period per
+    dentist, procedure and payment type.
+
+    It has the same columns as IncomeDailyRollup (with ``date`` as the first
+    day of the month), so reports over closed months read it instead.
+    """
+    period = models.ForeignKey(
+        ClosedPeriod, on_delete=models.PROTECT, related_name='summaries')
+    date = models.DateField()
+    dentist = models.ForeignKey(Dentist, on_delete=models.PROTECT)
+    procedure = models.ForeignKey(Procedure, on_delete=models.PROTECT)
+    was_paid = models.CharField(max_length=10)
+    calendario = models.ForeignObject(
+        CalendarDay, on_delete=models.DO_NOTHING,
+        from_fields=['date'], to_fields=['date'], related_name='+', null=True)
+    total_amount = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0)
+    income_count = models.PositiveIntegerField(default=0)
+    total_honorarios = models.DecimalField(
+        max_digits=16, decimal_places=4, default=0)
+
+    objects = ImmutableQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'dentist', 'procedure', 'was_paid'],
+                name='reports_summary_unique_bucket'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("MonthlySummary rows are immutable.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("MonthlySummary rows are immutable.")
+
+    def __str__(self):
+        return f"Summary {self.date:%Y-%m} - {self.dentist_id}/{self.procedure_id}/{self.was_paid} - ${self.total_amount}"
+
+
+class ReportGeneration(models.Model):
+    """
+    Model to store the report cache generation counters.
+
+    One row per month (``YYYY-MM``) plus a global row. They live in the
+    database so every process (web workers, management commands, shell)
+    sees the same counters, even when cached reports are per process; see
+    apps.reports.cache.
+    """
+    key = models.CharField(max_length=16, primary_key=True)
+    value = models.BigIntegerField()
+
+    def __str__(self):
+        return f"Generation {self.key} = {self.value}"
@@ -0,0 +1,145 @@
+"""
+Nómina de honorarios: congela por período los totales de cada dentista y
+el detalle de los ingresos pagados.
+
+Una corrida suma en la base de datos, por dentista, los ingresos del período
+que aún no se han pagado (con la comisión congelada en cada Income) y guarda
+en una transacción la corrida, una línea por dentista y un renglón por
+ingreso, estos últimos por lotes de llave con inserciones masivas. Las corridas son únicas por período: volver a
+ejecutar la misma devuelve la existente. Consultar una corrida pasada solo
+lee sus líneas guardadas.
+"""
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils.timezone import now
+
+from apps.pages.models import Dentist, Income
+from apps.reports.models import PayrollItem, PayrollLine, PayrollRun
+from apps.reports.resultado import (
+    ETIQUETA_GRAN_TOTAL, FilaDentista, ReporteIngresos, a_centavos)
+from apps.reports.rollup import TAMANO_LOTE
+
+COLUMNAS_NOMINA = [
+    ('dentista', 'Dentista'),
+    ('total_ingresos', 'Total Ingresos'),
+    ('total_honorarios', 'Total Honorarios'),
+]
+
+
+def ingresos_por_pagar(inicio, fin):
+    """
+    Ingresos del rango que todavía no pertenecen a ninguna corrida.
+    """
+    return Income.objects.filter(date__range=[inicio, fin], payroll_item__isnull=True)
+
+
+def _crear_corrida(inicio, fin):
+    pendientes = ingresos_por_pagar(inicio, fin)
+    if pendientes.filter(commission_rate__isnull=True).exists():
+        raise ValueError(
+            "Hay ingresos sin comisión congelada en el período; "
+            "ejecuta primero el comando congelar_comisiones.")
+
+    totales = {
+        total.pop('dentist_id'): total
+        for total in pendientes.order_by().values('dentist_id').annotate(
+            total_amount=Sum('amount'),
+            income_count=Count('id'),
+            total_honorarios=Coalesce(
+                Sum('commission_amount'), Value(0),
+                output_field=DecimalField(max_digits=16, decimal_places=4)))
+    }
+
+    # Líneas en el orden del reporte por dentista (apellido, nombre)
+    dentistas = (
+        Dentist.objects.filter(pk__in=totales)
+        .order_by('last_name', 'first_name')
+        .values_list('pk', 'first_name', 'last_name'))
+
+    corrida = PayrollRun.objects.create(
+        start=inicio, end=fin,
+        total_amount=sum((total['total_amount'] for total in totales.values()), Decimal(0)),
+        total_honorarios=sum(
+            (total['total_honorarios'] for total in totales.values()), Decimal(0)),
+        income_count=sum(total['income_count'] for total in totales.values()))
+    PayrollLine.objects.bulk_create([
+        PayrollLine(
+            run=corrida, dentist_id=dentista, dentist_name=f"{nombre} {apellido}",
+            **totales[dentista])
+        for dentista, nombre, apellido in dentistas
+    ])
+    lineas = dict(corrida.lines.values_list('dentist_id', 'pk'))
+
+    # Renglones por lotes de llave (pk), sin tener todo el período en memoria
+    ultimo = 0
+    while True:
+        lote = list(
+            pendientes.filter(pk__gt=ultimo).order_by('pk')
+            .values_list('pk', 'dentist_id', 'date', 'amount',
+                         'commission_rate', 'commission_amount')[:TAMANO_LOTE])
+        PayrollItem.objects.bulk_create([
+            PayrollItem(
+                run=corrida, line_id=lineas[dentista], income_id=pk, date=fecha,
+                amount=monto, commission_rate=porcentaje, commission_amount=comision)
+            for pk, dentista, fecha, monto, porcentaje, comision in lote
+        ])
+        if len(lote) < TAMANO_LOTE:
+            break
+        ultimo = lote[-1][0]
+    return corrida
+
+
+def ejecutar_nomina(inicio, fin, hoy=None):
+    """
+    Congela la nómina de un período, o devuelve la ya existente.
+
+    Solo se congelan períodos terminados, como en el cierre de mes: un
+    ingreso registrado más tarde con fecha del período quedaría fuera de la
+    corrida. Los ingresos pagados en otra corrida (p. ej. un período que se
+    traslapa) no se vuelven a incluir.
+
+    Returns:
+        tuple[PayrollRun, bool]: La corrida y si se creó en esta llamada.
+
+    Raises:
+        ValueError: Si el rango no es válido, el período no ha terminado o hay
+            ingresos sin comisión congelada.
+    """
+    if inicio > fin:
+        raise ValueError("El inicio del período no puede ser posterior al fin.")
+    if fin >= (hoy or now().date()):
+        raise ValueError("Solo puede congelarse la nómina de períodos terminados.")
+
+    corrida = PayrollRun.objects.filter(start=inicio, end=fin).first()
+    if corrida is not None:
+        return corrida, False
+    try:
+        with transaction.atomic():
+            return _crear_corrida(inicio, fin), True
+    except IntegrityError:
+        # Otro proceso congeló el mismo período (o alguno de sus ingresos)
+        corrida = PayrollRun.objects.filter(start=inicio, end=fin).first()
+        if corrida is None:
+            raise
+        return corrida, False
+
+
+def reporte_nomina(corrida):
+    """
+    Reporte por dentista de una corrida, leído de sus líneas guardadas.
+    """
+    lineas = corrida.lines.order_by('pk').values_list(
+        'dentist_id', 'dentist_name', 'total_amount', 'total_honorarios')
+    return ReporteIngresos(
+        'nomina', corrida.start, corrida.end,
+        columnas=COLUMNAS_NOMINA,
+        filas=[
+            FilaDentista(dentista, nombre, a_centavos(monto), a_centavos(comision))
+            for dentista, nombre, monto, comision in lineas
+        ],
+        total=FilaDentista(
+            None, ETIQUETA_GRAN_TOTAL,
+            a_centavos(corrida.total_amount), a_centavos(corrida.total_honorarios)))
@@ -0,0 +1,185 @@
+"""
+Servicio de renderizado de reportes a PDF.
+
+reportlab se importa de forma diferida (solo al renderizar), el PDF se genera
+en memoria y los bytes se guardan en caché usando como llave un hash del
+contenido del reporte, de sus gráficas y del encabezado fiscal. Las tablas
+largas se parten en bloques para que reportlab no tenga que acomodar miles de
+filas de una vez; la memoria sigue creciendo con el tamaño del reporte (ver
+_construir_pdf). Las gráficas (ver apps.reports.graficas) van entre el
+título y la tabla.
+"""
+import hashlib
+from collections import namedtuple
+from datetime import date
+from decimal import Decimal
+from functools import lru_cache
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.reports.traza import fase, traza_activa
+
+EncabezadoFiscal = namedtuple(
+    'EncabezadoFiscal', ['empresa', 'rfc', 'direccion', 'telefono'])
+
+
+def encabezado_fiscal():
+    """
+    Encabezado fiscal configurado en settings.REPORTS_FISCAL_HEADER.
+    """
+    return EncabezadoFiscal(**settings.REPORTS_FISCAL_HEADER)
+
+
+# Filas por bloque de tabla; cada bloque repite el encabezado de columnas
+FILAS_POR_BLOQUE = 500
+
+PREFIJO_CACHE = 'reports:pdf:'
+
+TITULO_POR_OMISION = "Reporte de Ingresos"
+
+
+@lru_cache(maxsize=None)
+def _estilos():
+    """
+    Hoja de estilos y estilo de tabla compartidos entre llamadas.
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import TableStyle
+
+    estilo_tabla = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ])
+    return getSampleStyleSheet(), estilo_tabla
+
+
+def formatear_celda(valor):
+    """
+    Formatea un valor de la tabla para mostrarlo en el PDF.
+
+    Los montos son Decimal; los enteros son conteos y se muestran sin signo.
+    """
+    if isinstance(valor, (Decimal, float)):
+        return f"${valor:,.2f}"
+    if isinstance(valor, int) and not isinstance(valor, bool):
+        return f"{valor:,}"
+    if valor is None:
+        return ''
+    return str(valor)
+
+
+def huella_pdf(reporte, encabezado, fecha, titulo=TITULO_POR_OMISION, graficas=()):
+    """
+    Hash SHA-256 de todo lo que entra en el PDF: el contenido del reporte,
+    sus gráficas, el encabezado fiscal, la fecha impresa y el título.
+    """
+    digest = hashlib.sha256(repr((tuple(encabezado), fecha, titulo)).encode())
+    digest.update(reporte.huella().encode())
+    for grafica in graficas:
+        digest.update(grafica.huella().encode())
+    return digest.hexdigest()
+
+
+def llave_pdf(reporte, encabezado, fecha, titulo, graficas=()):
+    """
+    Llave de caché del PDF (ver huella_pdf).
+    """
+    return PREFIJO_CACHE + huella_pdf(reporte, encabezado, fecha, titulo, graficas)
+
+
+def _bloques(filas, tamano):
+    bloque = []
+    for fila in filas:
+        bloque.append(fila)
+        if len(bloque) >= tamano:
+            yield bloque
+            bloque = []
+    if bloque:
+        yield bloque
+
+
+def _construir_pdf(reporte, encabezado, fecha, titulo, graficas=()):
+    """
+    Arma el PDF completo en un buffer en memoria.
+
+    La memoria no está acotada: crece con el número de filas, porque
+    ``doc.build`` recibe la lista completa de tablas (reportlab no acepta un
+    generador) y el PDF terminado queda entero en el buffer. Los bloques de
+    FILAS_POR_BLOQUE filas solo acotan el trabajo de acomodo y partición de
+    cada tabla entre páginas.
+    """
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table
+
+    from apps.reports.graficas import dibujo
+
+    styles, estilo_tabla = _estilos()
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+
+    # Encabezado de la factura; Paragraph interpreta marcado, así que los
+    # textos (nombres, razón social) se escapan
+    elements = [
+        Paragraph(f"""
+        <b>{escape(encabezado.empresa)}</b><br/>
+        RFC: {escape(encabezado.rfc)}<br/>
+        Dirección: {escape(encabezado.direccion)}<br/>
+        Teléfono: {escape(encabezado.telefono)}<br/>
+        Fecha: {fecha.strftime('%d/%m/%Y')}<br/>
+        """, styles['Normal']),
+        Paragraph("<br/>", styles['Normal']),
+        Paragraph(f"<b>{escape(titulo)}</b>", styles['Heading2']),
+        Paragraph("<br/>", styles['Normal']),
+    ]
+
+    # Gráficas ya dibujadas si otro documento las usó con los mismos datos
+    for grafica in graficas:
+        elements += [dibujo(grafica), Spacer(1, 12)]
+
+    # Una tabla por bloque de filas; reportlab parte cada una entre páginas
+    encabezados = reporte.encabezados
+    filas = ([formatear_celda(valor) for valor in fila] for fila in reporte.tabla())
+    for bloque in _bloques(filas, FILAS_POR_BLOQUE):
+        tabla = Table([encabezados] + bloque, repeatRows=1)
+        tabla.setStyle(estilo_tabla)
+        elements.append(tabla)
+
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+def renderizar_reporte_pdf(reporte, encabezado, fecha=None, titulo=TITULO_POR_OMISION,
+                           graficas=()):
+    """
+    Renderiza un reporte a PDF en memoria, reutilizando la caché si existe.
+
+    Args:
+        reporte (ReporteIngresos): Reporte a incluir en la tabla.
+        encabezado (EncabezadoFiscal): Datos fiscales de la empresa.
+        fecha (date): Fecha impresa en el documento (hoy por omisión).
+        titulo (str): Título sobre la tabla.
+        graficas (iterable[Grafica]): Gráficas a incluir antes de la tabla.
+
+    Returns:
+        bytes: Contenido del PDF.
+    """
+    fecha = fecha or date.today()
+    graficas = tuple(graficas)
+    llave = llave_pdf(reporte, encabezado, fecha, titulo, graficas)
+    # Con traza activa se renderiza siempre para medir la fase completa
+    contenido = None if traza_activa() else cache.get(llave)
+    if contenido is None:
+        with fase('render'):
+            contenido = _construir_pdf(reporte, encabezado, fecha, titulo, graficas)
+        cache.set(llave, contenido,
+                  getattr(settings, 'REPORTS_PDF_CACHE_TIMEOUT', 60 * 60))
+    return contenido
@@ -1,96 +1,308 @@
-from reportlab.lib import colors
-from datetime import datetime
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
-from reportlab.lib.pagesizes import letter, landscape
 import csv
-from django.db.models import Sum, F
+from decimal import Decimal
+from functools import reduce
+from operator import itemgetter, or_
+from django.db.models import Q, Sum
 from django.utils.timezone import now, timedelta
 from dateutil.relativedelta import relativedelta
-from apps.pages.models import Income
+from apps.reports.cache import reporte_cacheado
+from apps.reports.calendario import serie_por_periodo
+from apps.reports.pdf import EncabezadoFiscal, renderizar_reporte_pdf
+from apps.reports.especificacion import EspecificacionReporte, ejecutar_especificacion
+from apps.reports.resultado import (
+    ETIQUETA_GRAN_TOTAL, FilaComparativa, ReporteComparativo, a_centavos)
+from apps.reports.traza import fase
 
 
-def obtener_reporte_ingresos(periodo="semanal"):
+# Los reportes clásicos, expresados como especificaciones declarativas
+ESPEC_TIPO_PAGO = EspecificacionReporte(
+    dimensiones=('tipo_pago',), medidas=('total',))
+
+ESPEC_DENTISTA = EspecificacionReporte(
+    dimensiones=('dentista',), medidas=('total', 'honorarios'))
+
+
+@reporte_cacheado('tipo_pago')
+def obtener_reporte_ingresos(periodo="semanal", hoy=None, inicio=None, fin=None, motor='sql'):
     """
     Genera un reporte de ingresos agrupados por tipo de pago para diferentes períodos.
+
+    Los totales por tipo de pago y el gran total salen de la misma consulta,
+    así que siempre son consistentes entre sí. Con ``hoy`` se reporta el
+    período que contiene esa fecha; con ``inicio`` y ``fin`` se reporta ese
+    rango explícito. ``motor='numpy'`` calcula en memoria (ver vectorizado).
+    """
+    # Calcular el rango de fechas según el período seleccionado
+    start_date, end_date = calcular_rango_reporte(periodo, hoy, inicio, fin)
+    return ejecutar_especificacion(
+        ESPEC_TIPO_PAGO, start_date, end_date, periodo=periodo, motor=motor)
+
+
+@reporte_cacheado('dentista')
+def obtener_reporte_ingresos_por_dentista(periodo="semanal", hoy=None, inicio=None, fin=None,
+                                          motor='sql'):
+    """
+    Genera un reporte de ingresos totales por dentista para un período específico.
+
+    Los totales por dentista y los grandes totales salen de la misma
+    consulta, que agrupa el rollup por ``dentist_id`` sin JOIN; los nombres
+    se leen después en una segunda consulta. Con ``hoy`` se reporta el
+    período que contiene esa fecha; con ``inicio`` y ``fin`` se reporta ese
+    rango explícito. ``motor='numpy'`` calcula en memoria (ver vectorizado).
     """
-    hoy = now().date()
     # Calcular el rango de fechas según el período seleccionado
-    start_date, end_date = calcular_rango_fecha(periodo, hoy)
-
-    # Query para obtener el reporte de ingresos
-    reporte_query = (
-        Income.objects.filter(date__range=[start_date, end_date])
-        .values('was_paid')
-        .annotate(total_amount=Sum('amount'))
-        .order_by('was_paid')
+    start_date, end_date = calcular_rango_reporte(periodo, hoy, inicio, fin)
+    return ejecutar_especificacion(
+        ESPEC_DENTISTA, start_date, end_date, periodo=periodo, motor=motor)
+
+
+def normalizar_filtros(filtros):
+    """
+    Filtros como tupla ordenada de pares (filtro, valores), estable como
+    parte de la llave de caché.
+    """
+    return tuple(sorted(
+        (clave, tuple(sorted(valor)) if isinstance(valor, (list, tuple, set, frozenset)) else (valor,))
+        for clave, valor in dict(filtros or {}).items()
+    ))
+
+
+@reporte_cacheado('especificacion')
+def _reporte_especificacion(spec, periodo, hoy, inicio, fin, filtros, motor):
+    start_date, end_date = calcular_rango_reporte(periodo, hoy, inicio, fin)
+    return ejecutar_especificacion(
+        spec, start_date, end_date, dict(filtros), periodo=periodo, motor=motor)
+
+
+def obtener_reporte_especificacion(spec, periodo="mensual", hoy=None, inicio=None, fin=None,
+                                   filtros=None, motor='sql', usar_cache=True):
+    """
+    Ejecuta una especificación declarativa para un período o rango explícito.
+
+    Args:
+        spec (EspecificacionReporte): Dimensiones, medidas y filtros permitidos.
+        filtros (dict): Valor o lista de valores por filtro declarado.
+        motor (str): 'sql' (GROUP BY en la base) o 'numpy' (en memoria).
+
+    Returns:
+        ReporteIngresos: El reporte, desde la caché cuando es posible.
+    """
+    return _reporte_especificacion(
+        spec, periodo, hoy, inicio, fin, normalizar_filtros(filtros), motor,
+        usar_cache=usar_cache)
+
+
+# Rangos de un reporte comparativo, en el orden de calcular_rangos_comparativos
+RANGOS_COMPARATIVOS = ('actual', 'anterior', 'anio_anterior', 'acumulado')
+
+
+def calcular_rangos_comparativos(periodo, hoy):
+    """
+    Rangos del período actual, del período anterior, del mismo período del
+    año anterior y del acumulado del año (del 1 de enero al fin del período
+    actual).
+    """
+    actual = calcular_rango_fecha(periodo, hoy)
+    anterior = calcular_rango_fecha(periodo, actual[0] - timedelta(days=1))
+    anio_anterior = calcular_rango_fecha(periodo, hoy - relativedelta(years=1))
+    acumulado = (actual[0].replace(month=1, day=1), actual[1])
+    return [actual, anterior, anio_anterior, acumulado]
+
+
+def _fila_comparativa(clave, concepto, actual, anterior, anio_anterior, acumulado):
+    def porcentaje(base):
+        return (actual - base) / base * 100 if base else None
+
+    return FilaComparativa(
+        clave, concepto, actual, anterior, anio_anterior,
+        variacion_anterior=actual - anterior,
+        variacion_anual=actual - anio_anterior,
+        porcentaje_anterior=porcentaje(anterior),
+        porcentaje_anual=porcentaje(anio_anterior),
+        acumulado=acumulado
     )
 
-    # Convertir los resultados a una estructura más adecuada para tabla/CSV
-    reporte = [
-        {
-            'Tipo de Pago': entry['was_paid'],
-            'Total Ingresos': entry['total_amount']
-        }
-        for entry in reporte_query
-    ]
 
-   # Calcular el gran total
-    gran_total = sum(entry['total_amount'] for entry in reporte_query)
+def _filas_comparativas(consulta, clave, concepto):
+    """
+    Construye filas comparativas (con variaciones y acumulado del año) y su
+    total a partir del resultado materializado de una consulta comparativa.
+    """
+    filas = []
+    totales = [Decimal(0)] * len(RANGOS_COMPARATIVOS)
+    for entrada in consulta:
+        montos = [a_centavos(entrada[nombre]) for nombre in RANGOS_COMPARATIVOS]
+        totales = [total + monto for total, monto in zip(totales, montos)]
+        filas.append(_fila_comparativa(clave(entrada), concepto(entrada), *montos))
 
-    # Agregar el gran total al reporte
-    reporte.append({
-        'Tipo de Pago': 'Gran Total',
-        'Total Ingresos': gran_total
-    })
+    total = _fila_comparativa(None, ETIQUETA_GRAN_TOTAL, *totales)
+    return filas, total
 
-    return {
-        'periodo': periodo,
-        'rango': {'inicio': start_date, 'fin': end_date},
-        'reporte': reporte
+
+def _consulta_comparativa(rangos, *dimensiones):
+    """
+    Una sola consulta con agregación condicional para los rangos de
+    RANGOS_COMPARATIVOS (sobre los resúmenes mensuales si todos son meses
+    cerrados).
+    """
+    from apps.reports.cierre import fuente_para_rangos
+
+    filtros = {
+        nombre: Q(date__range=rango) for nombre, rango in zip(RANGOS_COMPARATIVOS, rangos)
     }
+    return (
+        fuente_para_rangos(rangos).objects
+        .filter(reduce(or_, filtros.values()))
+        .values(*dimensiones)
+        .annotate(**{
+            nombre: Sum('total_amount', filter=filtro)
+            for nombre, filtro in filtros.items()
+        })
+    )
 
 
-def obtener_reporte_ingresos_por_dentista(periodo="semanal"):
+COLUMNAS_COMPARATIVAS = [
+    ('actual', 'Actual'),
+    ('anterior', 'Período Anterior'),
+    ('anio_anterior', 'Año Anterior'),
+    ('variacion_anterior', 'Var. Período Anterior'),
+    ('variacion_anual', 'Var. Año Anterior'),
+    ('acumulado', 'Acumulado del Año'),
+]
+
+
+@reporte_cacheado('comparativo_tipo_pago', rangos=calcular_rangos_comparativos)
+def obtener_comparativo_ingresos(periodo="mensual", hoy=None):
     """
-    Genera un reporte de ingresos totales por dentista para un período específico.
+    Compara los ingresos por tipo de pago del período actual contra el
+    período anterior y contra el mismo período del año anterior.
+
+    Los tres totales por tipo de pago y su acumulado del año salen de una
+    sola consulta con agregación condicional; las variaciones se derivan de
+    ese mismo resultado.
     """
-    hoy = now().date()
-    # Calcular el rango de fechas según el período seleccionado
-    start_date, end_date = calcular_rango_fecha(periodo, hoy)
-
-    # Query para obtener los ingresos por dentista
-    reporte_query = (
-        Income.objects.filter(date__range=[start_date, end_date])
-        .values('dentist__id', 'dentist__first_name', 'dentist__last_name', 'dentist__percentage')
-        .annotate(
-            total_ingresos=Sum('amount'),
-            total_honorarios=Sum(F('amount') * F('dentist__percentage'))
+    hoy = hoy or now().date()
+    rangos = calcular_rangos_comparativos(periodo, hoy)
+
+    with fase('consulta'):
+        consulta = list(_consulta_comparativa(rangos, 'was_paid').order_by('was_paid'))
+    with fase('formato'):
+        filas, total = _filas_comparativas(
+            consulta, clave=itemgetter('was_paid'), concepto=itemgetter('was_paid'))
+
+    return ReporteComparativo(
+        periodo, dict(zip(RANGOS_COMPARATIVOS, rangos)),
+        columnas=[('concepto', 'Tipo de Pago')] + COLUMNAS_COMPARATIVAS,
+        filas=filas,
+        total=total
+    )
+
+
+@reporte_cacheado('comparativo_dentista', rangos=calcular_rangos_comparativos)
+def obtener_comparativo_por_dentista(periodo="mensual", hoy=None):
+    """
+    Compara los ingresos por dentista del período actual contra el período
+    anterior y contra el mismo período del año anterior, con el acumulado
+    del año de cada dentista, en una sola consulta.
+    """
+    hoy = hoy or now().date()
+    rangos = calcular_rangos_comparativos(periodo, hoy)
+
+    with fase('consulta'):
+        consulta = list(
+            _consulta_comparativa(
+                rangos, 'dentist_id', 'dentist__first_name', 'dentist__last_name')
+            .order_by('dentist__last_name', 'dentist__first_name')
         )
-        .order_by('dentist__last_name', 'dentist__first_name')
+    with fase('formato'):
+        filas, total = _filas_comparativas(
+            consulta, clave=itemgetter('dentist_id'),
+            concepto=lambda entrada: f"{entrada['dentist__first_name']} {entrada['dentist__last_name']}")
+
+    return ReporteComparativo(
+        periodo, dict(zip(RANGOS_COMPARATIVOS, rangos)),
+        columnas=[('concepto', 'Dentista')] + COLUMNAS_COMPARATIVAS,
+        filas=filas,
+        total=total
     )
 
-    # Formatear los resultados para tablas/CSV
-    reporte = [
-        {
-            'Dentista': f"{entry['dentist__first_name']} {entry['dentist__last_name']}",
-            'Total Ingresos': entry['total_ingresos'],
-            'Total Honorarios': entry['total_honorarios']
-        }
-        for entry in reporte_query
-    ]
+
+@reporte_cacheado('serie')
+def obtener_serie_ingresos(periodo="mensual", nivel="semanal", periodos=1, hoy=None):
+    """
+    Genera una serie de ingresos agrupada por un nivel del calendario.
+
+    Por ejemplo, periodo="mensual", nivel="semanal", periodos=12 devuelve los
+    últimos 12 meses agrupados por semana, en una sola consulta agrupada.
+
+    Returns:
+        dict: 'periodo', 'nivel', 'rango' y 'serie' (lista de dicts con
+        'periodo', 'total' y 'cantidad').
+    """
+    hoy = hoy or now().date()
+    start_date, end_date = calcular_rango_fecha(periodo, hoy, periodos)
 
     return {
         'periodo': periodo,
+        'nivel': nivel,
         'rango': {'inicio': start_date, 'fin': end_date},
-        'reporte': reporte
+        'serie': _materializar(serie_por_periodo(nivel, start_date, end_date))
     }
 
 
-def calcular_rango_fecha(periodo, hoy):
+# Meses que abarca cada período (la semana se maneja aparte)
+MESES_POR_PERIODO = {
+    "mensual": 1,
+    "trimestral": 3,
+    "semestral": 6,
+    "anual": 12,
+}
+
+
+def _materializar(queryset):
+    with fase('consulta'):
+        return list(queryset)
+
+
+# Años que puede abarcar un rango explícito: la llave de caché de un reporte
+# lee una generación por cada mes del rango
+MAX_ANIOS_RANGO = 50
+
+
+def validar_rango(inicio, fin):
+    """
+    Valida un rango explícito.
+
+    Raises:
+        ValueError: Si el rango está invertido o abarca más de MAX_ANIOS_RANGO años.
+    """
+    if inicio > fin:
+        raise ValueError("La fecha de inicio debe ser anterior a la fecha de fin.")
+    if (fin.year - inicio.year) * 12 + fin.month - inicio.month >= MAX_ANIOS_RANGO * 12:
+        raise ValueError(f"El rango no puede abarcar más de {MAX_ANIOS_RANGO} años.")
+
+
+def calcular_rango_reporte(periodo, hoy=None, inicio=None, fin=None):
+    """
+    Rango de un reporte: el explícito si se dan ``inicio`` y ``fin``, o el
+    del período que contiene ``hoy`` (la fecha actual por omisión).
+    """
+    if inicio and fin:
+        validar_rango(inicio, fin)
+        return inicio, fin
+    return calcular_rango_fecha(periodo, hoy or now().date())
+
+
+def calcular_rango_fecha(periodo, hoy, periodos=1):
     """
     Calcula el rango de fechas basado en el periodo solicitado.
+
+    Con periodos > 1 el rango empieza ``periodos - 1`` períodos antes del
+    actual (p. ej. los últimos 12 meses, incluyendo el mes en curso).
     """
+    if periodos < 1:
+        raise ValueError("El número de períodos debe ser al menos 1.")
+
     if periodo == "semanal":
         # Lunes de la semana actual
         start_date = hoy - timedelta(days=hoy.weekday())
@@ -119,97 +331,67 @@ def calcular_rango_fecha(periodo, hoy):
         raise ValueError(
             "Período no válido. Usa: 'semanal', 'mensual', 'trimestral', 'semestral', 'anual'.")
 
+    if periodo == "semanal":
+        start_date -= timedelta(weeks=periodos - 1)
+    else:
+        start_date -= relativedelta(months=MESES_POR_PERIODO[periodo] * (periodos - 1))
+
     return start_date, end_date
 
 
-def exportar_a_csv(data, nombre_archivo):
+class _Eco:
+    """
+    Pseudo-archivo para csv.writer que devuelve la línea en vez de guardarla.
+    """
+
+    def write(self, valor):
+        return valor
+
+
+def iterar_csv(reporte):
+    """
+    Genera el CSV del reporte línea por línea (encabezados, filas y gran total).
+    """
+    writer = csv.writer(_Eco())
+    yield writer.writerow(reporte.encabezados)
+    for fila in reporte.tabla():
+        yield writer.writerow(fila)
+
+
+def exportar_a_csv(reporte, nombre_archivo):
     """
-    Exporta el reporte a un archivo CSV.
+    Exporta el reporte (ReporteIngresos) a un archivo CSV, incluyendo el gran total.
     """
-    if data:
-        # Asumimos que todos los elementos tienen las mismas claves
-        keys = data[0].keys()
-        with open(nombre_archivo, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=keys)
-            writer.writeheader()
-            writer.writerows(data)
+    with fase('render'), open(nombre_archivo, 'w', newline='', encoding='utf-8') as f:
+        f.writelines(iterar_csv(reporte))
 
 
-def generar_factura_pdf(nombre_archivo, empresa, rfc, direccion, telefono, reporte):
+def generar_factura_pdf(nombre_archivo, empresa, rfc, direccion, telefono, reporte, graficas=()):
     """
     Genera un PDF tipo factura de gastos con información fiscal y un reporte en tabla.
 
+    El PDF se renderiza en memoria (ver apps.reports.pdf) y solo se escribe a
+    disco si se indica un nombre de archivo.
+
     Args:
-        nombre_archivo (str): Nombre del archivo PDF a generar.
+        nombre_archivo (str): Nombre del archivo PDF a generar, o None para
+            solo obtener los bytes.
         empresa (str): Nombre de la empresa.
         rfc (str): RFC de la empresa.
         direccion (str): Dirección fiscal de la empresa.
         telefono (str): Teléfono de la empresa.
-        reporte (list[dict]): Lista de reportes en formato de diccionario.
-    """
-    doc = SimpleDocTemplate(nombre_archivo, pagesize=letter)
-    elements = []
-    styles = getSampleStyleSheet()
-
-    # Encabezado de la factura
-    encabezado = f"""
-    <b>{empresa}</b><br/>
-    RFC: {rfc}<br/>
-    Dirección: {direccion}<br/>
-    Teléfono: {telefono}<br/>
-    Fecha: {datetime.now().strftime('%d/%m/%Y')}<br/>
-    """
-    elements.append(Paragraph(encabezado, styles['Normal']))
-
-    # Espacio
-    elements.append(Paragraph("<br/>", styles['Normal']))
-
-    # Título del reporte
-    elements.append(
-        Paragraph("<b>Reporte de Ingresos</b>", styles['Heading2']))
-    elements.append(Paragraph("<br/>", styles['Normal']))
-
-    # Crear tabla a partir del reporte
-    # Encabezados de la tabla
-    encabezados = ['Tipo de Pago', 'Total Ingresos']
-    datos = [encabezados]
-
-    # Agregar los datos del reporte a la tabla
-    for fila in reporte:
-        datos.append([fila['Tipo de Pago'], f"${fila['Total Ingresos']:,.2f}"])
-
-    # Crear tabla
-    tabla = Table(datos)
-    tabla.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]))
-
-    # Agregar tabla al documento
-    elements.append(tabla)
-
-    # Construir el PDF
-    doc.build(elements)
-
-
-# Información de ejemplo
-empresa = "Empresa Genérica S.A. de C.V."
-rfc = "GENERIC123456XYZ"
-direccion = "Calle Falsa 123, Ciudad, País"
-telefono = "+52 55 1234 5678"
-
-# Ejemplo de reporte
-reporte = [
-    {'Tipo de Pago': 'Efectivo', 'Total Ingresos': 1500},
-    {'Tipo de Pago': 'Tarjeta', 'Total Ingresos': 2500},
-    {'Tipo de Pago': 'Gran Total', 'Total Ingresos': 4000},
-]
+        reporte (ReporteIngresos): Reporte a incluir en la tabla.
+        graficas (iterable[Grafica]): Gráficas a incluir antes de la tabla
+            (p. ej. apps.reports.graficas.graficas_ingresos).
+
+    Returns:
+        bytes: Contenido del PDF.
+    """
+    contenido = renderizar_reporte_pdf(
+        reporte, EncabezadoFiscal(empresa, rfc, direccion, telefono), graficas=graficas)
+
+    if nombre_archivo:
+        with open(nombre_archivo, 'wb') as f:
+            f.write(contenido)
 
-# Generar PDF
-generar_factura_pdf("factura_reporte.pdf", empresa,
-                    rfc, direccion, telefono, reporte)
+    return contenido
@@ -0,0 +1,167 @@
+"""
+Tipos de resultado compartidos por los reportes de ingresos.
+
+Las filas son namedtuples (sin diccionario por instancia) y el reporte se
+materializa una sola vez, con sus totales calculados en la misma consulta.
+"""
+import hashlib
+from collections import namedtuple
+from decimal import Decimal
+from functools import lru_cache
+
+FilaTipoPago = namedtuple('FilaTipoPago', ['tipo_pago', 'total_ingresos'])
+
+FilaDentista = namedtuple(
+    'FilaDentista',
+    ['dentista_id', 'dentista', 'total_ingresos', 'total_honorarios']
+)
+
+FilaComparativa = namedtuple(
+    'FilaComparativa',
+    ['clave', 'concepto', 'actual', 'anterior', 'anio_anterior',
+     'variacion_anterior', 'variacion_anual',
+     'porcentaje_anterior', 'porcentaje_anual', 'acumulado']
+)
+
+FilaSimulacion = namedtuple(
+    'FilaSimulacion',
+    ['dentista_id', 'dentista', 'nivel', 'porcentaje_actual', 'porcentaje_simulado',
+     'total_ingresos', 'honorarios_actuales', 'honorarios_simulados', 'diferencia']
+)
+
+ETIQUETA_GRAN_TOTAL = 'Gran Total'
+
+CENTAVOS = Decimal('0.01')
+
+
+def a_centavos(valor):
+    """
+    Normaliza un monto agregado a dos decimales (None cuenta como cero).
+
+    Algunos backends (SQLite) devuelven las sumas sin la escala del campo.
+    """
+    return (valor or Decimal(0)).quantize(CENTAVOS)
+
+
+# Tipos de fila con nombre propio, reutilizados cuando los campos coinciden
+TIPOS_FILA = {tipo._fields: tipo for tipo in (FilaTipoPago, FilaDentista)}
+
+
+def construir_fila(campos, valores):
+    return tipo_fila(campos)(*valores)
+
+
+def _reducir_fila(fila):
+    return construir_fila, (fila._fields, tuple(fila))
+
+
+@lru_cache(maxsize=None)
+def tipo_fila(campos):
+    """
+    Tipo de fila (namedtuple) para un conjunto de campos.
+
+    Los tipos creados al vuelo se serializan con pickle a partir de sus
+    campos, así que pueden guardarse en caché aunque otro proceso no los
+    haya creado todavía.
+    """
+    campos = tuple(campos)
+    if campos in TIPOS_FILA:
+        return TIPOS_FILA[campos]
+    tipo = namedtuple('FilaReporte', campos)
+    tipo.__reduce__ = _reducir_fila
+    return tipo
+
+
+class ReporteIngresos:
+    """
+    Resultado materializado de un reporte de ingresos.
+
+    Attributes:
+        periodo (str): Período solicitado ('semanal', 'mensual', ...).
+        inicio (date): Primer día del rango.
+        fin (date): Último día del rango.
+        columnas (tuple[tuple[str, str]]): Pares (campo, encabezado) visibles.
+        filas (tuple): Filas del reporte (namedtuples).
+        total (namedtuple): Fila de gran total, del mismo tipo que las filas.
+    """
+    __slots__ = ('periodo', 'inicio', 'fin', 'columnas', 'filas', 'total')
+
+    def __init__(self, periodo, inicio, fin, columnas, filas, total):
+        self.periodo = periodo
+        self.inicio = inicio
+        self.fin = fin
+        self.columnas = tuple(columnas)
+        self.filas = tuple(filas)
+        self.total = total
+
+    def __iter__(self):
+        return iter(self.filas)
+
+    def __len__(self):
+        return len(self.filas)
+
+    def __repr__(self):
+        return f"<ReporteIngresos {self.periodo} {self.inicio}..{self.fin}: {len(self)} filas>"
+
+    @property
+    def encabezados(self):
+        return [etiqueta for _, etiqueta in self.columnas]
+
+    def tabla(self, incluir_total=True):
+        """
+        Itera las filas como listas de valores visibles, en el orden de
+        ``columnas``, opcionalmente terminando con el gran total.
+        """
+        campos = [campo for campo, _ in self.columnas]
+        filas = self.filas + (self.total,) if incluir_total else self.filas
+        for fila in filas:
+            yield [getattr(fila, campo) for campo in campos]
+
+    def huella(self):
+        """
+        Hash SHA-256 del período, el rango y el contenido visible del reporte.
+        """
+        digest = hashlib.sha256(
+            repr((self.periodo, self.inicio, self.fin, self.columnas)).encode())
+        for fila in self.tabla():
+            digest.update(repr(fila).encode())
+        return digest.hexdigest()
+
+    def como_dict(self):
+        """
+        Representación serializable (con DjangoJSONEncoder) del reporte.
+        """
+        return {
+            'periodo': self.periodo,
+            'rango': {'inicio': self.inicio, 'fin': self.fin},
+            'columnas': [
+                {'campo': campo, 'encabezado': encabezado}
+                for campo, encabezado in self.columnas
+            ],
+            'filas': [fila._asdict() for fila in self.filas],
+            'total': self.total._asdict(),
+        }
+
+
+class ReporteComparativo(ReporteIngresos):
+    """
+    Reporte que compara el período actual contra el anterior y contra el
+    mismo período del año anterior.
+
+    Attributes:
+        rangos (dict[str, tuple[date, date]]): Rangos 'actual', 'anterior'
+            y 'anio_anterior'.
+    """
+    __slots__ = ('rangos',)
+
+    def __init__(self, periodo, rangos, columnas, filas, total):
+        super().__init__(periodo, *rangos['actual'], columnas, filas, total)
+        self.rangos = rangos
+
+    def como_dict(self):
+        datos = super().como_dict()
+        datos['rangos'] = {
+            nombre: {'inicio': inicio, 'fin': fin}
+            for nombre, (inicio, fin) in self.rangos.items()
+        }
+        return datos
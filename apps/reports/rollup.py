@@ -0,0 +1,158 @@
+"""
+Mantenimiento incremental de la tabla IncomeDailyRollup.
+
+Cada cubo del rollup es (día, dentista, procedimiento, tipo de pago) y guarda
+la suma de ingresos, el número de ingresos y los honorarios del dentista
+(la suma de la comisión congelada en cada Income, sin JOIN con Dentist).
+"""
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
+
+from apps.pages.models import Income
+from apps.reports import cache
+from apps.reports.calendario import CALENDARIO_FIN, CALENDARIO_INICIO, asegurar_calendario
+from apps.reports.models import IncomeDailyRollup
+
+CLAVE_CUBO = ('date', 'dentist_id', 'procedure_id', 'was_paid')
+TAMANO_LOTE = 1000
+
+
+def agregar_ingresos(queryset):
+    """
+    Agrupa un queryset de Income en cubos del rollup.
+    """
+    return (
+        queryset.order_by()
+        .values(*CLAVE_CUBO)
+        .annotate(
+            total_amount=Sum('amount'),
+            income_count=Count('id'),
+            total_honorarios=Coalesce(
+                Sum('commission_amount'), Value(Decimal(0)),
+                output_field=DecimalField(max_digits=16, decimal_places=4)
+            )
+        )
+    )
+
+
+def fila_de_ingreso(income):
+    """
+    Extrae de un Income los valores que necesita el rollup.
+    """
+    return {
+        'date': income.date,
+        'dentist_id': income.dentist_id,
+        'procedure_id': income.procedure_id,
+        'was_paid': income.was_paid,
+        'amount': Income._meta.get_field('amount').to_python(income.amount),
+        'commission_amount': income.commission_amount,
+    }
+
+
+def aplicar_delta(fila, signo=1):
+    """
+    Suma (signo=1) o resta (signo=-1) un ingreso a su cubo del rollup.
+    """
+    clave = {campo: fila[campo] for campo in CLAVE_CUBO}
+    monto = fila['amount'] * signo
+    honorarios = Decimal(fila['commission_amount'] or 0) * signo
+
+    with transaction.atomic():
+        cubo = IncomeDailyRollup.objects.filter(**clave)
+        delta = {
+            'total_amount': F('total_amount') + monto,
+            'income_count': F('income_count') + signo,
+            'total_honorarios': F('total_honorarios') + honorarios,
+        }
+        if cubo.update(**delta):
+            cubo.filter(income_count=0).delete()
+            return
+
+        if signo < 0:
+            # No hay cubo que descontar (p. ej. ya se borró en cascada con su
+            # dentista o procedimiento); verificar_rollup detecta desfases.
+            return
+
+        asegurar_calendario([clave['date']])
+        try:
+            with transaction.atomic():
+                IncomeDailyRollup.objects.create(
+                    **clave,
+                    total_amount=monto,
+                    income_count=1,
+                    total_honorarios=honorarios
+                )
+        except IntegrityError:
+            # Otro proceso creó el cubo entre el UPDATE y el INSERT
+            cubo.update(**delta)
+
+
+def _insertar_cubos(cubos):
+    lote = []
+    for cubo in cubos:
+        lote.append(IncomeDailyRollup(**cubo))
+        if len(lote) >= TAMANO_LOTE:
+            IncomeDailyRollup.objects.bulk_create(lote)
+            lote = []
+    if lote:
+        IncomeDailyRollup.objects.bulk_create(lote)
+
+
+@transaction.atomic
+def actualizar_dias(fechas):
+    """
+    Recalcula desde Income los cubos de los días indicados.
+    """
+    fechas = set(fechas)
+    if not fechas:
+        return
+    asegurar_calendario(fechas)
+    IncomeDailyRollup.objects.filter(date__in=fechas).delete()
+    _insertar_cubos(agregar_ingresos(Income.objects.filter(date__in=fechas)))
+
+
+@transaction.atomic
+def reconstruir_rollup():
+    """
+    Vacía el rollup y lo reconstruye completo desde Income.
+
+    Invalida todos los reportes en caché al confirmarse.
+    """
+    IncomeDailyRollup.objects.all().delete()
+    asegurar_calendario(
+        Income.objects.exclude(date__range=[CALENDARIO_INICIO, CALENDARIO_FIN])
+        .order_by().values_list('date', flat=True).distinct())
+    _insertar_cubos(agregar_ingresos(Income.objects.all()).iterator(
+        chunk_size=TAMANO_LOTE))
+    cache.invalidar_todo()
+    return IncomeDailyRollup.objects.count()
+
+
+def verificar_rollup():
+    """
+    Compara el rollup contra Income.
+
+    Returns:
+        list[tuple]: (clave, esperado, actual) por cada cubo que no coincide;
+        esperado o actual es None si el cubo falta en alguno de los dos lados.
+    """
+    medidas = ('total_amount', 'income_count', 'total_honorarios')
+
+    def indexar(cubos):
+        return {
+            tuple(cubo[campo] for campo in CLAVE_CUBO):
+                tuple(cubo[medida] for medida in medidas)
+            for cubo in cubos
+        }
+
+    esperado = indexar(agregar_ingresos(Income.objects.all()))
+    actual = indexar(IncomeDailyRollup.objects.values(*CLAVE_CUBO, *medidas))
+
+    diferencias = []
+    for clave in sorted(esperado.keys() | actual.keys(), key=str):
+        if esperado.get(clave) != actual.get(clave):
+            diferencias.append((clave, esperado.get(clave), actual.get(clave)))
+    return diferencias
@@ -0,0 +1,72 @@
+"""
+Receptores que mantienen IncomeDailyRollup sincronizado con Income.
+
+El rollup se actualiza dentro de la misma transacción que la escritura; la
+caché de reportes se invalida al confirmarse (ver cache.invalidar_fechas),
+para que ningún lector guarde datos previos bajo la generación nueva.
+Las escrituras sobre ingresos de meses cerrados se rechazan antes de
+hacerse (ver cierre.validar_meses_abiertos).
+"""
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from apps.pages.models import Dentist, Income
+from apps.pages.signals import incomes_bulk_changed, incomes_bulk_changing
+from apps.reports import cache, cierre, rollup
+
+
+@receiver(pre_save, sender=Income)
+def recordar_ingreso_anterior(sender, instance, **kwargs):
+    instance._rollup_anterior = None
+    if instance.pk is not None:
+        anterior = (
+            Income.objects.filter(pk=instance.pk)
+            .values(*rollup.CLAVE_CUBO, 'amount', 'commission_amount')
+            .first()
+        )
+        instance._rollup_anterior = anterior
+        if anterior is not None:
+            # date es auto_now: la fecha nueva siempre es la de hoy
+            cierre.validar_meses_abiertos({anterior['date']})
+
+
+@receiver(post_save, sender=Income)
+def ingreso_guardado(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, '_rollup_anterior', None)
+    if anterior is not None:
+        rollup.aplicar_delta(anterior, signo=-1)
+    rollup.aplicar_delta(rollup.fila_de_ingreso(instance))
+    cache.invalidar_fechas({instance.date, anterior and anterior['date']})
+
+
+@receiver(pre_delete, sender=Income)
+def validar_eliminacion(sender, instance, **kwargs):
+    cierre.validar_meses_abiertos({instance.date})
+
+
+@receiver(post_delete, sender=Income)
+def ingreso_eliminado(sender, instance, **kwargs):
+    rollup.aplicar_delta(rollup.fila_de_ingreso(instance), signo=-1)
+    cache.invalidar_fechas({instance.date})
+
+
+@receiver(incomes_bulk_changing, sender=Income)
+def validar_ingresos_masivos(sender, fechas, **kwargs):
+    cierre.validar_meses_abiertos(fechas)
+
+
+@receiver(incomes_bulk_changed, sender=Income)
+def ingresos_masivos(sender, fechas, **kwargs):
+    rollup.actualizar_dias(fechas)
+    cache.invalidar_fechas(fechas)
+
+
+@receiver(post_save, sender=Dentist)
+def dentista_guardado(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    # El nombre aparece en cualquier reporte; los honorarios ya registrados
+    # conservan la comisión congelada en cada Income
+    cache.invalidar_todo()
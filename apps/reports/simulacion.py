@@ -0,0 +1,152 @@
+"""
+Simulador de comisiones: ¿cuánto habría cobrado cada dentista con otros
+porcentajes?
+
+Los honorarios son lineales en el monto y el porcentaje es por dentista, así
+que basta acumular los ingresos de cada dentista (una pasada vectorizada
+sobre los montos del rollup diario, en centavos enteros) y multiplicarlos
+por el porcentaje propuesto. Los honorarios actuales son los registrados:
+la comisión congelada en cada Income, también acumulada en el rollup. Con
+cientos de miles de ingresos el rollup tiene muchas menos filas y la
+simulación no toca Income.
+"""
+from decimal import Decimal, InvalidOperation
+
+import numpy as np
+from django.db.models import F
+from django.utils.timezone import now
+
+from apps.pages.models import Dentist
+from apps.reports.calendario import CALENDARIO_INICIO
+from apps.reports.models import IncomeDailyRollup
+from apps.reports.reporter import calcular_rango_fecha
+from apps.reports.resultado import (
+    ETIQUETA_GRAN_TOTAL, FilaSimulacion, ReporteIngresos, a_centavos)
+from apps.reports.traza import fase
+from apps.reports.vectorizado import a_entero
+
+COLUMNAS_SIMULACION = [
+    ('dentista', 'Dentista'),
+    ('nivel', 'Nivel'),
+    ('porcentaje_actual', '% Actual'),
+    ('porcentaje_simulado', '% Simulado'),
+    ('total_ingresos', 'Total Ingresos'),
+    ('honorarios_actuales', 'Honorarios Actuales'),
+    ('honorarios_simulados', 'Honorarios Simulados'),
+    ('diferencia', 'Diferencia'),
+]
+
+
+def validar_porcentaje(valor):
+    """
+    Convierte un porcentaje propuesto a Decimal (fracción entre 0 y 1 con
+    dos decimales, como Dentist.percentage).
+
+    Raises:
+        ValueError: Si el valor no es un porcentaje válido.
+    """
+    try:
+        porcentaje = Decimal(str(valor))
+    except InvalidOperation:
+        raise ValueError(f"Porcentaje no válido: {valor!r}.")
+    # NaN e infinito no se pueden comparar ni cuantizar
+    if not porcentaje.is_finite():
+        raise ValueError(f"Porcentaje no válido: {valor!r}.")
+    if not Decimal(0) <= porcentaje <= Decimal(1) or porcentaje != porcentaje.quantize(Decimal('0.01')):
+        raise ValueError(
+            f"Porcentaje no válido: {valor!r}. Usa una fracción entre 0 y 1 con dos decimales.")
+    return porcentaje.quantize(Decimal('0.01'))
+
+
+def _dinero(centesimas_de_centavo):
+    return a_centavos(Decimal(centesimas_de_centavo).scaleb(-4))
+
+
+def simular_comisiones(porcentajes=None, por_nivel=None, meses=12, hoy=None):
+    """
+    Recalcula los honorarios de cada dentista con porcentajes hipotéticos.
+
+    El porcentaje de cada dentista sale, en este orden, de ``porcentajes``,
+    de ``por_nivel`` (según Dentist.level) o de su porcentaje actual.
+
+    Args:
+        porcentajes (dict): Id de dentista -> porcentaje propuesto.
+        por_nivel (dict): Nivel de dentista -> porcentaje propuesto.
+        meses (int): Meses de historia (incluyendo el actual); None para toda.
+        hoy (date): Fecha de referencia.
+
+    Returns:
+        ReporteIngresos: Una FilaSimulacion por dentista y el gran total.
+
+    Raises:
+        ValueError: Si algún porcentaje, dentista o número de meses no es válido.
+    """
+    porcentajes = {int(dentista): validar_porcentaje(valor)
+                   for dentista, valor in (porcentajes or {}).items()}
+    por_nivel = {nivel: validar_porcentaje(valor) for nivel, valor in (por_nivel or {}).items()}
+
+    hoy = hoy or now().date()
+    if meses is None:
+        inicio, fin = CALENDARIO_INICIO, calcular_rango_fecha('mensual', hoy)[1]
+    else:
+        inicio, fin = calcular_rango_fecha('mensual', hoy, meses)
+
+    with fase('consulta'):
+        dentistas = list(
+            Dentist.objects.order_by('last_name', 'first_name')
+            .values_list('pk', 'first_name', 'last_name', 'level', 'percentage'))
+        cubos = list(
+            IncomeDailyRollup.objects.filter(date__range=[inicio, fin])
+            .values_list(
+                'dentist_id', a_entero(F('total_amount')),
+                a_entero(F('total_honorarios'), decimales=4))
+            .order_by())
+
+    desconocidos = set(porcentajes) - {dentista[0] for dentista in dentistas}
+    if desconocidos:
+        raise ValueError(
+            f"Dentistas no encontrados: {', '.join(map(str, sorted(desconocidos)))}.")
+
+    with fase('calculo'):
+        ids = np.array([dentista[0] for dentista in dentistas], dtype=np.int64)
+        actual = [dentista[4] for dentista in dentistas]
+        simulado = [
+            porcentajes.get(pk, por_nivel.get(nivel, porcentaje))
+            for pk, _, _, nivel, porcentaje in dentistas
+        ]
+
+        # Centavos y honorarios registrados por dentista: una pasada sobre los montos
+        orden = np.argsort(ids)
+        ingresos = np.zeros(len(ids), dtype=np.int64)
+        honorarios = np.zeros(len(ids), dtype=np.int64)
+        if cubos:
+            dentista_cubo, centavos, comision = (
+                np.array(columna, dtype=np.int64) for columna in zip(*cubos))
+            posicion = orden[np.searchsorted(ids, dentista_cubo, sorter=orden)]
+            np.add.at(ingresos, posicion, centavos)
+            np.add.at(honorarios, posicion, comision)
+
+        # Honorarios en centésimas de centavo (centavos × centésimas de porcentaje)
+        centesimas_simuladas = np.array([int(p * 100) for p in simulado], dtype=np.int64)
+        honorarios_simulados = (ingresos * centesimas_simuladas).tolist()
+        honorarios = honorarios.tolist()
+        ingresos = ingresos.tolist()
+
+    with fase('formato'):
+        filas = [
+            FilaSimulacion(
+                pk, f"{nombre} {apellido}", nivel, porcentaje_actual, porcentaje_simulado,
+                a_centavos(Decimal(total).scaleb(-2)), _dinero(antes), _dinero(despues),
+                _dinero(despues - antes))
+            for (pk, nombre, apellido, nivel, _), porcentaje_actual, porcentaje_simulado,
+            total, antes, despues
+            in zip(dentistas, actual, simulado, ingresos, honorarios, honorarios_simulados)
+        ]
+        total = FilaSimulacion(
+            None, ETIQUETA_GRAN_TOTAL, None, None, None,
+            a_centavos(Decimal(sum(ingresos)).scaleb(-2)), _dinero(sum(honorarios)),
+            _dinero(sum(honorarios_simulados)),
+            _dinero(sum(honorarios_simulados) - sum(honorarios)))
+
+    return ReporteIngresos(
+        'simulacion', inicio, fin, columnas=COLUMNAS_SIMULACION, filas=filas, total=total)
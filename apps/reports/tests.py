@@ -1,3 +1,1298 @@
+from decimal import Decimal
+from functools import partial
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import Sum
 from django.test import TestCase
+from django.utils.timezone import now
+
+from apps.pages.models import Dentist, Income, Patient, Procedure
+from apps.reports.models import IncomeDailyRollup
+from apps.reports.rollup import verificar_rollup
+
+
+class ReportTestCase(TestCase):
+    """
+    Catálogos mínimos (dos dentistas, un paciente, un procedimiento) y caché
+    limpia; base de las pruebas de reportes y de gráficas.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dentist = Dentist.objects.create(
+            first_name="Ana", last_name="López", email="ana@example.com",
+            phone_default="5550000001", percentage=Decimal("0.30"))
+        cls.other_dentist = Dentist.objects.create(
+            first_name="Luis", last_name="Pérez", email="luis@example.com",
+            phone_default="5550000002", percentage=Decimal("0.50"))
+        cls.patient = Patient.objects.create(
+            first_name="Juan", last_name="García", email="juan@example.com",
+            phone_default="5550000003")
+        cls.procedure = Procedure.objects.create(
+            name="Limpieza", description="Limpieza dental", price=Decimal("500.00"))
+
+    def setUp(self):
+        cache.clear()
+
+    def crear_ingreso(self, amount, dentist=None, was_paid='cash', procedure=None):
+        return Income.objects.create(
+            dentist=dentist or self.dentist, patient=self.patient,
+            procedure=procedure or self.procedure, amount=Decimal(amount), was_paid=was_paid)
+
+
+class IncomeDailyRollupTest(ReportTestCase):
+
+    def assertRollupEnSync(self):
+        self.assertEqual(verificar_rollup(), [])
+
+    def test_create_update_delete(self):
+        income = self.crear_ingreso("100.00")
+        cubo = IncomeDailyRollup.objects.get()
+        self.assertEqual(cubo.total_amount, Decimal("100.00"))
+        self.assertEqual(cubo.income_count, 1)
+        self.assertEqual(cubo.total_honorarios, Decimal("30.0000"))
+
+        income.amount = Decimal("80.00")
+        income.was_paid = 'debit'
+        income.save()
+        cubo = IncomeDailyRollup.objects.get()
+        self.assertEqual((cubo.was_paid, cubo.total_amount), ('debit', Decimal("80.00")))
+
+        income.delete()
+        self.assertFalse(IncomeDailyRollup.objects.exists())
+
+    def test_bulk_writes(self):
+        Income.objects.bulk_create([
+            Income(dentist=self.dentist, patient=self.patient,
+                   procedure=self.procedure, amount=Decimal("10.00")),
+            Income(dentist=self.other_dentist, patient=self.patient,
+                   procedure=self.procedure, amount=Decimal("20.00")),
+        ])
+        self.assertRollupEnSync()
+
+        Income.objects.filter(dentist=self.dentist).update(was_paid='credit')
+        self.assertRollupEnSync()
+
+        incomes = list(Income.objects.all())
+        for income in incomes:
+            income.amount += 1
+        Income.objects.bulk_update(incomes, ['amount'])
+        self.assertRollupEnSync()
+
+        Income.objects.filter(dentist=self.other_dentist).delete()
+        self.assertRollupEnSync()
+        self.assertEqual(IncomeDailyRollup.objects.get().total_amount, Decimal("11.00"))
+
+    def test_dentist_percentage_change(self):
+        # Los honorarios ya registrados conservan la comisión congelada
+        self.crear_ingreso("100.00")
+        self.dentist.percentage = Decimal("0.40")
+        self.dentist.save()
+        self.assertRollupEnSync()
+        self.assertEqual(IncomeDailyRollup.objects.get().total_honorarios, Decimal("30.0000"))
+
+        self.crear_ingreso("100.00")
+        self.assertRollupEnSync()
+        self.assertEqual(IncomeDailyRollup.objects.get().total_honorarios, Decimal("70.0000"))
+
+    def test_rebuild_and_verify_command(self):
+        self.crear_ingreso("100.00")
+        IncomeDailyRollup.objects.update(total_amount=Decimal("1.00"))
+        self.assertEqual(len(verificar_rollup()), 1)
+
+        out = StringIO()
+        call_command('rollup_ingresos', '--reconstruir', stdout=out)
+        self.assertIn("coincide", out.getvalue())
+        self.assertRollupEnSync()
+
+    def test_reporter_reads_rollup(self):
+        from apps.reports.reporter import obtener_reporte_ingresos
+
+        self.crear_ingreso("100.00")
+        IncomeDailyRollup.objects.update(total_amount=Decimal("1.00"))
+
+        self.assertEqual(obtener_reporte_ingresos("semanal").total.total_ingresos, Decimal("1.00"))
+
+
+class ReporterTest(ReportTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.crear_ingreso("100.00")
+        self.crear_ingreso("50.00", was_paid='debit')
+        self.crear_ingreso("200.00", dentist=self.other_dentist)
+
+    def test_reporte_por_tipo_de_pago(self):
+        from apps.reports.reporter import obtener_reporte_ingresos
+
+        with self.assertNumQueries(1):
+            reporte = obtener_reporte_ingresos("semanal", usar_cache=False)
+
+        self.assertEqual(
+            list(reporte),
+            [('cash', Decimal("300.00")), ('debit', Decimal("50.00"))])
+        self.assertEqual(reporte.total, ('Gran Total', Decimal("350.00")))
+        self.assertEqual(
+            reporte.total.total_ingresos,
+            Income.objects.filter(date=now().date()).aggregate(t=Sum('amount'))['t'])
+
+    def test_reporte_por_dentista(self):
+        from apps.reports.reporter import obtener_reporte_ingresos_por_dentista
+
+        # La agregación sobre el rollup y los nombres de los dentistas
+        with self.assertNumQueries(2) as consultas:
+            reporte = obtener_reporte_ingresos_por_dentista("mensual", usar_cache=False)
+        self.assertNotIn('pages_dentist', consultas[0]['sql'])
+        self.assertNotIn('pages_person', consultas[0]['sql'])
+
+        self.assertEqual(
+            [(fila.dentista, fila.total_ingresos, fila.total_honorarios) for fila in reporte],
+            [("Ana López", Decimal("150.00"), Decimal("45.0000")),
+             ("Luis Pérez", Decimal("200.00"), Decimal("100.0000"))])
+        self.assertEqual(reporte.total.total_ingresos, Decimal("350.00"))
+        self.assertEqual(reporte.total.total_honorarios, Decimal("145.0000"))
+
+    def test_reporte_vacio(self):
+        from apps.reports.reporter import obtener_reporte_ingresos_por_dentista
+
+        Income.objects.all().delete()
+        reporte = obtener_reporte_ingresos_por_dentista("semanal")
+        self.assertEqual(len(reporte), 0)
+        self.assertEqual(reporte.total.total_ingresos, Decimal(0))
+
+
+class CalendarDimensionTest(ReportTestCase):
+
+    def test_atributos_de_dia(self):
+        from datetime import date
+
+        from apps.reports.calendario import atributos_de_dia
+
+        dia = atributos_de_dia(date(2024, 12, 30), inicio_fiscal=4)
+        self.assertEqual((dia['iso_year'], dia['iso_week']), (2025, 1))
+        self.assertEqual(dia['week_start'], date(2024, 12, 30))
+        self.assertEqual(dia['quarter_start'], date(2024, 10, 1))
+        self.assertEqual(dia['semester_start'], date(2024, 7, 1))
+        self.assertEqual((dia['fiscal_year'], dia['fiscal_quarter']), (2024, 3))
+
+    def test_calcular_rango_varios_periodos(self):
+        from datetime import date
+
+        from apps.reports.reporter import calcular_rango_fecha
+
+        self.assertEqual(
+            calcular_rango_fecha("mensual", date(2025, 3, 15), periodos=12),
+            (date(2024, 4, 1), date(2025, 3, 31)))
+        self.assertEqual(
+            calcular_rango_fecha("semanal", date(2025, 3, 13), periodos=2),
+            (date(2025, 3, 3), date(2025, 3, 16)))
+
+    def test_serie_por_periodo(self):
+        from apps.reports.calendario import serie_por_periodo
+        from apps.reports.reporter import obtener_serie_ingresos
+
+        self.crear_ingreso("100.00")
+        self.crear_ingreso("50.00", dentist=self.other_dentist)
+        hoy = now().date()
+
+        with self.assertNumQueries(1):
+            serie = list(serie_por_periodo('mensual', hoy, hoy))
+        self.assertEqual(serie, [
+            {'periodo': hoy.replace(day=1), 'total': Decimal("150.00"), 'cantidad': 2}])
+
+        serie = obtener_serie_ingresos("mensual", "semanal", periodos=12)['serie']
+        self.assertEqual(sum(fila['total'] for fila in serie), Decimal("150.00"))
+
+        with self.assertRaises(ValueError):
+            serie_por_periodo('decenal', hoy, hoy)
+
+    def test_dias_fuera_del_calendario_lo_extienden(self):
+        from datetime import date
+
+        from apps.reports.calendario import serie_por_periodo
+        from apps.reports.models import CalendarDay, IncomeDailyRollup
+        from apps.reports.rollup import actualizar_dias, aplicar_delta, fila_de_ingreso, reconstruir_rollup
+
+        antiguo, lejano = date(1999, 6, 15), date(2051, 2, 3)
+        ingreso = self.crear_ingreso("100.00")
+        Income.objects.filter(pk=ingreso.pk).update(date=antiguo)
+        actualizar_dias([antiguo])
+        self.assertTrue(CalendarDay.objects.filter(date=date(1999, 1, 1)).exists())
+        self.assertEqual(
+            list(serie_por_periodo('mensual', antiguo, antiguo)),
+            [{'periodo': date(1999, 6, 1), 'total': Decimal("100.00"), 'cantidad': 1}])
+
+        CalendarDay.objects.filter(date__year=1999).delete()
+        reconstruir_rollup()
+        self.assertEqual(len(serie_por_periodo('anual', antiguo, antiguo)), 1)
+
+        fila = fila_de_ingreso(ingreso)
+        fila['date'] = lejano
+        aplicar_delta(fila)
+        self.assertEqual(IncomeDailyRollup.objects.filter(date=lejano).count(), 1)
+        self.assertEqual(
+            [fila['periodo'] for fila in serie_por_periodo('trimestral', lejano, lejano)],
+            [date(2051, 1, 1)])
+
+
+class PdfRenderingTest(ReportTestCase):
+
+    def setUp(self):
+        from apps.reports.pdf import EncabezadoFiscal
+
+        super().setUp()
+        self.encabezado = EncabezadoFiscal(
+            "Clínica S.A. de C.V.", "GENERIC123456XYZ", "Calle Falsa 123", "+52 55 1234 5678")
+
+    def reporte(self, filas):
+        from apps.reports.resultado import FilaTipoPago, ReporteIngresos
+
+        return ReporteIngresos(
+            "mensual", None, None,
+            columnas=[('tipo_pago', 'Tipo de Pago'), ('total_ingresos', 'Total Ingresos')],
+            filas=[FilaTipoPago(f"tipo {n}", Decimal(n)) for n in range(filas)],
+            total=FilaTipoPago('Gran Total', Decimal(sum(range(filas)))))
+
+    def test_render_en_memoria_y_cache(self):
+        from apps.reports import pdf
+
+        with mock.patch.object(pdf, '_construir_pdf', wraps=pdf._construir_pdf) as construir:
+            primero = pdf.renderizar_reporte_pdf(self.reporte(3), self.encabezado)
+            segundo = pdf.renderizar_reporte_pdf(self.reporte(3), self.encabezado)
+            pdf.renderizar_reporte_pdf(self.reporte(4), self.encabezado)
+
+        self.assertTrue(primero.startswith(b'%PDF'))
+        self.assertEqual(primero, segundo)
+        self.assertEqual(construir.call_count, 2)
+
+    def test_textos_con_marcado_se_escapan(self):
+        from apps.reports.pdf import EncabezadoFiscal, renderizar_reporte_pdf
+
+        encabezado = EncabezadoFiscal(
+            "López & Hijos <S.A.>", "GENERIC123456XYZ", "Calle <b>Falsa", "+52 55 1234 5678")
+        contenido = renderizar_reporte_pdf(
+            self.reporte(3), encabezado, titulo="Factura A00000001 - Ana <i>García</b> & Co")
+        self.assertTrue(contenido.startswith(b'%PDF'))
+
+    def test_tabla_larga_en_varias_paginas(self):
+        from apps.reports.pdf import renderizar_reporte_pdf
+
+        contenido = renderizar_reporte_pdf(self.reporte(3000), self.encabezado)
+        self.assertGreater(contenido.count(b'/Type /Page\n'), 10)
+
+    def test_graficas_dibujadas_una_vez_por_datos(self):
+        from apps.reports import graficas, pdf
+        from apps.reports.reporter import obtener_reporte_ingresos
+
+        self.crear_ingreso("100.00")
+        self.crear_ingreso("50.00", was_paid='card')
+        reporte = obtener_reporte_ingresos('mensual')
+        mezcla, tendencia = graficas.graficas_ingresos(reporte)
+        self.assertEqual(mezcla.tipo, graficas.BARRAS)
+        self.assertEqual(dict(zip(mezcla.etiquetas, mezcla.valores)), {'card': 50.0, 'cash': 100.0})
+        self.assertEqual(tendencia.tipo, graficas.LINEAS)
+        self.assertEqual(tendencia.valores[-1], 150.0)
+
+        graficas.dibujo.cache_clear()
+        with mock.patch.object(graficas, '_dibujar', wraps=graficas._dibujar) as dibujar:
+            documentos = [
+                pdf.renderizar_reporte_pdf(
+                    self.reporte(filas), self.encabezado, graficas=(mezcla, tendencia))
+                for filas in (3, 4, 5)
+            ]
+            # Mismos datos con otra instancia: misma gráfica
+            otra = graficas.grafica_lineas(tendencia.titulo, tendencia.etiquetas, tendencia.valores)
+            con_otra = pdf.renderizar_reporte_pdf(
+                self.reporte(6), self.encabezado, graficas=(otra,))
+
+        self.assertEqual(dibujar.call_count, 2)
+        self.assertTrue(all(documento.startswith(b'%PDF') for documento in documentos + [con_otra]))
+        self.assertEqual(otra.huella(), tendencia.huella())
+        self.assertNotEqual(
+            pdf.llave_pdf(self.reporte(3), self.encabezado, None, "T"),
+            pdf.llave_pdf(self.reporte(3), self.encabezado, None, "T", (mezcla,)))
+
+
+class BatchPdfTest(ReportTestCase):
+
+    def test_zip_por_dentista_con_error_aislado(self):
+        import zipfile
+        from io import BytesIO
+
+        from apps.reports.lotes import (
+            DocumentoLote, documentos_por_dentista, generar_zip_pdfs)
+        from apps.reports.reporter import obtener_reporte_ingresos_por_dentista
+
+        self.crear_ingreso("100.00")
+        self.crear_ingreso("200.00", dentist=self.other_dentist)
+        documentos = list(documentos_por_dentista(
+            obtener_reporte_ingresos_por_dentista("mensual")))
+        documentos.append(DocumentoLote("roto.pdf", "Roto", None))
+
+        avances = []
+        partes = list(generar_zip_pdfs(
+            documentos, max_workers=2,
+            progreso=lambda *args: avances.append(args)))
+
+        self.assertGreater(len(partes), 1)
+        self.assertEqual([avance[0] for avance in avances], [1, 2, 3])
+        with zipfile.ZipFile(BytesIO(b''.join(partes))) as archivo:
+            nombres = sorted(archivo.namelist())
+            self.assertEqual(nombres, [
+                f"ana-lopez-{self.dentist.pk}.pdf", "errores.txt",
+                f"luis-perez-{self.other_dentist.pk}.pdf"])
+            self.assertIn(b"roto.pdf", archivo.read("errores.txt"))
+            self.assertTrue(archivo.read(nombres[0]).startswith(b'%PDF'))
+
+    def test_lote_consume_los_documentos_por_ventanas(self):
+        from apps.reports.lotes import EN_VUELO_POR_WORKER, documentos_por_periodo, generar_zip_pdfs
+        from apps.reports.resultado import FilaTipoPago, ReporteIngresos
+
+        hoy = now().date()
+        leidos = []
+
+        def reportes():
+            for n in range(6):
+                leidos.append(n)
+                yield ReporteIngresos(
+                    f"p{n}", hoy, hoy, columnas=[('tipo_pago', 'Tipo de Pago')],
+                    filas=[FilaTipoPago('cash', Decimal(n))],
+                    total=FilaTipoPago('Gran Total', Decimal(n)))
+
+        avances = []
+
+        def progreso(hechos, total, nombre, error):
+            avances.append((hechos, total, len(leidos), error))
+
+        partes = list(generar_zip_pdfs(
+            documentos_por_periodo(reportes()), max_workers=1, progreso=progreso))
+
+        self.assertGreater(len(partes), 1)
+        self.assertEqual([avance[0] for avance in avances], list(range(1, 7)))
+        # Sin longitud no hay total; nunca hay más de la ventana leída sin terminar
+        self.assertTrue(all(total is None and error is None for _, total, _, error in avances))
+        self.assertEqual(avances[0][2], EN_VUELO_POR_WORKER)
+        self.assertTrue(all(leidos - hechos < EN_VUELO_POR_WORKER
+                            for hechos, _, leidos, _ in avances))
+
+
+class ReportCacheTest(ReportTestCase):
+
+    def test_cache_invalidada_por_escritura(self):
+        from apps.reports.reporter import obtener_reporte_ingresos
+
+        with self.captureOnCommitCallbacks(execute=True):
+            income = self.crear_ingreso("100.00")
+        obtener_reporte_ingresos("mensual")
+        # Solo se leen las generaciones
+        with self.assertNumQueries(1):
+            reporte = obtener_reporte_ingresos("mensual")
+        self.assertEqual(reporte.total.total_ingresos, Decimal("100.00"))
+
+        income.amount = Decimal("150.00")
+        with self.captureOnCommitCallbacks(execute=True):
+            income.save()
+        self.assertEqual(
+            obtener_reporte_ingresos("mensual").total.total_ingresos, Decimal("150.00"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Income.objects.filter(pk=income.pk).update(amount=Decimal("10.00"))
+        self.assertEqual(
+            obtener_reporte_ingresos("mensual").total.total_ingresos, Decimal("10.00"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            income.delete()
+        self.assertEqual(
+            obtener_reporte_ingresos("mensual").total.total_ingresos, Decimal(0))
+
+    def test_periodo_cerrado_sin_expiracion(self):
+        from datetime import date
+        from apps.reports.reporter import obtener_reporte_ingresos_por_dentista
+
+        with mock.patch('apps.reports.cache.cache.set', wraps=cache.set) as guardar:
+            obtener_reporte_ingresos_por_dentista("mensual", hoy=date(2020, 1, 15))
+            obtener_reporte_ingresos_por_dentista("mensual")
+        self.assertIsNone(guardar.call_args_list[0].args[2])
+        self.assertIsNotNone(guardar.call_args_list[1].args[2])
+
+    def test_cambio_de_dentista_invalida(self):
+        from apps.reports.reporter import obtener_reporte_ingresos_por_dentista
+
+        self.crear_ingreso("100.00")
+        obtener_reporte_ingresos_por_dentista("mensual")
+        self.dentist.first_name = "Anabel"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dentist.save()
+        reporte = obtener_reporte_ingresos_por_dentista("mensual")
+        self.assertEqual(reporte.filas[0].dentista, "Anabel López")
+
+    def test_invalidacion_al_confirmar_y_compartida(self):
+        from apps.reports.models import ReportGeneration
+        from apps.reports.reporter import obtener_reporte_ingresos
+        from apps.reports.rollup import reconstruir_rollup
+
+        obtener_reporte_ingresos("mensual")
+        with self.captureOnCommitCallbacks() as pendientes:
+            self.crear_ingreso("100.00")
+            # Antes de confirmar, la generación no cambia
+            self.assertFalse(ReportGeneration.objects.exists())
+            self.assertEqual(obtener_reporte_ingresos("mensual").total.total_ingresos, Decimal(0))
+        for tarea in pendientes:
+            tarea()
+        mes = now().date().replace(day=1)
+        self.assertTrue(ReportGeneration.objects.filter(key=f"{mes:%Y-%m}").exists())
+
+        # Otro proceso (p. ej. un comando) no comparte la caché local, pero
+        # sí las generaciones
+        cache.clear()
+        self.assertEqual(
+            obtener_reporte_ingresos("mensual").total.total_ingresos, Decimal("100.00"))
+
+        IncomeDailyRollup.objects.update(total_amount=Decimal("1.00"))
+        with self.captureOnCommitCallbacks(execute=True):
+            reconstruir_rollup()
+        self.assertTrue(ReportGeneration.objects.filter(key='global').exists())
+        self.assertEqual(
+            obtener_reporte_ingresos("mensual").total.total_ingresos, Decimal("100.00"))
+
+    def test_sin_cache(self):
+        from apps.reports.reporter import obtener_reporte_ingresos
+
+        obtener_reporte_ingresos("semanal")
+        with self.assertNumQueries(1):
+            obtener_reporte_ingresos("semanal", usar_cache=False)
+
+
+class ComparativeReportTest(ReportTestCase):
+
+    def crear_ingreso_en(self, fecha, amount, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            income = self.crear_ingreso(amount, **kwargs)
+            # date es auto_now: se mueve con update() para simular historia
+            Income.objects.filter(pk=income.pk).update(date=fecha)
+
+    def test_comparativo_por_tipo_de_pago(self):
+        from datetime import date
+
+        from apps.reports.reporter import obtener_comparativo_ingresos
+
+        self.crear_ingreso_en(date(2025, 3, 10), "300.00")
+        self.crear_ingreso_en(date(2025, 3, 11), "100.00", was_paid='debit')
+        self.crear_ingreso_en(date(2025, 2, 5), "200.00")
+        self.crear_ingreso_en(date(2024, 3, 20), "150.00", was_paid='debit')
+        self.crear_ingreso_en(date(2025, 1, 20), "999.00")
+
+        # Los cierres de los meses de todos los rangos y el reporte
+        with self.assertNumQueries(2):
+            reporte = obtener_comparativo_ingresos(
+                "mensual", hoy=date(2025, 3, 15), usar_cache=False)
+
+        self.assertEqual(reporte.rangos['anterior'], (date(2025, 2, 1), date(2025, 2, 28)))
+        self.assertEqual(reporte.rangos['anio_anterior'], (date(2024, 3, 1), date(2024, 3, 31)))
+        efectivo, debito = reporte.filas
+        self.assertEqual(
+            (efectivo.actual, efectivo.anterior, efectivo.anio_anterior),
+            (Decimal("300.00"), Decimal("200.00"), Decimal(0)))
+        self.assertEqual(efectivo.variacion_anterior, Decimal("100.00"))
+        self.assertEqual(efectivo.porcentaje_anterior, Decimal(50))
+        self.assertIsNone(efectivo.porcentaje_anual)
+        # Acumulado del año por tipo de pago: del 1 de enero al fin de marzo
+        self.assertEqual(reporte.rangos['acumulado'], (date(2025, 1, 1), date(2025, 3, 31)))
+        self.assertEqual(efectivo.acumulado, Decimal("1499.00"))
+        self.assertEqual(debito.acumulado, Decimal("100.00"))
+        self.assertEqual(
+            (reporte.total.actual, reporte.total.anterior, reporte.total.anio_anterior,
+             reporte.total.acumulado),
+            (Decimal("400.00"), Decimal("200.00"), Decimal("150.00"), Decimal("1599.00")))
+
+    def test_comparativo_por_dentista_invalidado_por_periodo_anterior(self):
+        from datetime import timedelta
+
+        from apps.reports.reporter import obtener_comparativo_por_dentista
+
+        self.crear_ingreso("100.00")
+        self.crear_ingreso("40.00", dentist=self.other_dentist)
+        reporte = obtener_comparativo_por_dentista("semanal")
+        self.assertEqual([fila.actual for fila in reporte], [Decimal("100.00"), Decimal("40.00")])
+
+        self.crear_ingreso_en(reporte.rangos['anterior'][0] + timedelta(days=1), "25.00")
+        reporte = obtener_comparativo_por_dentista("semanal")
+        self.assertEqual(reporte.filas[0].anterior, Decimal("25.00"))
+        self.assertEqual(reporte.total.variacion_anterior, Decimal("115.00"))
+
+
+class BenchmarkTest(TestCase):
+
+    def test_benchmark_pequeno(self):
+        from apps.reports import benchmark
+
+        catalogos_chicos = partial(
+            benchmark._sembrar_catalogos, dentistas=2, pacientes=3, procedimientos=2)
+        with mock.patch.object(benchmark, 'PERIODOS', ['mensual']), \
+                mock.patch.object(benchmark, '_sembrar_catalogos', catalogos_chicos):
+            salida = benchmark.ejecutar_benchmark([50], repeticiones=1)
+
+        self.assertEqual(Income.objects.count(), 50)
+        self.assertEqual(verificar_rollup(), [])
+        self.assertEqual(
+            [r['funcion'] for r in salida['resultados']],
+            ['obtener_reporte_ingresos', 'obtener_reporte_ingresos_por_dentista',
+             'exportar_a_csv', 'generar_factura_pdf'])
+        self.assertTrue(all(r['consultas'] >= 1 for r in salida['resultados']))
+
+        comparacion = benchmark.comparar(salida, salida)
+        self.assertTrue(all(caso['razon_tiempo'] == 1 for caso in comparacion))
+
+    def test_medir_sin_tracemalloc_ni_cache_real(self):
+        import tracemalloc
+
+        from apps.reports import benchmark
+
+        cache.set('otra-aplicacion', 1)
+        trazando = []
+        resultado = benchmark.medir(lambda: trazando.append(tracemalloc.is_tracing()), 2)
+        # Las repeticiones cronometradas no llevan tracemalloc; la memoria se
+        # mide en una repetición aparte
+        self.assertEqual(trazando, [False, False, True])
+        self.assertGreaterEqual(resultado['memoria_pico_kb'], 0)
+        self.assertEqual(cache.get('otra-aplicacion'), 1)
+
+
+class TraceModeTest(ReportTestCase):
+
+    def test_traza_desde_codigo(self):
+        from apps.reports.reporter import obtener_reporte_ingresos_por_dentista
+        from apps.reports.traza import ejecutar_con_traza
+
+        self.crear_ingreso("100.00")
+        self.crear_ingreso("50.00", dentist=self.other_dentist)
+        obtener_reporte_ingresos_por_dentista("mensual")
+
+        # La traza omite la caché para medir la consulta real
+        reporte, traza = ejecutar_con_traza(obtener_reporte_ingresos_por_dentista, "mensual")
+        self.assertEqual(len(reporte), 2)
+        datos = traza.como_dict()
+        # El reporte y la lectura de los nombres de los dentistas
+        self.assertEqual(datos['total_consultas'], 2)
+        consulta = datos['consultas'][0]
+        self.assertIn('incomedailyrollup', consulta['sql'])
+        self.assertEqual(consulta['filas_devueltas'], 2)
+        self.assertTrue(consulta['plan'])
+        self.assertEqual(set(datos['fases']), {'consulta', 'formato'})
+        # SQLite no estima filas examinadas, pero su plan dice qué se recorre
+        self.assertIsNone(consulta['filas_examinadas'])
+        self.assertIsInstance(consulta['recorridos_completos'], list)
+
+    def test_traza_no_reejecuta_consultas(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        from apps.reports.reporter import obtener_reporte_ingresos_por_dentista
+        from apps.reports.traza import _leer_plan, trazar
+
+        self.crear_ingreso("100.00")
+        with CaptureQueriesContext(connection) as capturadas:
+            with trazar() as traza:
+                obtener_reporte_ingresos_por_dentista("mensual")
+        # Cada consulta (reporte y nombres) y su EXPLAIN, sin COUNT(*) adicional
+        self.assertEqual(len(capturadas), 4)
+        self.assertEqual(
+            [consulta['sql'].startswith(connection.ops.explain_query_prefix())
+             for consulta in capturadas],
+            [False, False, True, True])
+        self.assertEqual(traza.consultas[0]['filas_devueltas'], 1)
+
+        # Estimaciones de PostgreSQL y MySQL
+        self.assertEqual(
+            _leer_plan(['QUERY PLAN'], [], [
+                "HashAggregate  (cost=1.0..2.0 rows=10 width=8)",
+                "  ->  Seq Scan on reports_incomedailyrollup  (cost=0.00..35.50 rows=2550 width=4)",
+            ]),
+            (2550, ['reports_incomedailyrollup']))
+        self.assertEqual(
+            _leer_plan(['id', 'table', 'type', 'rows'],
+                       [(1, 'pages_income', 'ALL', 900), (1, 'pages_dentist', 'eq_ref', 1)], []),
+            (901, ['pages_income']))
+
+    def test_traza_render(self):
+        from apps.reports.reporter import generar_factura_pdf, obtener_reporte_ingresos
+        from apps.reports.traza import trazar
+
+        with trazar() as traza:
+            generar_factura_pdf(None, "Clínica", "RFC", "Dirección", "Tel",
+                                obtener_reporte_ingresos("semanal"))
+        self.assertIn('render', traza.fases)
+
+    def test_traza_http_solo_staff(self):
+        from django.contrib.auth.models import User
+
+        usuario = User.objects.create_user("recepcion", password="x")
+        self.client.force_login(usuario)
+        self.assertNotIn('_traza', self.client.get('/charts/income-data/?trace=1').json())
+
+        usuario.is_staff = True
+        usuario.save()
+        datos = self.client.get('/charts/income-data/?trace=1').json()
+        self.assertGreaterEqual(datos['_traza']['total_consultas'], 5)
+
+
+class ReportEndpointTest(ReportTestCase):
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+
+        super().setUp()
+        self.crear_ingreso("100.00")
+        self.crear_ingreso("50.00", dentist=self.other_dentist, was_paid='debit')
+        self.client.force_login(User.objects.create_user("contador", password="x"))
+
+    def test_json_por_defecto(self):
+        respuesta = self.client.get('/reports/tipo-pago/?periodo=mensual')
+        self.assertEqual(respuesta.status_code, 200)
+        datos = respuesta.json()
+        self.assertEqual(datos['total']['total_ingresos'], "150.00")
+        self.assertEqual([fila['tipo_pago'] for fila in datos['filas']], ['cash', 'debit'])
+
+    def test_csv_en_streaming_por_accept(self):
+        respuesta = self.client.get('/reports/dentista/', HTTP_ACCEPT='text/csv')
+        self.assertTrue(respuesta.streaming)
+        contenido = b''.join(respuesta.streaming_content).decode()
+        self.assertEqual(contenido.splitlines(), [
+            "Dentista,Total Ingresos,Total Honorarios",
+            "Ana López,100.00,30.00",
+            "Luis Pérez,50.00,25.00",
+            "Gran Total,150.00,55.00",
+        ])
+
+    def test_pdf_y_formato_no_aceptable(self):
+        respuesta = self.client.get('/reports/dentista/?formato=pdf')
+        self.assertEqual(respuesta['Content-Type'], 'application/pdf')
+        self.assertTrue(respuesta.content.startswith(b'%PDF'))
+        # El reporte por tipo de pago incluye sus gráficas
+        self.assertTrue(
+            self.client.get('/reports/tipo-pago/?formato=pdf').content.startswith(b'%PDF'))
+        self.assertEqual(
+            self.client.get('/reports/dentista/', HTTP_ACCEPT='image/png').status_code, 406)
+
+    def test_etag_y_304(self):
+        respuesta = self.client.get('/reports/tipo-pago/')
+        etag = respuesta['ETag']
+        self.assertIn('no-cache', respuesta['Cache-Control'])
+        self.assertEqual(
+            self.client.get('/reports/tipo-pago/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.crear_ingreso("1.00")
+        self.assertEqual(
+            self.client.get('/reports/tipo-pago/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_del_pdf_incluye_graficas(self):
+        from datetime import date
+
+        url = '/reports/tipo-pago/?inicio=2020-01-01&fin=2020-01-31&formato=pdf'
+        etag = self.client.get(url)['ETag']
+        self.assertNotEqual(etag, self.client.get(url.replace('pdf', 'json'))['ETag'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Fuera del rango del reporte, pero dentro de su tendencia mensual
+        with self.captureOnCommitCallbacks(execute=True):
+            income = self.crear_ingreso("80.00")
+            Income.objects.filter(pk=income.pk).update(date=date(2019, 6, 10))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_rango_explicito_y_periodo_cerrado(self):
+        respuesta = self.client.get('/reports/tipo-pago/?inicio=2020-01-01&fin=2020-01-31')
+        self.assertEqual(respuesta.json()['total']['total_ingresos'], "0.00")
+        self.assertIn('max-age=86400', respuesta['Cache-Control'])
+
+        self.assertEqual(self.client.get(
+            '/reports/comparativo-dentista/?inicio=2020-01-01&fin=2020-01-31').status_code, 400)
+        self.assertEqual(self.client.get(
+            '/reports/tipo-pago/?inicio=0001-01-01&fin=9999-12-31').status_code, 400)
+        self.assertEqual(self.client.get('/reports/tipo-pago/?periodo=decenal').status_code, 400)
+        self.assertEqual(self.client.get('/reports/inexistente/').status_code, 404)
+
+    def test_requiere_sesion(self):
+        self.client.logout()
+        self.assertEqual(self.client.get('/reports/tipo-pago/').status_code, 302)
+
+
+class DeclarativeReportTest(ReportTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.otro_procedimiento = Procedure.objects.create(
+            name="Resina", description="Resina", price=Decimal("800.00"))
+        self.crear_ingreso("100.00")
+        self.crear_ingreso("50.00", was_paid='debit')
+        Income.objects.create(
+            dentist=self.other_dentist, patient=self.patient,
+            procedure=self.otro_procedimiento, amount=Decimal("200.00"), was_paid='cash')
+
+    def test_especificacion_invalida(self):
+        from apps.reports.especificacion import EspecificacionReporte, compilar
+
+        with self.assertRaises(ValueError):
+            compilar(EspecificacionReporte(('sucursal',), ('total',)))
+        with self.assertRaises(ValueError):
+            compilar(EspecificacionReporte(('dentista',), ()))
+        with self.assertRaises(ValueError):
+            compilar(EspecificacionReporte(('periodo',), ('total',)))
+
+    def test_plan_en_cache_y_joins_necesarios(self):
+        from apps.reports.especificacion import (
+            EspecificacionReporte, compilar, consulta_especificacion)
+
+        spec = EspecificacionReporte(('procedimiento', 'tipo_pago'), ('cantidad', 'promedio'))
+        self.assertIs(compilar(spec), compilar(EspecificacionReporte(
+            ('procedimiento', 'tipo_pago'), ('cantidad', 'promedio'))))
+
+        hoy = now().date()
+        sql = str(consulta_especificacion(spec, hoy, hoy).query)
+        self.assertIn('reports_incomedailyrollup', sql)
+        self.assertIn('pages_procedure', sql)
+        self.assertNotIn('pages_dentist', sql)
+        # El gran total sale de la misma consulta
+        self.assertIn('OVER ()', sql)
+
+    def test_dimensiones_medidas_y_filtros(self):
+        from apps.reports.especificacion import EspecificacionReporte
+        from apps.reports.reporter import obtener_reporte_especificacion
+
+        spec = EspecificacionReporte(
+            ('procedimiento', 'periodo'), ('total', 'cantidad', 'promedio'),
+            filtros=('tipo_pago',), nivel='mensual')
+        # Las generaciones de la caché y el reporte
+        with self.assertNumQueries(2):
+            reporte = obtener_reporte_especificacion(
+                spec, "mensual", filtros={'tipo_pago': ['cash']})
+
+        mes = now().date().replace(day=1)
+        self.assertEqual(
+            [tuple(fila) for fila in reporte],
+            [(self.procedure.id, "Limpieza", mes, Decimal("100.00"), 1, Decimal("100.00")),
+             (self.otro_procedimiento.id, "Resina", mes, Decimal("200.00"), 1, Decimal("200.00"))])
+        self.assertEqual(reporte.total.procedimiento, 'Gran Total')
+        self.assertEqual(reporte.total.cantidad, 2)
+        self.assertEqual(reporte.total.promedio, Decimal("150.00"))
+
+        with self.assertNumQueries(1):
+            obtener_reporte_especificacion(spec, "mensual", filtros={'tipo_pago': ('cash',)})
+        with self.assertRaises(ValueError):
+            obtener_reporte_especificacion(spec, "mensual", filtros={'dentista': [1]})
+
+    def test_nivel_de_paciente_lee_income(self):
+        from apps.reports.especificacion import INCOME, EspecificacionReporte, compilar
+        from apps.reports.reporter import obtener_reporte_especificacion
+
+        Patient.objects.filter(pk=self.patient.pk).update(level='premium')
+        spec = EspecificacionReporte(('nivel_paciente',), ('total', 'honorarios'))
+        self.assertEqual(compilar(spec).fuente, INCOME)
+
+        reporte = obtener_reporte_especificacion(spec, "mensual")
+        self.assertEqual(list(reporte), [('premium', Decimal("350.00"), Decimal("145.00"))])
+
+    def test_filas_dinamicas_se_serializan(self):
+        import pickle
+
+        from apps.reports.especificacion import EspecificacionReporte
+        from apps.reports.reporter import obtener_reporte_especificacion
+
+        spec = EspecificacionReporte(('procedimiento',), ('cantidad',))
+        reporte = obtener_reporte_especificacion(spec, "mensual", usar_cache=False)
+        copia = pickle.loads(pickle.dumps(reporte))
+        self.assertEqual(copia.filas, reporte.filas)
+        self.assertEqual(copia.total.cantidad, 3)
+
+
+class VectorizedBackendTest(ReportTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        from apps.reports import benchmark
+
+        # Catálogos sembrados en lugar de los de ReportTestCase (el sembrado
+        # reutiliza los existentes y aquí se necesitan varios de cada uno)
+        catalogos_chicos = partial(
+            benchmark._sembrar_catalogos, dentistas=4, pacientes=6, procedimientos=5)
+        with mock.patch.object(benchmark, '_sembrar_catalogos', catalogos_chicos):
+            benchmark.sembrar_ingresos(400, semilla=7)
+        # Montos con centavos (sin medios centavos en los honorarios: SQLite
+        # suma decimales en punto flotante y podría redondear distinto)
+        Income.objects.filter(pk__in=Income.objects.values('pk')[:150]).update(
+            amount=Decimal("123.40"))
+        Patient.objects.filter(pk__in=Patient.objects.values('pk')[:3]).update(level='premium')
+
+    def test_paridad_con_sql(self):
+        from apps.reports.especificacion import EspecificacionReporte, ejecutar_especificacion
+        from apps.reports.reporter import ESPEC_DENTISTA, ESPEC_TIPO_PAGO
+
+        hoy = now().date()
+        inicio = hoy.replace(year=hoy.year - 3)
+        especificaciones = [
+            ESPEC_TIPO_PAGO,
+            ESPEC_DENTISTA,
+            EspecificacionReporte((), ('total', 'cantidad', 'promedio', 'honorarios')),
+            EspecificacionReporte(
+                ('periodo', 'dentista'), ('total', 'honorarios', 'cantidad'), nivel='trimestral'),
+            EspecificacionReporte(
+                ('procedimiento', 'periodo'), ('promedio',), filtros=('tipo_pago',), nivel='fiscal'),
+            EspecificacionReporte(
+                ('nivel_paciente', 'tipo_pago'), ('total', 'honorarios'),
+                filtros=('nivel_paciente',)),
+        ]
+        for spec in especificaciones:
+            filtros = {clave: [] for clave in spec.filtros}
+            if 'tipo_pago' in spec.filtros:
+                filtros['tipo_pago'] = ['cash', 'debit']
+            if 'nivel_paciente' in spec.filtros:
+                filtros['nivel_paciente'] = 'premium'
+            with self.subTest(spec=spec):
+                sql = ejecutar_especificacion(spec, inicio, hoy, filtros, motor='sql')
+                vectorizado = ejecutar_especificacion(spec, inicio, hoy, filtros, motor='numpy')
+                self.assertTrue(sql.filas or not spec.dimensiones)
+                self.assertEqual(vectorizado.filas, sql.filas)
+                self.assertEqual(vectorizado.total, sql.total)
+                self.assertEqual(vectorizado.huella(), sql.huella())
+
+    def test_seleccion_por_llamada(self):
+        from apps.reports.reporter import obtener_reporte_ingresos_por_dentista
+
+        with self.assertNumQueries(2):
+            reporte = obtener_reporte_ingresos_por_dentista("anual", motor='numpy', usar_cache=False)
+        self.assertEqual(reporte.filas, obtener_reporte_ingresos_por_dentista("anual").filas)
+        with self.assertRaises(ValueError):
+            obtener_reporte_ingresos_por_dentista("anual", motor='gpu')
+
+    def test_rango_vacio(self):
+        from apps.reports.especificacion import ejecutar_especificacion
+        from apps.reports.reporter import ESPEC_DENTISTA
+
+        vacio = now().date().replace(year=1999)
+        reporte = ejecutar_especificacion(ESPEC_DENTISTA, vacio, vacio, motor='numpy')
+        self.assertEqual(list(reporte), [])
+        self.assertEqual(reporte.total.total_ingresos, Decimal("0.00"))
+
+
+class CommissionSimulationTest(ReportTestCase):
+
+    def setUp(self):
+        super().setUp()
+        Dentist.objects.filter(pk=self.other_dentist.pk).update(level='senior')
+        self.crear_ingreso("100.00")
+        self.crear_ingreso("200.00", dentist=self.other_dentist)
+        antiguo = self.crear_ingreso("1000.00")
+        Income.objects.filter(pk=antiguo.pk).update(
+            date=now().date().replace(year=now().year - 3))
+
+    def test_porcentaje_por_dentista_y_por_nivel(self):
+        from apps.reports.simulacion import simular_comisiones
+
+        with self.assertNumQueries(2):
+            reporte = simular_comisiones(
+                porcentajes={self.dentist.pk: "0.40"}, por_nivel={'senior': "0.45"})
+
+        self.assertEqual(
+            [(fila.dentista, fila.porcentaje_simulado, fila.honorarios_actuales,
+              fila.honorarios_simulados, fila.diferencia) for fila in reporte],
+            [("Ana López", Decimal("0.40"), Decimal("30.00"), Decimal("40.00"), Decimal("10.00")),
+             ("Luis Pérez", Decimal("0.45"), Decimal("100.00"), Decimal("90.00"), Decimal("-10.00"))])
+        self.assertEqual(reporte.total.diferencia, Decimal("0.00"))
+
+        historia = simular_comisiones(por_nivel={'common': "0.10"}, meses=None)
+        self.assertEqual(historia.filas[0].total_ingresos, Decimal("1100.00"))
+        self.assertEqual(historia.filas[0].honorarios_simulados, Decimal("110.00"))
+        self.assertEqual(historia.filas[1].diferencia, Decimal("0.00"))
+
+    def test_validacion(self):
+        from apps.reports.simulacion import simular_comisiones
+
+        for argumentos in ({'porcentajes': {self.dentist.pk: "1.5"}},
+                           {'porcentajes': {self.dentist.pk: "0.333"}},
+                           {'porcentajes': {999999: "0.30"}},
+                           {'por_nivel': {'senior': "abc"}},
+                           {'porcentajes': {self.dentist.pk: "nan"}},
+                           {'por_nivel': {'senior': "inf"}},
+                           {'meses': 0}):
+            with self.subTest(argumentos=argumentos), self.assertRaises(ValueError):
+                simular_comisiones(**argumentos)
+
+    def test_endpoint(self):
+        from django.contrib.auth.models import User
+
+        self.client.force_login(User.objects.create_user("contador", password="x"))
+        respuesta = self.client.get(
+            '/reports/simulacion/comisiones/',
+            {'dentista': f"{self.dentist.pk}:0.40", 'meses': '6'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['total']['diferencia'], "10.00")
+
+        respuesta = self.client.get('/reports/simulacion/comisiones/', {'nivel': 'senior'})
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertFalse(respuesta.json()['success'])
+
+        for valor in ('nan', 'sNaN', '-inf'):
+            respuesta = self.client.get(
+                '/reports/simulacion/comisiones/', {'dentista': f"{self.dentist.pk}:{valor}"})
+            self.assertEqual(respuesta.status_code, 400)
+
+
+class CommissionSnapshotTest(ReportTestCase):
+
+    def test_save_congela_comision(self):
+        income = self.crear_ingreso("100.00")
+        self.assertEqual((income.commission_rate, income.commission_amount),
+                         (Decimal("0.30"), Decimal("30.0000")))
+
+        Dentist.objects.filter(pk=self.dentist.pk).update(percentage=Decimal("0.90"))
+        income = Income.objects.get(pk=income.pk)
+        income.amount = Decimal("200.00")
+        income.save()
+        self.assertEqual(income.commission_amount, Decimal("60.0000"))
+
+        income.dentist = self.other_dentist
+        income.save(update_fields=['dentist'])
+        income.refresh_from_db()
+        self.assertEqual((income.commission_rate, income.commission_amount),
+                         (Decimal("0.50"), Decimal("100.0000")))
+
+    def test_rutas_masivas(self):
+        Income.objects.bulk_create([
+            Income(dentist=self.dentist, patient=self.patient,
+                   procedure=self.procedure, amount=Decimal("10.00")),
+            Income(dentist=self.other_dentist, patient=self.patient,
+                   procedure=self.procedure, amount=Decimal("20.00")),
+        ])
+        self.assertEqual(
+            sorted(Income.objects.values_list('commission_amount', flat=True)),
+            [Decimal("3.0000"), Decimal("10.0000")])
+
+        Income.objects.filter(dentist=self.dentist).update(amount=Decimal("40.00"))
+        Income.objects.filter(dentist=self.other_dentist).update(dentist=self.dentist)
+        self.assertEqual(
+            sorted(Income.objects.values_list('commission_rate', 'commission_amount')),
+            [(Decimal("0.30"), Decimal("6.0000")), (Decimal("0.30"), Decimal("12.0000"))])
+
+        incomes = list(Income.objects.all())
+        for income in incomes:
+            income.dentist = self.other_dentist
+        Income.objects.bulk_update(incomes, ['dentist'])
+        self.assertEqual(
+            sorted(Income.objects.values_list('commission_amount', flat=True)),
+            [Decimal("10.0000"), Decimal("20.0000")])
+        self.assertEqual(verificar_rollup(), [])
+
+    def test_comando_de_relleno(self):
+        for monto in ("100.00", "50.00", "20.00"):
+            self.crear_ingreso(monto)
+        Income.objects.update(commission_rate=None, commission_amount=None)
+        self.assertEqual(IncomeDailyRollup.objects.get().total_honorarios, Decimal(0))
+
+        out = StringIO()
+        call_command('congelar_comisiones', '--lote', '2', stdout=out)
+        self.assertIn("3 ingresos", out.getvalue())
+        self.assertFalse(Income.objects.filter(commission_rate__isnull=True).exists())
+        self.assertEqual(IncomeDailyRollup.objects.get().total_honorarios, Decimal("51.0000"))
+        self.assertEqual(verificar_rollup(), [])
+
+    def test_reconstruir_exige_comisiones_congeladas(self):
+        from django.core.management.base import CommandError
+
+        self.crear_ingreso("100.00")
+        Income.objects.update(commission_rate=None, commission_amount=None)
+        with self.assertRaisesMessage(CommandError, "congelar_comisiones"):
+            call_command('rollup_ingresos', '--reconstruir', stdout=StringIO())
+
+        call_command('congelar_comisiones', stdout=StringIO())
+        call_command('rollup_ingresos', '--reconstruir', stdout=StringIO())
+        self.assertEqual(IncomeDailyRollup.objects.get().total_honorarios, Decimal("30.0000"))
+
+    def test_honorarios_sin_porcentaje_del_dentista(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        from apps.reports.especificacion import EspecificacionReporte, ejecutar_especificacion
+        from apps.reports.reporter import obtener_reporte_ingresos_por_dentista
+
+        self.crear_ingreso("100.00")
+        hoy = now().date()
+        spec = EspecificacionReporte(('nivel_paciente',), ('honorarios',))
+        with CaptureQueriesContext(connection) as consultas:
+            obtener_reporte_ingresos_por_dentista("mensual")
+            ejecutar_especificacion(spec, hoy, hoy)
+            ejecutar_especificacion(spec, hoy, hoy, motor='numpy')
+        for consulta in consultas.captured_queries:
+            self.assertNotIn('percentage', consulta['sql'])
+
+
+class PayrollRunTest(ReportTestCase):
+
+    def setUp(self):
+        from datetime import timedelta
+
+        super().setUp()
+        # Último día del mes anterior: solo se congelan períodos terminados
+        self.hoy = now().date().replace(day=1) - timedelta(days=1)
+        self.crear_ingreso("100.00")
+        self.crear_ingreso("50.00", was_paid='debit')
+        self.crear_ingreso("200.00", dentist=self.other_dentist)
+        Income.objects.update(date=self.hoy)
+
+    def test_corrida_congelada_e_idempotente(self):
+        from apps.reports.models import PayrollItem, PayrollRun
+        from apps.reports.nomina import ejecutar_nomina, reporte_nomina
+        from apps.reports.reporter import obtener_reporte_ingresos_por_dentista
+
+        # Consultas fijas por lote de renglones (inserciones masivas); aquí cabe en uno
+        with self.assertNumQueries(11):
+            corrida, creada = ejecutar_nomina(self.hoy, self.hoy)
+        self.assertTrue(creada)
+        self.assertEqual(PayrollItem.objects.filter(run=corrida).count(), 3)
+        self.assertTrue(all(hasattr(income, 'payroll_item') for income in Income.objects.all()))
+
+        esperado = obtener_reporte_ingresos_por_dentista(inicio=self.hoy, fin=self.hoy)
+        with self.assertNumQueries(1):
+            reporte = reporte_nomina(corrida)
+        self.assertEqual(reporte.filas, esperado.filas)
+        self.assertEqual(reporte.total, esperado.total)
+
+        # Cambios posteriores no alteran la corrida y repetirla no duplica nada
+        Dentist.objects.filter(pk=self.dentist.pk).update(percentage=Decimal("0.90"))
+        self.assertEqual(ejecutar_nomina(self.hoy, self.hoy), (corrida, False))
+        self.assertEqual(PayrollRun.objects.count(), 1)
+        self.assertEqual(reporte_nomina(corrida).total.total_honorarios, Decimal("145.00"))
+
+    def test_renglones_por_lotes(self):
+        from apps.reports import nomina
+        from apps.reports.models import PayrollLine
+
+        with mock.patch.object(nomina, 'TAMANO_LOTE', 2):
+            corrida, _ = nomina.ejecutar_nomina(self.hoy, self.hoy)
+        self.assertEqual(
+            sorted(corrida.items.values_list('income_id', flat=True)),
+            sorted(Income.objects.values_list('pk', flat=True)))
+        linea = PayrollLine.objects.get(run=corrida, dentist=self.dentist)
+        self.assertEqual((linea.income_count, linea.total_amount), (2, Decimal("150.00")))
+        self.assertEqual(linea.items.count(), 2)
+
+    def test_periodo_traslapado_no_paga_dos_veces(self):
+        from apps.reports.nomina import ejecutar_nomina
+
+        ejecutar_nomina(self.hoy, self.hoy)
+        Income.objects.filter(pk=self.crear_ingreso("10.00").pk).update(date=self.hoy)
+        corrida, creada = ejecutar_nomina(self.hoy.replace(day=1), self.hoy)
+        self.assertTrue(creada)
+        self.assertEqual((corrida.income_count, corrida.total_amount), (1, Decimal("10.00")))
+
+        with self.assertRaises(ValueError):
+            ejecutar_nomina(self.hoy, self.hoy.replace(year=self.hoy.year - 1))
+
+    def test_periodo_en_curso_rechazado(self):
+        from apps.reports.models import PayrollRun
+        from apps.reports.nomina import ejecutar_nomina
+
+        hoy = now().date()
+        with self.assertRaisesMessage(ValueError, "terminados"):
+            ejecutar_nomina(hoy.replace(day=1), hoy)
+        self.assertFalse(PayrollRun.objects.exists())
+
+    def test_comando(self):
+        from django.core.management.base import CommandError
+
+        out = StringIO()
+        call_command('nomina_dentistas', '--inicio', str(self.hoy), '--fin', str(self.hoy), stdout=out)
+        self.assertIn("Ana López", out.getvalue())
+        self.assertIn("creada", out.getvalue())
+
+        with self.assertRaises(CommandError):
+            call_command('nomina_dentistas', '--hoy', str(now().date()), stdout=StringIO())
+
+    def test_comando_congela_el_mes_anterior(self):
+        out = StringIO()
+        call_command('nomina_dentistas', stdout=out)
+        self.assertIn(f"({self.hoy.replace(day=1)} a {self.hoy}) creada: 3 ingresos", out.getvalue())
+
+
+class InvoiceBatchTest(ReportTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.facturables = [self.crear_ingreso(monto) for monto in ("100.00", "50.00", "25.00")]
+        Income.objects.filter(pk__in=[i.pk for i in self.facturables]).update(is_facturable=True)
+        self.crear_ingreso("999.00")
+
+    def leer_zip(self, partes):
+        import zipfile
+        from io import BytesIO
+
+        return zipfile.ZipFile(BytesIO(b''.join(partes)))
+
+    def test_zip_con_xml_y_pdf(self):
+        import xml.etree.ElementTree as ET
+
+        from apps.reports.facturacion import generar_zip_facturas
+        from apps.reports.models import Invoice
+
+        with self.leer_zip(generar_zip_facturas(max_workers=1, tamano_lote=2)) as archivo:
+            nombres = sorted(archivo.namelist())
+            self.assertEqual(len(nombres), 6)
+            self.assertTrue(archivo.read(nombres[0]).startswith(b'%PDF'))
+            comprobante = ET.fromstring(archivo.read(nombres[1]))
+
+        # El XML lleva el mismo folio que sus archivos
+        self.assertEqual(comprobante.get('Folio'), nombres[1].removesuffix('.xml'))
+        self.assertEqual(comprobante.get('Total'), "100.00")
+        self.assertEqual(comprobante.find('Receptor').get('Nombre'), "Juan García")
+        self.assertEqual(
+            set(Invoice.objects.values_list('income_id', 'status')),
+            {(income.pk, Invoice.ISSUED) for income in self.facturables})
+
+        # Nada pendiente: una segunda ejecución no emite facturas
+        with self.leer_zip(generar_zip_facturas(incluir_pdf=False)) as archivo:
+            self.assertEqual(archivo.namelist(), [])
+
+    def test_reanudar_tras_interrupcion(self):
+        from datetime import timedelta
+
+        from apps.reports.facturacion import generar_zip_facturas
+        from apps.reports.models import Invoice
+
+        partes = generar_zip_facturas(incluir_pdf=False, tamano_lote=2)
+        next(partes)
+        partes.close()  # se interrumpe tras el primer lote
+        folios = dict(Invoice.objects.values_list('income_id', 'pk'))
+        self.assertEqual(len(folios), 2)
+        self.assertFalse(Invoice.objects.filter(status=Invoice.ISSUED).exists())
+
+        # Un rango que no las incluye no reintenta las pendientes
+        ayer = now().date() - timedelta(days=1)
+        with self.leer_zip(generar_zip_facturas(ayer, ayer, incluir_pdf=False)) as archivo:
+            self.assertEqual(archivo.namelist(), [])
+        self.assertFalse(Invoice.objects.filter(status=Invoice.ISSUED).exists())
+
+        with self.leer_zip(generar_zip_facturas(incluir_pdf=False, tamano_lote=2)) as archivo:
+            self.assertEqual(len(archivo.namelist()), 3)
+        self.assertEqual(Invoice.objects.filter(status=Invoice.ISSUED).count(), 3)
+        for income_id, pk in folios.items():
+            self.assertEqual(Invoice.objects.get(income_id=income_id).pk, pk)
+
+
+class MonthEndCloseTest(ReportTestCase):
+
+    def setUp(self):
+        from dateutil.relativedelta import relativedelta
+
+        super().setUp()
+        self.mes = now().date().replace(day=1) - relativedelta(months=1)
+        ingresos = [
+            self.crear_ingreso("100.00"),
+            self.crear_ingreso("50.00", was_paid='debit'),
+            self.crear_ingreso("200.00", dentist=self.other_dentist),
+        ]
+        Income.objects.filter(pk__in=[i.pk for i in ingresos]).update(
+            date=self.mes.replace(day=15))
+        self.income_hoy = self.crear_ingreso("7.00")
+
+    def test_cierre_inmutable_con_checksum(self):
+        from django.db import connection, transaction
+
+        from apps.reports.cierre import cerrar_mes, verificar_cierre
+        from apps.reports.models import MonthlySummary
+
+        periodo, creado = cerrar_mes(self.mes)
+        self.assertTrue(creado)
+        self.assertEqual((periodo.income_count, periodo.total_amount), (3, Decimal("350.00")))
+        self.assertEqual(periodo.summaries.count(), 3)
+        self.assertTrue(verificar_cierre(periodo))
+        self.assertEqual(cerrar_mes(self.mes), (periodo, False))
+
+        resumen = periodo.summaries.first()
+        with self.assertRaises(ValueError):
+            resumen.save()
+        with self.assertRaises(ValueError):
+            MonthlySummary.objects.update(total_amount=0)
+
+        # Desde la aplicación los ingresos del mes ya no pueden cambiar
+        ingreso = Income.objects.get(date=self.mes.replace(day=15), amount=50)
+        for escritura in (
+                ingreso.save, ingreso.delete,
+                partial(Income.objects.filter(pk=ingreso.pk).update, amount=Decimal("60.00")),
+                partial(Income.objects.filter(pk=self.income_hoy.pk).update,
+                        date=self.mes.replace(day=20)),
+                partial(Income.objects.bulk_update, [ingreso], ['amount'])):
+            with self.assertRaisesMessage(ValueError, f"{self.mes:%Y-%m}"), transaction.atomic():
+                escritura()
+        self.assertTrue(verificar_cierre(periodo))
+        self.income_hoy.save()
+
+        # Un cambio hecho por fuera se detecta con el checksum
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE pages_income SET amount = %s WHERE id = %s", ["60.00", ingreso.pk])
+        self.assertFalse(verificar_cierre(periodo))
+
+        with self.assertRaises(ValueError):
+            cerrar_mes(now().date())
+
+    def test_reportes_leen_el_cierre(self):
+        from dateutil.relativedelta import relativedelta
+
+        from apps.reports.cierre import cerrar_mes
+        from apps.reports.reporter import (
+            obtener_comparativo_ingresos, obtener_reporte_ingresos_por_dentista)
+
+        antes = obtener_reporte_ingresos_por_dentista("mensual", hoy=self.mes, usar_cache=False)
+        cerrar_mes(self.mes)
+        # El rollup ya no se consulta para el mes cerrado
+        IncomeDailyRollup.objects.filter(date__lt=now().date()).update(total_amount=Decimal("1.00"))
+
+        # El cierre del mes, el resumen y los nombres de los dentistas
+        with self.assertNumQueries(3):
+            despues = obtener_reporte_ingresos_por_dentista(
+                "mensual", hoy=self.mes, usar_cache=False)
+        self.assertEqual(despues.filas, antes.filas)
+        self.assertEqual(despues.total, antes.total)
+
+        anual = obtener_reporte_ingresos_por_dentista(
+            inicio=self.mes, fin=now().date(), usar_cache=False)
+        # Un rango que incluye el mes en curso sigue leyendo el rollup
+        self.assertEqual(anual.total.total_ingresos, Decimal("3.00") + Decimal("7.00"))
+
+        # El comparativo lee los cierres cuando todos sus meses (incluido el
+        # acumulado del año) están cerrados
+        mes = self.mes.replace(month=1)
+        while mes < self.mes:
+            cerrar_mes(mes)
+            mes += relativedelta(months=1)
+        cerrar_mes(self.mes - relativedelta(months=1))
+        cerrar_mes(self.mes - relativedelta(years=1))
+        comparativo = obtener_comparativo_ingresos("mensual", hoy=self.mes.replace(day=20))
+        self.assertEqual(comparativo.total.actual, Decimal("350.00"))
+
+    def test_paquete_del_contador(self):
+        import zipfile
+        from io import BytesIO
+
+        from django.contrib.auth.models import User
+
+        from apps.reports.cierre import cerrar_mes
+
+        self.client.force_login(User.objects.create_user("contador", password="x"))
+        carpeta = f"{self.mes:%Y-%m}"
+        self.assertEqual(
+            self.client.get(f'/reports/cierre/{carpeta}/paquete/').status_code, 404)
 
-# Create your tests here.
+        cerrar_mes(self.mes)
+        respuesta = self.client.get(f'/reports/cierre/{carpeta}/paquete/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta.streaming)
+        with zipfile.ZipFile(BytesIO(b''.join(respuesta.streaming_content))) as archivo:
+            nombres = set(archivo.namelist())
+            self.assertEqual(len(nombres), 9)
+            self.assertIn(f"{carpeta}/cierre.json", nombres)
+            self.assertIn(b"Gran Total,350.00", archivo.read(f"{carpeta}/tipo-pago.csv"))
+            self.assertTrue(archivo.read(f"{carpeta}/dentista.pdf").startswith(b'%PDF'))
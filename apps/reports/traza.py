@@ -0,0 +1,205 @@
+"""
+Modo traza de los reportes.
+
+Dentro de ``with trazar() as traza:`` se registran el SQL ejecutado con su
+duración, las filas devueltas y el plan (EXPLAIN) de cada consulta, y el
+tiempo de cada fase del reporte ('consulta', 'formato', 'render'). Fuera de
+ese bloque ``fase()`` no hace nada, así que el costo sin traza es mínimo.
+La caché de reportes se omite mientras hay una traza activa.
+
+Las filas devueltas se cuentan conforme se leen del cursor; las filas
+examinadas salen de la estimación del EXPLAIN (PostgreSQL y MySQL la dan;
+SQLite no, pero su plan sí dice qué tablas se recorren completas). Ninguna
+consulta se vuelve a ejecutar para medirla.
+"""
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connection
+
+_traza_activa = ContextVar('traza_reporte', default=None)
+
+PARAMETRO_HTTP = 'trace'
+
+# Tabla recorrida completa en el plan de cada backend
+_RECORRIDO_COMPLETO = re.compile(r'(?:^|[\s>])(?:SCAN|Seq Scan on) "?(\w+)')
+
+# Filas estimadas de un nodo de lectura en el plan de PostgreSQL
+_FILAS_ESTIMADAS = re.compile(r'\bScan\b.*\brows=(\d+)')
+
+
+class Traza:
+    """
+    Registro de consultas y fases de una ejecución de reportes.
+    """
+
+    def __init__(self):
+        self.consultas = []
+        self.fases = {}
+
+    def registrar_consulta(self, sql, params, duracion):
+        consulta = {
+            'sql': sql, 'params': params, 'segundos': duracion,
+            'filas_devueltas': None, 'filas_examinadas': None,
+            'recorridos_completos': None, 'plan': None,
+        }
+        self.consultas.append(consulta)
+        return consulta
+
+    def registrar_fase(self, nombre, duracion):
+        self.fases[nombre] = self.fases.get(nombre, 0) + duracion
+
+    def analizar(self):
+        """
+        Completa el EXPLAIN de cada SELECT registrado, con las filas que
+        estima examinar y las tablas que recorre completas.
+
+        Se ejecuta al cerrar la traza para no alterar los tiempos medidos.
+        """
+        prefijo = connection.ops.explain_query_prefix()
+        with connection.cursor() as cursor:
+            for consulta in self.consultas:
+                sql, params = consulta['sql'], consulta['params'] or ()
+                if not _es_select(sql):
+                    continue
+                cursor.execute(f"{prefijo} {sql}", params)
+                columnas = [columna[0] for columna in cursor.description]
+                filas = cursor.fetchall()
+                consulta['plan'] = [' '.join(str(columna) for columna in fila) for fila in filas]
+                consulta['filas_examinadas'], consulta['recorridos_completos'] = \
+                    _leer_plan(columnas, filas, consulta['plan'])
+
+    def como_dict(self):
+        return {
+            'consultas': [
+                {**consulta, 'params': [str(p) for p in consulta['params'] or ()]}
+                for consulta in self.consultas
+            ],
+            'fases': self.fases,
+            'total_consultas': len(self.consultas),
+            'segundos_sql': sum(consulta['segundos'] for consulta in self.consultas),
+        }
+
+
+def _es_select(sql):
+    return sql.lstrip().upper().startswith('SELECT')
+
+
+def _leer_plan(columnas, filas, lineas):
+    """
+    Filas estimadas y tablas recorridas completas según un EXPLAIN.
+
+    MySQL da una fila por tabla con sus columnas 'rows' y 'type' ('ALL' es
+    un recorrido completo); PostgreSQL y SQLite dan líneas de texto. Las
+    filas estimadas son None si el backend no las da (SQLite).
+    """
+    if 'rows' in columnas:
+        por_nombre = [dict(zip(columnas, fila)) for fila in filas]
+        return (
+            sum(int(fila['rows'] or 0) for fila in por_nombre),
+            [fila['table'] for fila in por_nombre if fila.get('type') == 'ALL'],
+        )
+    estimadas = [int(filas) for filas in _FILAS_ESTIMADAS.findall('\n'.join(lineas))]
+    recorridos = [
+        coincidencia.group(1) for coincidencia in map(_RECORRIDO_COMPLETO.search, lineas)
+        if coincidencia
+    ]
+    return (sum(estimadas) if estimadas else None), recorridos
+
+
+def _contar_lecturas(cursor, consulta):
+    """
+    Cuenta en ``consulta`` las filas que se leen del cursor tras ejecutarla.
+    """
+    consulta['filas_devueltas'] = 0
+    # Un mismo cursor puede ejecutar varias consultas: cuenta para la última
+    cursor._consulta_traza = consulta
+    if getattr(cursor, '_lecturas_contadas', False):
+        return
+    for nombre, contar in (
+            ('fetchone', lambda fila: fila is not None),
+            ('fetchmany', len),
+            ('fetchall', len)):
+        def leer(*args, _leer=getattr(cursor, nombre), _contar=contar, **kwargs):
+            resultado = _leer(*args, **kwargs)
+            cursor._consulta_traza['filas_devueltas'] += _contar(resultado)
+            return resultado
+        setattr(cursor, nombre, leer)
+    cursor._lecturas_contadas = True
+
+
+def traza_activa():
+    return _traza_activa.get()
+
+
+@contextmanager
+def trazar(explicar=True):
+    """
+    Activa la traza para los reportes ejecutados dentro del bloque.
+
+    Args:
+        explicar (bool): Si es True, al salir se calcula el EXPLAIN de cada
+            consulta (con sus filas examinadas estimadas).
+    """
+    traza = Traza()
+
+    def envoltura(execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            consulta = traza.registrar_consulta(sql, params, time.perf_counter() - inicio)
+            if not many and _es_select(sql):
+                _contar_lecturas(context['cursor'], consulta)
+
+    token = _traza_activa.set(traza)
+    try:
+        with connection.execute_wrapper(envoltura):
+            yield traza
+    finally:
+        _traza_activa.reset(token)
+
+    if explicar:
+        traza.analizar()
+
+
+@contextmanager
+def fase(nombre):
+    """
+    Mide el tiempo de una fase del reporte si hay una traza activa.
+    """
+    traza = _traza_activa.get()
+    if traza is None:
+        yield
+        return
+
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        traza.registrar_fase(nombre, time.perf_counter() - inicio)
+
+
+def ejecutar_con_traza(funcion, *args, **kwargs):
+    """
+    Ejecuta una función de reporte con traza.
+
+    Returns:
+        tuple: (resultado, Traza).
+    """
+    with trazar() as traza:
+        resultado = funcion(*args, **kwargs)
+    return resultado, traza
+
+
+def traza_solicitada(request):
+    """
+    Indica si una solicitud HTTP pide la traza (``?trace=1``) y el usuario es staff.
+    """
+    return (
+        request.GET.get(PARAMETRO_HTTP, '').lower() in ('1', 'true', 'si', 'sí')
+        and request.user.is_authenticated
+        and request.user.is_staff
+    )
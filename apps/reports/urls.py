@@ -1,7 +1,10 @@
 from django.urls import path
 
-from apps.charts import views
+from apps.reports import views
 
 urlpatterns = [
     path("", views.index, name="reports"),
-]
\ No newline at end of file
+    path("simulacion/comisiones/", views.simulacion_comisiones, name="commission_simulation"),
+    path("cierre/<str:mes>/paquete/", views.paquete_cierre, name="closing_bundle"),
+    path("<slug:tipo>/", views.reporte, name="report"),
+]
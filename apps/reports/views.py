@@ -1,13 +1,273 @@
-from django.shortcuts import render
-from django.core import serializers
-from apps.pages.models import *
+from datetime import date, datetime
 
-# Create your views here.
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
+from django.utils.timezone import now
+from django.views.decorators.http import require_GET
 
+from apps.reports.cierre import paquete_contador
+from apps.reports.graficas import graficas_ingresos
+from apps.reports.models import ClosedPeriod
+from apps.reports.pdf import encabezado_fiscal, huella_pdf, renderizar_reporte_pdf
+from apps.reports.reporter import (
+    MESES_POR_PERIODO, iterar_csv, obtener_comparativo_ingresos,
+    obtener_comparativo_por_dentista, obtener_reporte_ingresos,
+    obtener_reporte_ingresos_por_dentista, validar_rango)
+from apps.reports.simulacion import simular_comisiones
+from apps.reports.traza import ejecutar_con_traza, traza_solicitada
+
+# Slug de la URL -> (función del reporter, acepta rango explícito)
+TIPOS_REPORTE = {
+    'tipo-pago': (obtener_reporte_ingresos, True),
+    'dentista': (obtener_reporte_ingresos_por_dentista, True),
+    'comparativo-tipo-pago': (obtener_comparativo_ingresos, False),
+    'comparativo-dentista': (obtener_comparativo_por_dentista, False),
+}
+
+FORMATOS = {
+    'json': 'application/json',
+    'csv': 'text/csv',
+    'pdf': 'application/pdf',
+}
+
+PERIODOS = ['semanal', *MESES_POR_PERIODO]
+
+# Segundos que navegador y proxies pueden reutilizar un período ya cerrado
+MAX_AGE_PERIODO_CERRADO = 60 * 60 * 24
+
+
+def negociar_formato(request):
+    """
+    Elige json, csv o pdf a partir de ``?formato=`` o del encabezado Accept.
+
+    Returns:
+        str: Formato elegido, o None si ninguno es aceptable.
+    """
+    formato = request.GET.get('formato')
+    if formato:
+        return formato if formato in FORMATOS else None
+
+    if not request.headers.get('Accept'):
+        return 'json'
+    for tipo in request.accepted_types:
+        if tipo.is_all_types:
+            return 'json'
+        for formato, media_type in FORMATOS.items():
+            if tipo.match(media_type):
+                return formato
+    return None
+
+
+def _fecha(request, nombre):
+    valor = request.GET.get(nombre)
+    return date.fromisoformat(valor) if valor else None
+
+
+def argumentos_reporte(request, acepta_rango):
+    """
+    Lee período, fecha de referencia y rango explícito de la query string.
+
+    Raises:
+        ValueError: Si algún parámetro no es válido.
+    """
+    periodo = request.GET.get('periodo', 'semanal')
+    if periodo not in PERIODOS:
+        raise ValueError(f"Período no válido. Usa: {', '.join(PERIODOS)}.")
+
+    argumentos = {'periodo': periodo, 'hoy': _fecha(request, 'hoy')}
+    inicio, fin = _fecha(request, 'inicio'), _fecha(request, 'fin')
+    if inicio or fin:
+        if not acepta_rango:
+            raise ValueError("Este reporte no acepta un rango explícito.")
+        if not (inicio and fin):
+            raise ValueError("Indica tanto 'inicio' como 'fin'.")
+        validar_rango(inicio, fin)
+        argumentos.update(inicio=inicio, fin=fin)
+    return argumentos
+
+
+def argumentos_pdf(reporte, tipo):
+    """
+    Lo que el PDF de un reporte incluye además del reporte: encabezado
+    fiscal, fecha impresa y gráficas. Todo entra en su ETag.
+    """
+    return {
+        'encabezado': encabezado_fiscal(),
+        'fecha': now().date(),
+        # Mezcla de pagos y tendencia mensual hasta el fin del reporte
+        'graficas': graficas_ingresos(reporte, hoy=reporte.fin) if tipo == 'tipo-pago' else (),
+    }
+
+
+def _respuesta(reporte, formato, tipo, pdf=None):
+    nombre = f"reporte-{tipo}-{reporte.inicio}-{reporte.fin}"
+    if formato == 'csv':
+        respuesta = StreamingHttpResponse(
+            iterar_csv(reporte), content_type='text/csv; charset=utf-8')
+        respuesta['Content-Disposition'] = f'attachment; filename="{nombre}.csv"'
+    elif formato == 'pdf':
+        respuesta = HttpResponse(
+            renderizar_reporte_pdf(reporte, **(pdf or argumentos_pdf(reporte, tipo))),
+            content_type='application/pdf')
+        respuesta['Content-Disposition'] = f'attachment; filename="{nombre}.pdf"'
+    else:
+        respuesta = JsonResponse(reporte.como_dict())
+    return respuesta
+
+
+@login_required(login_url='/accounts/login/')
+@require_GET
 def index(request):
-  products = serializers.serialize('json', Product.objects.all())
-  context = {
-    'segment': 'charts',
-    'products': products
-  }
-  return render(request, 'charts/index.html', context)
+    return JsonResponse({
+        'reportes': {
+            tipo: request.build_absolute_uri(reverse('report', args=[tipo]))
+            for tipo in TIPOS_REPORTE
+        },
+        'simulaciones': {
+            'comisiones': request.build_absolute_uri(reverse('commission_simulation')),
+        },
+        'formatos': list(FORMATOS),
+        'periodos': PERIODOS,
+    })
+
+
+@login_required(login_url='/accounts/login/')
+@require_GET
+def reporte(request, tipo):
+    if tipo not in TIPOS_REPORTE:
+        raise Http404("Reporte no encontrado.")
+    funcion, acepta_rango = TIPOS_REPORTE[tipo]
+
+    formato = negociar_formato(request)
+    if formato is None:
+        return HttpResponse(
+            f"Formatos disponibles: {', '.join(FORMATOS.values())}", status=406)
+
+    try:
+        argumentos = argumentos_reporte(request, acepta_rango)
+        if traza_solicitada(request):
+            resultado, traza = ejecutar_con_traza(funcion, **argumentos)
+        else:
+            resultado, traza = funcion(**argumentos), None
+    except ValueError as e:
+        return JsonResponse({
+            'message': 'Input Error = ' + str(e),
+            'success': False
+        }, status=400)
+
+    # El PDF cambia también con sus gráficas (cuya tendencia sale del rango
+    # del reporte) y con la fecha impresa
+    pdf = argumentos_pdf(resultado, tipo) if formato == 'pdf' else None
+    huella = huella_pdf(resultado, **pdf) if pdf else resultado.huella()
+    etag = quote_etag(f"{huella}-{formato}")
+    respuesta = None if traza else get_conditional_response(request, etag=etag)
+    if respuesta is None:
+        if traza and formato == 'json':
+            respuesta = JsonResponse({**resultado.como_dict(), '_traza': traza.como_dict()})
+        else:
+            respuesta = _respuesta(resultado, formato, tipo, pdf)
+
+    # Los reportes son privados; un período cerrado puede reutilizarse sin
+    # revalidar, el período en curso siempre se revalida con el ETag
+    respuesta['ETag'] = etag
+    if resultado.fin < now().date():
+        patch_cache_control(respuesta, private=True, max_age=MAX_AGE_PERIODO_CERRADO)
+    else:
+        patch_cache_control(respuesta, private=True, no_cache=True)
+    patch_vary_headers(respuesta, ['Accept', 'Cookie'])
+    return respuesta
+
+
+def _pares(request, nombre):
+    """
+    Lee parámetros repetidos ``nombre=clave:valor`` como diccionario.
+
+    Raises:
+        ValueError: Si algún parámetro no tiene la forma clave:valor.
+    """
+    pares = {}
+    for parametro in request.GET.getlist(nombre):
+        clave, separador, valor = parametro.rpartition(':')
+        if not separador or not clave:
+            raise ValueError(f"'{nombre}' debe tener la forma clave:porcentaje.")
+        pares[clave] = valor
+    return pares
+
+
+def argumentos_simulacion(request):
+    """
+    Lee porcentajes propuestos y meses de historia de la query string:
+    ``?dentista=<id>:0.35&nivel=<nivel>:0.40&meses=12`` (``meses=todo`` para
+    toda la historia).
+
+    Raises:
+        ValueError: Si algún parámetro no es válido.
+    """
+    porcentajes = _pares(request, 'dentista')
+    for dentista in porcentajes:
+        if not dentista.isdigit():
+            raise ValueError(f"Id de dentista no válido: {dentista!r}.")
+
+    meses = request.GET.get('meses', '12')
+    if meses != 'todo':
+        if not meses.isdigit() or int(meses) < 1:
+            raise ValueError("'meses' debe ser un entero positivo o 'todo'.")
+        meses = int(meses)
+    else:
+        meses = None
+
+    return {
+        'porcentajes': porcentajes,
+        'por_nivel': _pares(request, 'nivel'),
+        'meses': meses,
+        'hoy': _fecha(request, 'hoy'),
+    }
+
+
+@login_required(login_url='/accounts/login/')
+@require_GET
+def simulacion_comisiones(request):
+    formato = negociar_formato(request)
+    if formato is None:
+        return HttpResponse(
+            f"Formatos disponibles: {', '.join(FORMATOS.values())}", status=406)
+
+    try:
+        argumentos = argumentos_simulacion(request)
+        if traza_solicitada(request):
+            resultado, traza = ejecutar_con_traza(simular_comisiones, **argumentos)
+        else:
+            resultado, traza = simular_comisiones(**argumentos), None
+    except ValueError as e:
+        return JsonResponse({
+            'message': 'Input Error = ' + str(e),
+            'success': False
+        }, status=400)
+
+    if traza and formato == 'json':
+        respuesta = JsonResponse({**resultado.como_dict(), '_traza': traza.como_dict()})
+    else:
+        respuesta = _respuesta(resultado, formato, 'simulacion-comisiones')
+    patch_cache_control(respuesta, private=True, no_cache=True)
+    return respuesta
+
+
+@login_required(login_url='/accounts/login/')
+@require_GET
+def paquete_cierre(request, mes):
+    try:
+        inicio = datetime.strptime(mes, '%Y-%m').date()
+    except ValueError:
+        raise Http404("Mes no válido.")
+    periodo = ClosedPeriod.objects.filter(month=inicio).first()
+    if periodo is None:
+        raise Http404("El mes no está cerrado.")
+
+    respuesta = StreamingHttpResponse(paquete_contador(periodo), content_type='application/zip')
+    respuesta['Content-Disposition'] = f'attachment; filename="cierre-{mes}.zip"'
+    # El contenido de un mes cerrado no cambia
+    patch_cache_control(respuesta, private=True, max_age=MAX_AGE_PERIODO_CERRADO)
+    return respuesta
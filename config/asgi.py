@@ -3,6 +3,17 @@ ASGI config for core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The live dashboard stream (``/charts/income-stream/``) needs this entry point
+and ``CHARTS_LIVE_UPDATES=True``. Its publisher lives in memory, so it only
+works with a single process, e.g.::
+
+    gunicorn config.asgi:application -k uvicorn.workers.UvicornWorker --workers 1
+
+Each open dashboard is an idle coroutine, not a thread, so one worker holds
+hundreds of connections. Under WSGI (the default deployment, see Dockerfile)
+or with the setting off, the stream answers 204 and the dashboard loads the
+charts once.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 """
@@ -204,6 +204,24 @@ DYNAMIC_API = {
     'Ingresos': "apps.pages.models.Income",
 }
 
+# ### Reports Settings ###
+# Datos fiscales impresos en los PDF de reportes
+REPORTS_FISCAL_HEADER = {
+    'empresa': os.getenv('REPORTS_EMPRESA', "Empresa Genérica S.A. de C.V."),
+    'rfc': os.getenv('REPORTS_RFC', "GENERIC123456XYZ"),
+    'direccion': os.getenv('REPORTS_DIRECCION', "Calle Falsa 123, Ciudad, País"),
+    'telefono': os.getenv('REPORTS_TELEFONO', "+52 55 1234 5678"),
+}
+########################################
+
+# ### Charts Settings ###
+# Actualizaciones en vivo del tablero (SSE, ver apps.charts.eventos). El
+# publicador es en memoria, así que solo funciona con UN proceso servido por
+# config.asgi; con varios workers cada tablero vería solo las escrituras de
+# su proceso. Apagado, el tablero carga las gráficas una vez.
+CHARTS_LIVE_UPDATES = str2bool(os.getenv('CHARTS_LIVE_UPDATES', 'False'))
+########################################
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
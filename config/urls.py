@@ -22,6 +22,7 @@ urlpatterns = [
     path("", include("apps.dyn_dt.urls")),
     path("", include("apps.dyn_api.urls")),
     path('charts/', include('apps.charts.urls')),
+    path('reports/', include('apps.reports.urls')),
     path("", include('admin_datta.urls')),
     path("admin/", admin.site.urls),
 ]